@@ -0,0 +1,95 @@
+"""
+Benchmark de backups: travamento do balcão durante o backup, compressão e diferenciais
+
+Mede num banco temporário populado pelos fixtures:
+  - a maior espera de um escritor (commit por linha) durante um backup de uma só vez e um paginado;
+  - tamanho e tempo dos backups completos sem compressão, gzip e zstd (se instalado);
+  - tamanho de um diferencial depois de alguns empréstimos.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "database"))
+
+import backup_restore
+from backup_restore import DatabaseBackup
+from fixtures import create_sqlite_engine, seed_database
+
+
+def writer_stall(db_path: str, run_backup) -> tuple:
+    """(maior espera de um commit em ms, commits feitos) enquanto `run_backup` executa."""
+    done = threading.Event()
+    waits = []
+
+    def writer() -> None:
+        with closing(sqlite3.connect(db_path, timeout=30)) as conn:
+            while not done.is_set():
+                start = time.perf_counter()
+                conn.execute("UPDATE books SET is_available = NOT is_available WHERE id = 1")
+                conn.commit()
+                waits.append(time.perf_counter() - start)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.1)
+    run_backup()
+    done.set()
+    thread.join()
+    return max(waits) * 1000, len(waits)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--loans", type=int, default=300_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "biblioteca.db")
+        engine = create_sqlite_engine(db_path)
+        print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+        seed_database(engine, args.books, args.users, args.loans)
+        engine.dispose()
+        with closing(sqlite3.connect(db_path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        print(f"📏 Banco: {os.path.getsize(db_path) / 1e6:.1f} MB\n")
+
+        os.chdir(tmp)
+        manager = DatabaseBackup(db_path)
+
+        def one_step() -> None:
+            with closing(sqlite3.connect(db_path)) as source, closing(sqlite3.connect("one_step.db")) as target:
+                source.backup(target)
+
+        print(f"{'backup':<14}{'maior espera':>14}{'commits':>10}{'duração s':>11}")
+        for label, run_backup in (("uma vez", one_step), ("paginado", lambda: manager.create_backup("paged.db"))):
+            start = time.perf_counter()
+            stall, commits = writer_stall(db_path, run_backup)
+            print(f"{label:<14}{stall:>11.1f} ms{commits:>10}{time.perf_counter() - start:>11.2f}")
+
+        print(f"\n{'compressão':<14}{'tamanho MB':>12}{'tempo s':>10}")
+        for compression in backup_restore.COMPRESSIONS:
+            start = time.perf_counter()
+            path = manager.create_backup(f"full_{compression}.db", compression=compression)
+            if path:
+                print(f"{compression:<14}{os.path.getsize(path) / 1e6:>12.2f}{time.perf_counter() - start:>10.2f}")
+
+        with closing(sqlite3.connect(db_path)) as conn:
+            conn.execute("UPDATE loans SET return_date = CURRENT_TIMESTAMP, is_returned = 1 WHERE id % 1000 = 0")
+            conn.commit()
+        diff = manager.create_differential_backup("database/backups/full_gzip.db.gz", compression="gzip")
+        if diff:
+            print(f"\n🧩 Diferencial: {os.path.getsize(diff) / 1e3:.1f} KB, íntegro: {manager.verify_backup(diff)}")
+
+
+if __name__ == "__main__":
+    main()
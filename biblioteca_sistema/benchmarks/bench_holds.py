@@ -0,0 +1,153 @@
+"""
+Benchmark da fila de reservas em títulos muito disputados
+
+Num banco gerado com popularidade Zipf, esgota os títulos mais populares e põe milhares de
+reservas na fila de cada um. Mede:
+  - a devolução que separa o exemplar para o próximo da fila, com fila curta e com fila longa,
+    com e sem o índice (book_id, status, id);
+  - o empréstimo do titular da reserva pronta;
+  - novos exemplares atendendo a fila de uma vez;
+  - o vencimento em lote das reservas não retiradas, que passa os exemplares adiante.
+"""
+import argparse
+import os
+import statistics as stats
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    return f"mediana {stats.median(samples) * 1000:6.2f} ms | p95 {p95 * 1000:6.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--loans", type=int, default=200_000)
+    parser.add_argument("--max-copies", type=int, default=20, help="Exemplares do título mais popular")
+    parser.add_argument("--titles", type=int, default=5, help="Títulos disputados")
+    parser.add_argument("--queue", type=int, default=5_000, help="Reservas na fila de cada título disputado")
+    parser.add_argument("--returns", type=int, default=200, help="Devoluções medidas por cenário")
+    parser.add_argument("--new-copies", type=int, default=2_000, help="Exemplares novos para a fila mais longa")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "holds.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import insert, select, text
+    from fixtures import create_sqlite_engine, seed_database
+    from src.database import holds
+    from src.database.connection import db_connection
+    from src.database.models import Base, Book, Hold, Loan
+    from src.services.book_service import BookService
+    from src.services.hold_service import HoldService
+    from src.services.loan_service import LoanService
+    from src.services.stats_service import StatsService
+
+    engine = create_sqlite_engine(db_path)
+    print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+    seed_database(engine, args.books, args.users, args.loans, max_copies=args.max_copies)
+    engine.dispose()
+
+    loans, hold_service, book_service = LoanService(), HoldService(), BookService()
+    with db_connection.session_scope() as session:
+        # Os mais populares têm mais exemplares; o último dos escolhidos fica com a fila curta
+        titles = list(session.scalars(select(Book.id).order_by(Book.copies_total.desc()).limit(args.titles + 1)))
+    deep, short = titles[:-1], titles[-1]
+
+    # Esgota os títulos: cada exemplar na estante vai para um usuário diferente
+    next_user = iter(range(1, args.users + 1))
+    for book_id in titles:
+        while book_service.get_copy_counts(book_id)["available"]:
+            loans.create_loan(next(next_user), book_id)
+
+    # Filas: usuários distintos por título, inseridas em lote (a colocação na fila não é o foco)
+    now = datetime.now()
+    with db_connection.session_scope() as session:
+        for book_id, size in [(book_id, args.queue) for book_id in deep] + [(short, 10)]:
+            users = [(offset % args.users) + 1 for offset in range(book_id, book_id + size)]
+            rows = [
+                {"user_id": user_id, "book_id": book_id, "status": holds.WAITING, "created_at": now} for user_id in users
+            ]
+            session.execute(insert(Hold.__table__), rows)
+    StatsService().rebuild()
+    print(f"📚 {len(deep)} títulos com {args.queue} reservas na fila e 1 com 10 (exemplares emprestados)\n")
+
+    def active_loans(book_ids: list) -> list:
+        with db_connection.session_scope() as session:
+            return list(
+                session.scalars(
+                    select(Loan.id).where(Loan.book_id.in_(book_ids), Loan.is_returned == False).order_by(Loan.id)
+                )
+            )
+
+    def cycle(book_ids: list, count: int) -> tuple:
+        """Devolve `count` empréstimos e empresta cada exemplar ao titular da reserva que ficou pronta."""
+        returns, checkouts = [], []
+        pending = active_loans(book_ids)
+        while len(returns) < count and pending:
+            loan_id = pending.pop(0)
+            start = time.perf_counter()
+            loans.return_loan(loan_id)
+            returns.append(time.perf_counter() - start)
+            ready = hold_service.get_ready_holds(limit=1)
+            if ready:
+                start = time.perf_counter()
+                loan = loans.create_loan(ready[0].user_id, ready[0].book_id)
+                checkouts.append(time.perf_counter() - start)
+                pending.append(loan.id)
+        return returns, checkouts
+
+    print(f"{'cenário':<38}{'devolução':>34}")
+    for label, book_ids in (("fila curta (10)", [short]), (f"fila longa ({args.queue})", deep)):
+        returns, checkouts = cycle(book_ids, args.returns)
+        print(f"{label:<38}{percentiles(returns):>34}")
+    print(f"{'empréstimo ao titular da reserva':<38}{percentiles(checkouts):>34}")
+
+    index = next(index for index in Base.metadata.tables["holds"].indexes if index.name == "ix_holds_book_status")
+    with db_connection.engine.begin() as conn:
+        index.drop(conn)
+    returns, _ = cycle(deep, max(20, args.returns // 10))
+    print(f"{'fila longa sem o índice da fila':<38}{percentiles(returns):>34}")
+    with db_connection.engine.begin() as conn:
+        index.create(conn)
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM holds WHERE book_id = :book AND status = 'waiting' "
+                "ORDER BY id LIMIT 1"
+            ),
+            {"book": deep[0]},
+        ).all()
+    print(f"🔎 Plano da ponta da fila: {' / '.join(row[-1] for row in plan)}")
+
+    position = hold_service.get_queue(deep[0])[-1]
+    start = time.perf_counter()
+    place = hold_service.get_queue_position(position.id)
+    print(f"🔢 Posição do último da fila ({place}): {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    book_service.add_copies(deep[0], args.new_copies)
+    elapsed = time.perf_counter() - start
+    print(f"\n📦 {args.new_copies} exemplares novos separados para a fila: {elapsed:.2f}s")
+
+    ready = StatsService().get_summary()["holds"]["ready"]
+    start = time.perf_counter()
+    expired = hold_service.expire_holds(datetime.now() + timedelta(days=holds.HOLD_SHELF_DAYS + 1))
+    elapsed = time.perf_counter() - start
+    print(f"⌛ {expired} de {ready} reservas vencidas e repassadas em {elapsed:.2f}s ({expired / elapsed:,.0f}/s)")
+
+    divergent = StatsService().verify()
+    print("✅ Contadores consistentes" if not divergent else f"❌ Contadores divergentes: {divergent}")
+
+
+if __name__ == "__main__":
+    main()
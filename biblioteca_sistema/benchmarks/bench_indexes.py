@@ -0,0 +1,108 @@
+"""
+Benchmark dos índices das migrações: plano de execução e tempo antes e depois
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import bindparam, text
+from fixtures import create_sqlite_engine, seed_database
+from src.database.migrations import run_migrations
+from src.database.models import Base
+
+HOT_QUERIES = {
+    "livros disponíveis por categoria": (
+        "SELECT * FROM books WHERE is_available = 1 AND category = 'Tecnologia' ORDER BY id LIMIT 50",
+        {},
+    ),
+    "empréstimos ativos do usuário": (
+        "SELECT * FROM loans WHERE user_id = :user_id AND is_returned = 0",
+        {"user_id": 42},
+    ),
+    "empréstimo ativo do livro": (
+        "SELECT * FROM loans WHERE book_id = :book_id AND is_returned = 0",
+        {"book_id": 42},
+    ),
+    "histórico do usuário": (
+        "SELECT * FROM loans WHERE user_id = :user_id ORDER BY loan_date DESC LIMIT 20",
+        {"user_id": 42},
+    ),
+    "empréstimos ativos mais antigos": (
+        "SELECT * FROM loans WHERE is_returned = 0 ORDER BY loan_date LIMIT 20",
+        {},
+    ),
+    "empréstimos em atraso": (
+        "SELECT * FROM loans WHERE is_returned = 0 AND due_date < :as_of ORDER BY due_date, id LIMIT 500",
+        {"as_of": datetime.now().isoformat(" ")},
+    ),
+}
+
+
+# Tabelas do esquema original, que não tinha índice secundário: todos os declarados nos modelos vêm das migrações
+BASELINE_TABLES = ("books", "users", "loans", "copies")
+
+
+def drop_migration_indexes(engine) -> None:
+    """Volta ao esquema de antes das migrações: o `create_all` do fixture já cria os índices dos modelos."""
+    names = [index.name for table in BASELINE_TABLES for index in Base.metadata.tables[table].indexes]
+    with engine.begin() as conn:
+        for name in names:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        left = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND name IN :names").bindparams(
+                bindparam("names", expanding=True)
+            ),
+            {"names": names},
+        ).scalars().all()
+    if left:
+        raise RuntimeError(f"Índices das migrações ainda presentes na medição de antes: {', '.join(left)}")
+
+
+def measure(engine, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for label, (sql, params) in HOT_QUERIES.items():
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)]
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            elapsed = (time.perf_counter() - start) / repeat
+            results[label] = (plan, elapsed)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--loans", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(os.path.join(tmp, "bench.db"))
+        drop_migration_indexes(engine)
+        print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+        seed_database(engine, args.books, args.users, args.loans)
+        before = measure(engine, args.repeat)
+        start = time.perf_counter()
+        run_migrations(engine)
+        print(f"🏗️ Migrações aplicadas em {time.perf_counter() - start:.2f}s\n")
+        after = measure(engine, args.repeat)
+        for label in HOT_QUERIES:
+            plan_before, time_before = before[label]
+            plan_after, time_after = after[label]
+            print(f"📋 {label}")
+            print(f"  antes:  {time_before * 1000:9.3f} ms  {' | '.join(plan_before)}")
+            print(f"  depois: {time_after * 1000:9.3f} ms  {' | '.join(plan_after)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark das listagens: entidades do ORM x linhas só com as colunas (BookRow, UserRow, LoanRow)
+
+Lê a tabela inteira pelos dois caminhos de cada listagem e mostra, por 100 mil linhas:
+  - o tempo da consulta até a lista pronta (melhor de --repeat execuções);
+  - a memória que o resultado ocupa e o pico durante a leitura (tracemalloc).
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+PER = 100_000
+
+
+def best_time(fetch, repeat: int) -> tuple:
+    best, count = float("inf"), 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        count = len(fetch())
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def memory(fetch) -> tuple:
+    """(bytes retidos pelo resultado, pico de bytes durante a leitura)."""
+    gc.collect()
+    tracemalloc.start()
+    result = fetch()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--loans", type=int, default=500_000, help="Parte deles fica ativa")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "listing.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from fixtures import create_sqlite_engine, seed_database
+    from src.services.book_service import BookService
+    from src.services.loan_service import LoanService
+    from src.services.user_service import UserService
+
+    engine = create_sqlite_engine(db_path)
+    print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+    seed_database(engine, args.books, args.users, args.loans)
+    engine.dispose()
+
+    books, users, loans = BookService(), UserService(), LoanService()
+    cases = [
+        ("livros", books.get_all_books, books.get_book_listing),
+        ("usuários", users.get_all_users, users.get_user_listing),
+        ("empréstimos ativos", loans.get_active_loans, loans.get_active_loan_listing),
+    ]
+    print(f"\n{'listagem':<20}{'caminho':<10}{'linhas':>10}{'tempo/100k':>14}{'retido/100k':>14}{'pico/100k':>14}")
+    for label, orm_fetch, row_fetch in cases:
+        for path, fetch in (("ORM", orm_fetch), ("linhas", row_fetch)):
+            elapsed, count = best_time(fetch, args.repeat)
+            retained, peak = memory(fetch)
+            scale = PER / max(count, 1)
+            print(
+                f"{label:<20}{path:<10}{count:>10}{elapsed * scale * 1000:>11.0f} ms"
+                f"{retained * scale / 2**20:>11.1f} MB{peak * scale / 2**20:>11.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark das listagens de empréstimos: carga preguiçosa (N+1), selectinload e JOIN em linhas
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--loans", type=int, default=160_000, help="Sem devoluções; ~100k ficam ativos")
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "listing.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import selectinload
+    from fixtures import create_sqlite_engine, seed_database
+    from src.database.connection import db_connection
+    from src.database.models import Loan
+    from src.services.loan_service import LoanService
+
+    engine = create_sqlite_engine(db_path)
+    print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+    seed_database(engine, args.books, args.users, args.loans, returned_ratio=0.0)
+    engine.dispose()
+
+    statements = [0]
+
+    @event.listens_for(db_connection.engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements[0] += 1
+
+    def lazy(limit):
+        with db_connection.session_scope() as session:
+            query = session.query(Loan).filter(Loan.is_returned == False).order_by(Loan.id)
+            if limit:
+                query = query.limit(limit)
+            return [(loan.id, loan.user.name, loan.book.title, loan.book.author, loan.loan_date) for loan in query]
+
+    def eager(limit):
+        with db_connection.session_scope() as session:
+            query = (
+                session.query(Loan)
+                .options(selectinload(Loan.user), selectinload(Loan.book))
+                .filter(Loan.is_returned == False)
+                .order_by(Loan.id)
+            )
+            if limit:
+                query = query.limit(limit)
+            return [(loan.id, loan.user.name, loan.book.title, loan.book.author, loan.loan_date) for loan in query]
+
+    def joined(limit):
+        return LoanService().get_active_loan_listing(limit=limit)
+
+    for label, limit in (("uma página", args.page_size), ("todos os ativos", None)):
+        print(f"\n📋 {label}")
+        for name, run in (("preguiçosa (N+1)", lazy), ("selectinload", eager), ("JOIN em linhas", joined)):
+            statements[0] = 0
+            start = time.perf_counter()
+            rows = run(limit)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<18} {elapsed * 1000:10.1f} ms  {statements[0]:7d} consultas  ({len(rows)} linhas)")
+    db_connection.close_connection()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
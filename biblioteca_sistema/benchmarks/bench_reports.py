@@ -0,0 +1,59 @@
+"""
+Benchmark dos relatórios de circulação sobre um histórico sintético de empréstimos
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--loans", type=int, default=1_000_000, help="Use 10000000 para o cenário completo")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "reports.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from fixtures import create_sqlite_engine, seed_database
+    from src.services.report_service import ReportService
+
+    engine = create_sqlite_engine(db_path)
+    print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+    start = time.perf_counter()
+    seed_database(engine, args.books, args.users, args.loans)
+    engine.dispose()
+    print(f"  pronto em {time.perf_counter() - start:.1f}s\n")
+
+    service = ReportService()
+    last_quarter = datetime.now() - timedelta(days=90)
+    reports = {
+        "top 10 livros": lambda: service.top_books(10),
+        "top 10 livros (trimestre)": lambda: service.top_books(10, start=last_quarter),
+        "top 10 livros (Romance)": lambda: service.top_books(10, category="Romance"),
+        "top 10 usuários": lambda: service.top_users(10),
+        "top 10 usuários (trimestre)": lambda: service.top_users(10, start=last_quarter),
+        "empréstimos por mês": lambda: service.loans_per_month(),
+        "circulação por categoria": lambda: service.circulation_by_category(),
+    }
+    for label, run in reports.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            rows = run()
+            timings.append(time.perf_counter() - start)
+        print(f"📊 {label:<30} {min(timings) * 1000:10.1f} ms  ({len(rows)} linhas)")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
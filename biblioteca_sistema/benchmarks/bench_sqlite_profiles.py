@@ -0,0 +1,136 @@
+"""
+Benchmark dos perfis do SQLite (safe, balanced, fast): vazão de escrita e leitura
+
+Para cada perfil, mede num banco novo:
+  - escritas com um commit por linha (o caso do balcão de empréstimos);
+  - escritas em lote numa única transação;
+  - leituras por chave primária;
+  - leitores concorrentes enquanto um escritor faz commits, contando erros de bloqueio.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+os.environ.pop("DATABASE_URL", None)
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import OperationalError
+from src.database.connection import SQLITE_PROFILES, DatabaseConnection
+from src.database.models import Book
+
+
+def book_row(i: int) -> dict:
+    return {"title": f"Livro {i}", "author": f"Autor {i % 500}", "year": 2000, "category": "Tecnologia"}
+
+
+def single_writes(db: DatabaseConnection, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        with db.session_scope() as session:
+            session.execute(insert(Book), [book_row(i)])
+    return count / (time.perf_counter() - start)
+
+
+def batch_writes(db: DatabaseConnection, count: int) -> float:
+    start = time.perf_counter()
+    with db.session_scope() as session:
+        session.execute(insert(Book), [book_row(i) for i in range(count)])
+    return count / (time.perf_counter() - start)
+
+
+def point_reads(db: DatabaseConnection, count: int, max_id: int) -> float:
+    rng = random.Random(1)
+    start = time.perf_counter()
+    with db.engine.connect() as conn:
+        for _ in range(count):
+            conn.execute(select(Book.title).where(Book.id == rng.randint(1, max_id))).first()
+    return count / (time.perf_counter() - start)
+
+
+def mixed_load(db: DatabaseConnection, readers: int, duration: float, max_id: int) -> dict:
+    """Um escritor alternando a disponibilidade de livros e `readers` threads lendo ao mesmo tempo."""
+    deadline = time.perf_counter() + duration
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def writer() -> None:
+        rng = random.Random(2)
+        writes = locked = 0
+        while time.perf_counter() < deadline:
+            try:
+                with db.session_scope() as session:
+                    session.execute(
+                        update(Book).where(Book.id == rng.randint(1, max_id)).values(is_available=rng.random() < 0.5)
+                    )
+                writes += 1
+            except OperationalError:
+                locked += 1
+        with lock:
+            counts["writes"] += writes
+            counts["locked"] += locked
+
+    def reader(seed: int) -> None:
+        rng = random.Random(seed)
+        reads = locked = 0
+        while time.perf_counter() < deadline:
+            try:
+                with db.session_scope() as session:
+                    session.execute(
+                        select(Book.id).where(Book.is_available == True, Book.category == "Tecnologia").limit(20)
+                    ).all()
+                    session.get(Book, rng.randint(1, max_id))
+                reads += 1
+            except OperationalError:
+                locked += 1
+        with lock:
+            counts["reads"] += reads
+            counts["locked"] += locked
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(seed,)) for seed in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: value / duration if name != "locked" else value for name, value in counts.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    parser.add_argument("--single-writes", type=int, default=2_000)
+    parser.add_argument("--batch-writes", type=int, default=100_000)
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(
+        f"{'perfil':<10}{'commit/linha':>14}{'lote':>12}{'leitura PK':>12}"
+        f"{'mista: leit.':>14}{'escr.':>8}{'bloqueios':>11}"
+    )
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseConnection(os.path.join(tmp, f"{profile}.db"), profile=profile)
+            single = single_writes(db, args.single_writes)
+            batch = batch_writes(db, args.batch_writes)
+            max_id = args.single_writes + args.batch_writes
+            reads = point_reads(db, args.reads, max_id)
+            mixed = mixed_load(db, args.readers, args.duration, max_id)
+            db.close_connection()
+        print(
+            f"{profile:<10}{single:>12,.0f}/s{batch:>10,.0f}/s{reads:>10,.0f}/s"
+            f"{mixed['reads']:>12,.0f}/s{mixed['writes']:>6,.0f}/s{mixed['locked']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
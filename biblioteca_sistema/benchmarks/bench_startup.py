@@ -0,0 +1,120 @@
+"""
+Benchmark de inicialização: tempo de processo dos comandos mais comuns e orçamento de -X importtime
+
+Sai com código 1 se as importações do comando medido passarem do orçamento (--budget-ms).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+ROOT = Path(__file__).parent.parent
+
+SCENARIOS = {
+    "main.py --help": ["main.py", "--help"],
+    "import dos modelos": ["-c", "import src.database.models"],
+    "import da CLI de comandos": ["-c", "import src.cli.commands"],
+    "books get 1 --json": ["main.py", "books", "get", "1", "--json"],
+    "reports summary --json": ["main.py", "reports", "summary", "--json"],
+}
+
+
+def run(args, env) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def import_times(args, env) -> list:
+    """(módulo, tempo próprio em ms, tempo acumulado em ms, nível de aninhamento) de cada importação."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, depth))
+    return modules
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=200.0, help="Orçamento de importação do comando medido")
+    parser.add_argument("--command", default="books get 1 --json", help="Comando de main.py medido no orçamento")
+    parser.add_argument("--top", type=int, default=10, help="Módulos mais lentos listados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+        # Cria e popula o banco uma vez: as medições partem de um esquema já atualizado
+        subprocess.run(
+            [sys.executable, "main.py", "books", "add", "Livro", "Autor", "2000", "Categoria"],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        print(f"⏱️ Tempo de processo (mediana de {args.repeat} execuções)")
+        for label, command in SCENARIOS.items():
+            run(command, env)
+            timings = [run(command, env) for _ in range(args.repeat)]
+            print(f"  {label:<28} {statistics.median(timings) * 1000:8.1f} ms")
+
+        os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+        from src.database.connection import db_connection
+        from src.database.migrations import schema_is_current, upgrade_schema
+        from src.database.search import create_search_index
+
+        engine = db_connection.engine
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            schema_is_current(engine)
+        check = (time.perf_counter() - start) / args.repeat
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            upgrade_schema(engine)
+            create_search_index(engine)
+        full = (time.perf_counter() - start) / args.repeat
+        db_connection.close_connection()
+        print("\n🏗️ Checagem do esquema na inicialização")
+        print(f"  versão atual (usado)        {check * 1000:8.2f} ms")
+        print(f"  create_all + índice de busca {full * 1000:7.2f} ms")
+
+        command = ["main.py", *args.command.split()]
+        modules = import_times(command, env)
+
+    total = sum(cumulative for _, _, cumulative, depth in modules if depth == 0)
+    print(f"\n📦 Importações de 'main.py {args.command}': {total:.1f} ms (orçamento {args.budget_ms:.0f} ms)")
+    for name, own, _, _ in sorted(modules, key=lambda module: module[1], reverse=True)[:args.top]:
+        print(f"  {own:8.2f} ms  {name}")
+    heavy = sorted({name.split(".")[0] for name, *_ in modules} & {"colorama", "tabulate", "pyarrow", "redis"})
+    if heavy:
+        print(f"❌ Módulos fora do caminho rápido foram importados: {', '.join(heavy)}")
+        return False
+    if total > args.budget_ms:
+        print("❌ Orçamento de importação estourado")
+        return False
+    print("✅ Dentro do orçamento")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
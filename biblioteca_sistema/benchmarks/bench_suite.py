@@ -0,0 +1,397 @@
+"""
+Suíte de desempenho dos serviços: todos os métodos públicos, com linha de base e tolerância
+
+Gera bancos sintéticos de tamanhos crescentes (por padrão 1 mil, 100 mil e 1 milhão de livros,
+com metade disso em usuários e o dobro em empréstimos) e cronometra cada método público de
+BookService, UserService e LoanService e os relatórios do ReportService, no SQLite em arquivo
+e em memória.
+
+Cada cenário (backend, tamanho) roda num processo próprio, com conexão e cache zerados, sobre uma
+cópia do banco gerado; os bancos gerados ficam em --cache-dir e são reaproveitados.
+
+Com --save-baseline as medianas são gravadas em --baseline (JSON); nas execuções seguintes cada
+método é comparado com a base e a suíte sai com código 1 se algum ficar mais lento que ela além
+de --tolerance (e de --min-delta-ms, para o ruído dos métodos de microssegundos). A linha de base
+só vale para a máquina em que foi gravada.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics as stats
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+ROOT = Path(__file__).parent.parent
+BACKENDS = ("file", "memory")
+DEFAULT_SIZES = "1000,100000,1000000"
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "biblioteca-bench-suite"
+
+
+def scenario_size(books: int) -> tuple:
+    """(livros, usuários, empréstimos) de um cenário com `books` livros."""
+    return books, max(10, books // 2), books * 2
+
+
+def seeded_database(cache_dir: Path, books: int) -> Path:
+    """Banco gerado para `books` livros, criado só na primeira vez (por versão do esquema)."""
+    from sqlalchemy import create_engine
+    from fixtures import seed_database
+    from src.database.migrations import LATEST_VERSION, upgrade_schema
+    from src.database.search import create_search_index
+
+    path = cache_dir / f"suite-{books}-v{LATEST_VERSION}.db"
+    if path.exists():
+        return path
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    books, users, loans = scenario_size(books)
+    print(f"🌱 Gerando {books} livros, {users} usuários e {loans} empréstimos em {path}...", file=sys.stderr)
+    engine = create_engine(f"sqlite:///{partial}")
+    upgrade_schema(engine)
+    seed_database(engine, books, users, loans)
+    create_search_index(engine)
+    engine.dispose()
+    partial.rename(path)
+    return path
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    return {
+        "calls": len(samples),
+        "median_ms": round(stats.median(samples) * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+    }
+
+
+def run_scenario(backend: str, source: str, books: int, repeat: int, heavy_repeat: int) -> dict:
+    """Cronometra os métodos num banco novo (cópia de `source`); roda no processo do cenário."""
+    tmp = tempfile.TemporaryDirectory()
+    if backend == "file":
+        path = os.path.join(tmp.name, "suite.db")
+        shutil.copyfile(source, path)
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    else:
+        os.environ["DATABASE_URL"] = "sqlite://"
+
+    from sqlalchemy import func, select
+    from src.database.connection import db_connection
+    from src.database.models import Book, Copy
+    from src.services.book_service import BookService
+    from src.services.loan_service import LoanService
+    from src.services.pagination import DEFAULT_PAGE_SIZE
+    from src.services.report_service import ReportService
+    from src.services.user_service import UserService
+
+    if backend == "memory":
+        # O SQLite em memória vive numa só conexão, que o pool do SQLAlchemy mantém por thread;
+        # ela recebe o banco gerado pela API de backup
+        raw = db_connection.engine.raw_connection()
+        origin = sqlite3.connect(source)
+        origin.backup(raw.driver_connection)
+        origin.close()
+        raw.close()
+
+    books_service, users_service, loans_service = BookService(), UserService(), LoanService()
+    reports = ReportService()
+    _, users, _ = scenario_size(books)
+    rng = random.Random(7)
+    calls = repeat + 1  # a primeira chamada de cada método é aquecimento
+
+    def book_ids(count: int = calls) -> list:
+        return [rng.randint(1, books) for _ in range(count)]
+
+    def user_ids(count: int = calls) -> list:
+        return [rng.randint(1, users) for _ in range(count)]
+
+    def each(inputs: list, call):
+        pending = iter(inputs)
+        return lambda: call(next(pending))
+
+    with db_connection.session_scope() as session:
+        on_shelf = list(
+            session.scalars(select(Book.id).where(Book.copies_available > 0).order_by(func.random()).limit(4 * calls))
+        )
+        categories = list(session.scalars(select(Book.category).distinct()))
+    created_books, created_users, new_loans, new_batches = [], [], [], []
+
+    def add_book(i: int) -> None:
+        created_books.append(books_service.add_book(f"Livro novo {i}", "Autora Nova", 2024, "Tecnologia").id)
+
+    def add_user(i: int) -> None:
+        created_users.append(users_service.add_user(f"Leitor {i}", f"leitor{i}@suite.com", "(11) 91111-1111").id)
+
+    def shelf_copies() -> list:
+        with db_connection.session_scope() as session:
+            return [
+                session.scalars(select(Copy.id).where(Copy.book_id == book_id, Copy.is_available == True)).first()
+                for book_id in created_books
+            ]
+
+    def create_loan(book_id: int) -> None:
+        new_loans.append(loans_service.create_loan(rng.randint(1, users), book_id).id)
+
+    def create_loans(i: int) -> None:
+        outcomes = loans_service.create_loans(rng.randint(1, users), on_shelf[calls + 3 * i:calls + 3 * i + 3])
+        new_batches.append([outcome.loan_id for outcome in outcomes if outcome.success])
+
+    # (método, consultas que varrem tabelas inteiras, preparo que devolve a chamada cronometrada);
+    # a ordem importa: as escritas usam os livros, usuários e empréstimos criados nas anteriores
+    cases = [
+        ("BookService.add_book", False, lambda: each(range(calls), add_book)),
+        ("BookService.add_copies", False, lambda: each(list(created_books), books_service.add_copies)),
+        ("BookService.remove_copy", False, lambda: each(shelf_copies(), books_service.remove_copy)),
+        ("BookService.get_copy_counts", False, lambda: each(book_ids(), books_service.get_copy_counts)),
+        (
+            "BookService.get_all_books",
+            False,
+            lambda: each(book_ids(), lambda after: books_service.get_all_books(after, DEFAULT_PAGE_SIZE)),
+        ),
+        ("BookService.get_book_by_id", False, lambda: each(book_ids(), books_service.get_book_by_id)),
+        (
+            "BookService.get_available_books",
+            False,
+            lambda: each(book_ids(), lambda after: books_service.get_available_books(after, DEFAULT_PAGE_SIZE)),
+        ),
+        (
+            "BookService.get_books_by_category",
+            False,
+            lambda: each(
+                rng.choices(categories, k=calls),
+                lambda category: books_service.get_books_by_category(category, limit=DEFAULT_PAGE_SIZE),
+            ),
+        ),
+        (
+            "BookService.search_books",
+            False,
+            lambda: each(
+                [f"Autor {rng.randint(1, max(1, books // 10))}" for _ in range(calls)],
+                lambda term: books_service.search_books(term, limit=20),
+            ),
+        ),
+        (
+            "BookService.update_book_availability",
+            False,
+            lambda: each(list(created_books), lambda book_id: books_service.update_book_availability(book_id, False)),
+        ),
+        ("BookService.delete_book", False, lambda: each(list(created_books), books_service.delete_book)),
+        ("BookService.get_books_count_by_status", False, lambda: books_service.get_books_count_by_status),
+        ("BookService.get_books_count_by_category", False, lambda: books_service.get_books_count_by_category),
+        ("UserService.add_user", False, lambda: each(range(calls), add_user)),
+        (
+            "UserService.get_all_users",
+            False,
+            lambda: each(user_ids(), lambda after: users_service.get_all_users(after, DEFAULT_PAGE_SIZE)),
+        ),
+        ("UserService.get_user_by_id", False, lambda: each(user_ids(), users_service.get_user_by_id)),
+        (
+            "UserService.get_user_by_email",
+            False,
+            lambda: each([f"usuario{user_id}@email.com" for user_id in user_ids()], users_service.get_user_by_email),
+        ),
+        (
+            "UserService.search_users",
+            True,
+            lambda: each(
+                [f"Usuário {user_id}" for user_id in user_ids(heavy_repeat + 1)],
+                lambda term: users_service.search_users(term, limit=DEFAULT_PAGE_SIZE),
+            ),
+        ),
+        (
+            "UserService.update_user",
+            False,
+            lambda: each(
+                list(created_users), lambda user_id: users_service.update_user(user_id, phone="(11) 92222-2222")
+            ),
+        ),
+        ("UserService.delete_user", False, lambda: each(list(created_users), users_service.delete_user)),
+        ("LoanService.create_loan", False, lambda: each(on_shelf[:calls], create_loan)),
+        ("LoanService.renew_loan", False, lambda: each(list(new_loans), loans_service.renew_loan)),
+        ("LoanService.return_loan", False, lambda: each(list(new_loans), loans_service.return_loan)),
+        ("LoanService.create_loans", False, lambda: each(range(calls), create_loans)),
+        ("LoanService.return_loans", False, lambda: each(list(new_batches), loans_service.return_loans)),
+        (
+            "LoanService.get_overdue_loans",
+            False,
+            lambda: lambda: list(islice(loans_service.get_overdue_loans(), DEFAULT_PAGE_SIZE)),
+        ),
+        (
+            "LoanService.get_overdue_loan_listing",
+            False,
+            lambda: lambda: list(islice(loans_service.get_overdue_loan_listing(), DEFAULT_PAGE_SIZE)),
+        ),
+        ("LoanService.mark_overdue", False, lambda: loans_service.mark_overdue),
+        (
+            "LoanService.get_active_loans_by_user",
+            False,
+            lambda: each(
+                user_ids(), lambda user_id: loans_service.get_active_loans_by_user(user_id, limit=DEFAULT_PAGE_SIZE)
+            ),
+        ),
+        (
+            "LoanService.get_active_loans",
+            False,
+            lambda: lambda: loans_service.get_active_loans(limit=DEFAULT_PAGE_SIZE),
+        ),
+        (
+            "LoanService.get_returned_loans",
+            False,
+            lambda: lambda: loans_service.get_returned_loans(limit=DEFAULT_PAGE_SIZE),
+        ),
+        (
+            "LoanService.get_user_history",
+            False,
+            lambda: each(user_ids(), lambda user_id: loans_service.get_user_history(user_id, limit=20)),
+        ),
+        (
+            "LoanService.get_active_loan_listing",
+            False,
+            lambda: lambda: loans_service.get_active_loan_listing(limit=DEFAULT_PAGE_SIZE),
+        ),
+        (
+            "LoanService.get_user_history_listing",
+            False,
+            lambda: each(user_ids(), lambda user_id: loans_service.get_user_history_listing(user_id, limit=20)),
+        ),
+        ("ReportService.top_books", True, lambda: reports.top_books),
+        ("ReportService.top_users", True, lambda: reports.top_users),
+        ("ReportService.loans_per_month", True, lambda: reports.loans_per_month),
+        ("ReportService.circulation_by_category", True, lambda: reports.circulation_by_category),
+    ]
+
+    results = {}
+    for name, heavy, prepare in cases:
+        call = prepare()
+        call()
+        samples = []
+        for _ in range(heavy_repeat if heavy else repeat):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+    db_connection.close_connection()
+    tmp.cleanup()
+    return results
+
+
+def run_in_subprocess(backend: str, source: Path, books: int, args) -> dict:
+    command = [
+        __file__, "--worker", backend, str(source), str(books),
+        "--repeat", str(args.repeat), "--heavy-repeat", str(args.heavy_repeat),
+    ]
+    env = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "DB_INSTRUMENT")}
+    result = subprocess.run([sys.executable, *command], cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(result.stdout)
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Métodos mais lentos que a base além da tolerância: (cenário, método, base, atual)."""
+    regressions = []
+    for scenario, methods in current.items():
+        for name, result in methods.items():
+            base = baseline.get(scenario, {}).get(name)
+            if base is None:
+                continue
+            limit = max(base["median_ms"] * (1 + tolerance), base["median_ms"] + min_delta_ms)
+            if result["median_ms"] > limit:
+                regressions.append((scenario, name, base["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def print_scenario(scenario: str, results: dict, baseline: dict) -> None:
+    print(f"\n📊 {scenario}")
+    print(f"{'método':<44}{'mediana':>12}{'p95':>12}{'base':>12}{'variação':>10}")
+    for name, result in results.items():
+        base = baseline.get(scenario, {}).get(name)
+        base_text, change = "-", ""
+        if base is not None:
+            base_text = f"{base['median_ms']:.3f}"
+            change = f"{(result['median_ms'] / base['median_ms'] - 1) * 100:+.0f}%" if base["median_ms"] else ""
+        print(f"{name:<44}{result['median_ms']:>9.3f} ms{result['p95_ms']:>9.3f} ms{base_text:>12}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Livros por cenário, separados por vírgula")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="file, memory ou os dois")
+    parser.add_argument("--repeat", type=int, default=30, help="Chamadas medidas por método")
+    parser.add_argument("--heavy-repeat", type=int, default=5, help="Chamadas dos relatórios e varreduras")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova base")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Lentidão aceita sobre a base (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Diferença mínima de uma regressão")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--worker", nargs=3, metavar=("BACKEND", "DB", "BOOKS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, source, books = args.worker
+        json.dump(run_scenario(backend, source, int(books), args.repeat, args.heavy_repeat), sys.stdout)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = [backend.strip() for backend in args.backends.split(",")]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"backend desconhecido: {', '.join(sorted(unknown))}")
+
+    saved = {}
+    if args.baseline.exists():
+        with open(args.baseline, encoding="utf-8") as previous:
+            saved = json.load(previous)
+    baseline = saved.get("results", {})
+
+    current = {}
+    for books in sizes:
+        source = seeded_database(args.cache_dir, books)
+        for backend in backends:
+            scenario = f"{backend}/{books}"
+            current[scenario] = run_in_subprocess(backend, source, books, args)
+            print_scenario(scenario, current[scenario], baseline)
+
+    if args.save_baseline:
+        saved = {
+            "meta": {
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "machine": platform.node(),
+                "repeat": args.repeat,
+            },
+            "results": {**baseline, **current},
+        }
+        with open(args.baseline, "w", encoding="utf-8") as output:
+            json.dump(saved, output, ensure_ascii=False, indent=2)
+        print(f"\n💾 Linha de base gravada em {args.baseline}")
+        return
+
+    if not baseline:
+        print(f"\nℹ️ Sem linha de base em {args.baseline}; grave uma com --save-baseline")
+        return
+    regressions = compare(current, baseline, args.tolerance, args.min_delta_ms)
+    if not regressions:
+        print(f"\n✅ Nenhum método mais lento que a base além de {args.tolerance:.0%}")
+        return
+    print(f"\n❌ {len(regressions)} método(s) mais lentos que a base além de {args.tolerance:.0%}:")
+    for scenario, name, base, result in regressions:
+        print(f"   {scenario:<16}{name:<44}{base:>9.3f} ms → {result:.3f} ms")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Bancos sintéticos compartilhados pelos benchmarks
+
+Os dados vêm do gerador de `database/seed_data.py`: popularidade Zipf dos livros e
+categorias enviesadas, reproduzíveis pelo `seed`.
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "database"))
+
+from sqlalchemy import create_engine
+from src.database.models import Base
+from seed_data import GeneratorConfig, SyntheticDataGenerator
+
+
+def seed_database(
+    engine, books: int, users: int, loans: int, seed: int = 42, returned_ratio: float = 0.8, **options
+) -> None:
+    """Popula o banco com inserts em lote; `options` repassa os demais campos de GeneratorConfig."""
+    config = GeneratorConfig(books=books, users=users, loans=loans, seed=seed, returned_ratio=returned_ratio, **options)
+    SyntheticDataGenerator(engine, config).generate()
+
+
+def create_sqlite_engine(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return engine
@@ -0,0 +1,180 @@
+"""
+Teste de carga da API HTTP: latência p50/p95/p99 e requisições por segundo
+
+Sem --url, sobe `main.py serve` num banco SQLite temporário populado pelos fixtures.
+Com --url, mede um servidor já em execução (por exemplo, apontado para PostgreSQL).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+ROOT = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, tmp: str):
+    from fixtures import create_sqlite_engine, seed_database
+
+    db_path = os.path.join(tmp, "load.db")
+    engine = create_sqlite_engine(db_path)
+    print(f"🌱 Gerando {args.books} livros, {args.users} usuários e {args.loans} empréstimos...")
+    seed_database(engine, args.books, args.users, args.loans)
+    engine.dispose()
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    command = [sys.executable, str(ROOT / "main.py"), "serve", "--port", str(port)]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            connection.getresponse().read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Servidor não respondeu")
+
+
+def scenario(books: int, users: int, writes: bool):
+    """Mistura de operações: (peso, rótulo, função que gera método, caminho e corpo)."""
+    operations = [
+        (40, "GET /books/{id}", lambda rng: ("GET", f"/books/{rng.randint(1, books)}", None)),
+        (10, "GET /books/search", lambda rng: ("GET", f"/books/search?q=Autor+{rng.randint(1, 50)}&limit=20", None)),
+        (15, "GET /loans/active", lambda rng: ("GET", "/loans/active?limit=20", None)),
+        (15, "GET /users/{id}/loans", lambda rng: ("GET", f"/users/{rng.randint(1, users)}/loans?limit=20", None)),
+        (10, "GET /reports/summary", lambda rng: ("GET", "/reports/summary", None)),
+    ]
+    if writes:
+        operations.append(
+            (
+                10,
+                "POST /loans",
+                lambda rng: (
+                    "POST",
+                    "/loans",
+                    {"user_id": rng.randint(1, users), "book_id": rng.randint(1, books)},
+                ),
+            )
+        )
+    return operations
+
+
+def worker(url: str, operations, deadline: float, seed: int, results: dict, lock: threading.Lock) -> None:
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    weights = [weight for weight, _, _ in operations]
+    latencies = defaultdict(list)
+    statuses = Counter()
+    while time.perf_counter() < deadline:
+        _, label, build = rng.choices(operations, weights)[0]
+        method, path, body = build(rng)
+        payload = json.dumps(body).encode() if body is not None else None
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            statuses["erro de conexão"] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            continue
+        latencies[label].append(time.perf_counter() - start)
+    connection.close()
+    with lock:
+        for label, values in latencies.items():
+            results["latencies"][label].extend(values)
+        results["statuses"].update(statuses)
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Servidor já em execução (ex.: http://127.0.0.1:8000)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument("--read-only", action="store_true", help="Sem empréstimos (POST /loans)")
+    parser.add_argument("--workers", type=int, help="Workers do servidor iniciado pelo script")
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--loans", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args, tmp.name)
+    try:
+        operations = scenario(args.books, args.users, not args.read_only)
+        results = {"latencies": defaultdict(list), "statuses": Counter()}
+        lock = threading.Lock()
+        print(f"🚀 {args.concurrency} clientes por {args.duration:.0f}s contra {url}")
+        deadline = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=worker, args=(url, operations, deadline, seed, results, lock))
+            for seed in range(args.concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        tmp.cleanup()
+
+    all_latencies = [value for values in results["latencies"].values() for value in values]
+    if not all_latencies:
+        print("❌ Nenhuma requisição concluída")
+        return
+    print(f"\n{'operação':<24}{'reqs':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, values in sorted(results["latencies"].items()):
+        print(
+            f"{label:<24}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+            f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}"
+        )
+    throughput = len(all_latencies) / elapsed
+    print(f"\n📊 Total: {len(all_latencies)} requisições em {elapsed:.1f}s = {throughput:,.0f} req/s")
+    print(
+        f"   p50 {percentile(all_latencies, 0.5) * 1000:.1f} ms | p99 {percentile(all_latencies, 0.99) * 1000:.1f} ms"
+        f" | média {statistics.mean(all_latencies) * 1000:.1f} ms"
+    )
+    statuses = sorted(results["statuses"].items(), key=str)
+    print("   Status: " + ", ".join(f"{status}: {count}" for status, count in statuses))
+
+
+if __name__ == "__main__":
+    main()
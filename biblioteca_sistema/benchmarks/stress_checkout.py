@@ -0,0 +1,97 @@
+"""
+Teste de estresse do empréstimo concorrente: várias mesas disputando os mesmos livros
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--books", type=int, default=20, help="Poucos livros forçam disputa pelo mesmo exemplar")
+    parser.add_argument("--attempts", type=int, default=200, help="Tentativas de empréstimo por thread")
+    parser.add_argument("--return-rate", type=float, default=0.9, help="Chance de devolver logo após emprestar")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'stress.db')}"
+
+    from src.database.connection import db_connection
+    from src.database.models import Loan, Book
+    from src.services.book_service import BookService
+    from src.services.user_service import UserService
+    from src.services.loan_service import LoanService
+
+    book_ids = [BookService().add_book(f"Livro {i}", "Autor", 2000, "Romance").id for i in range(args.books)]
+    user_ids = [UserService().add_user(f"Mesa {i}", f"mesa{i}@email.com", "0").id for i in range(args.threads)]
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def desk(user_id: int) -> None:
+        service = LoanService()
+        rng = random.Random(user_id)
+        local = Counter()
+        for _ in range(args.attempts):
+            try:
+                loan = service.create_loan(user_id, rng.choice(book_ids))
+                local["emprestados"] += 1
+                if rng.random() < args.return_rate:
+                    service.return_loan(loan.id)
+                    local["devolvidos"] += 1
+            except ValueError:
+                local["indisponíveis"] += 1
+            except Exception as e:
+                local[f"erro: {type(e).__name__}"] += 1
+        with lock:
+            outcomes.update(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=desk, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with db_connection.session_scope() as session:
+        active = Counter(book_id for (book_id,) in session.query(Loan.book_id).filter(Loan.is_returned == False))
+        unavailable = {book_id for (book_id,) in session.query(Book.id).filter(Book.is_available == False)}
+        history = session.query(Loan.book_id, Loan.loan_date, Loan.return_date).order_by(Loan.book_id, Loan.loan_date)
+        # Dois empréstimos do mesmo livro nunca podem se sobrepor no tempo
+        overlaps = 0
+        previous = None
+        for book_id, loan_date, return_date in history:
+            if previous and previous[0] == book_id and (previous[2] is None or previous[2] > loan_date):
+                overlaps += 1
+            previous = (book_id, loan_date, return_date)
+    double_loans = {book_id: count for book_id, count in active.items() if count > 1}
+    consistent = set(active) == unavailable
+
+    total = sum(outcomes.values())
+    print(f"⏱️ {total} operações de {args.threads} threads em {elapsed:.2f}s ({total / elapsed:,.0f} ops/s)")
+    for label, count in sorted(outcomes.items()):
+        print(f"  {label}: {count}")
+    print(f"📊 Pool: {db_connection.get_pool_status()}")
+    db_connection.close_connection()
+    tmp.cleanup()
+    if double_loans or overlaps or not consistent:
+        print(
+            f"❌ Inconsistência: empréstimos duplos={double_loans}, sobreposições={overlaps}, "
+            f"status dos livros consistente={consistent}"
+        )
+        return False
+    print("✅ Nenhum livro emprestado duas vezes e status dos livros consistente")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
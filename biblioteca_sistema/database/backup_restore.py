@@ -1,70 +1,330 @@
 """
 Script para backup e restore do banco de dados
 """
+import gzip
+import hashlib
+import json
 import os
 import shutil
 import sqlite3
+import struct
+import time
+from contextlib import closing
 from datetime import datetime
 
 
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "1024"))
+BACKUP_SLEEP = float(os.getenv("BACKUP_SLEEP", "0.01"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+# Segundos que a restauração espera pela trava de escrita do banco em uso
+RESTORE_TIMEOUT = float(os.getenv("RESTORE_TIMEOUT", "30"))
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+DIFF_MAGIC = b"BIBDIFF1"
+HASHES_MAGIC = b"BIBHASH1"
+HASH_SIZE = 16
+BACKUP_SUFFIXES = tuple(f"{kind}{extension}" for kind in (".db", ".diff") for extension in COMPRESSIONS.values())
+
+
+def _compression_of(path: str) -> str:
+    for name, extension in COMPRESSIONS.items():
+        if extension and path.endswith(extension):
+            return name
+    return "none"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("A compressão zstd requer o pacote zstandard (pip install zstandard)")
+    return zstandard
+
+
+def open_write(path: str, compression: str):
+    """Abre um arquivo de backup para escrita, comprimindo em fluxo."""
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
+
+
+def open_read(path: str):
+    """Abre um arquivo de backup para leitura, descomprimindo em fluxo conforme a extensão."""
+    compression = _compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        return _zstd().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def page_hashes(path: str, page_size: int):
+    """Hash de cada página do arquivo do banco, lido em fluxo."""
+    with open(path, "rb") as handle:
+        while True:
+            page = handle.read(page_size)
+            if not page:
+                return
+            yield hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+
+
+def _page_size(path: str) -> int:
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def _read_exact(handle, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = handle.read(size - len(data))
+        if not chunk:
+            raise ValueError("Arquivo de backup truncado")
+        data += chunk
+    return data
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
 class DatabaseBackup:
-    def __init__(self, db_path: str = "database/biblioteca.db") -> None:
+    def __init__(self, db_path: str = "database/biblioteca.db", compression: str | None = None) -> None:
         self.db_path = db_path
         self.backup_dir = "database/backups"
+        self.compression = compression or os.getenv("BACKUP_COMPRESSION", "none")
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f"Compressão desconhecida: {self.compression} (use {', '.join(COMPRESSIONS)})")
         os.makedirs(self.backup_dir, exist_ok=True)
-    
-    def create_backup(self, backup_name: str | None = None):
+
+    def _snapshot(self, target_path: str) -> int:
+        """Cópia online, algumas páginas por vez, liberando o banco para o balcão entre os passos."""
+        restarts = []
+
+        def progress(status, remaining, total):
+            # Uma escrita de outra conexão faz o SQLite recomeçar a cópia; com o balcão sempre
+            # escrevendo, o backup paginado poderia não terminar nunca
+            if restarts and remaining > restarts[-1]:
+                restarts.append(-1)
+                if restarts.count(-1) >= BACKUP_MAX_RESTARTS:
+                    raise _BackupRestarted
+            restarts.append(remaining)
+
+        with closing(sqlite3.connect(self.db_path)) as source, closing(sqlite3.connect(target_path)) as target:
+            try:
+                source.backup(target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, progress=progress)
+            except _BackupRestarted:
+                print("⚠️ Banco muito movimentado: concluindo o backup de uma só vez")
+                source.backup(target)
+            return target.execute("PRAGMA page_count").fetchone()[0]
+
+    def _hashes_path(self, backup_path: str) -> str:
+        return backup_path + ".pages"
+
+    def _write_hashes(self, snapshot_path: str, backup_path: str) -> None:
+        page_size = _page_size(snapshot_path)
+        with open(self._hashes_path(backup_path), "wb") as handle:
+            handle.write(HASHES_MAGIC + struct.pack(">I", page_size))
+            for digest in page_hashes(snapshot_path, page_size):
+                handle.write(digest)
+
+    def _read_hashes(self, backup_path: str) -> tuple:
+        with open(self._hashes_path(backup_path), "rb") as handle:
+            if handle.read(len(HASHES_MAGIC)) != HASHES_MAGIC:
+                raise ValueError("Arquivo de hashes inválido")
+            page_size = struct.unpack(">I", handle.read(4))[0]
+            data = handle.read()
+        return page_size, [data[i:i + HASH_SIZE] for i in range(0, len(data), HASH_SIZE)]
+
+    def create_backup(self, backup_name: str | None = None, compression: str | None = None):
+        """Backup completo online; grava também os hashes das páginas, base dos diferenciais."""
         if not os.path.exists(self.db_path):
             print("❌ Banco de dados não encontrado!")
             return False
+        compression = compression or self.compression
+        snapshot_path = None
         try:
             if not backup_name:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 backup_name = f"biblioteca_backup_{timestamp}.db"
-            backup_path = os.path.join(self.backup_dir, backup_name)
-            with sqlite3.connect(self.db_path) as source:
-                with sqlite3.connect(backup_path) as backup:
-                    source.backup(backup)
+            backup_path = os.path.join(self.backup_dir, backup_name + COMPRESSIONS[compression])
+            start = time.perf_counter()
+            snapshot_path = os.path.join(self.backup_dir, f".{backup_name}.tmp")
+            page_count = self._snapshot(snapshot_path)
+            if compression != "none":
+                with open(snapshot_path, "rb") as source, open_write(backup_path, compression) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+            self._write_hashes(snapshot_path, backup_path)
+            if compression == "none":
+                os.replace(snapshot_path, backup_path)
             file_size = os.path.getsize(backup_path)
             print(f"✅ Backup criado: {backup_path}")
-            print(f"📏 Tamanho: {file_size} bytes")
+            print(f"📏 Tamanho: {file_size} bytes ({page_count} páginas em {time.perf_counter() - start:.2f}s)")
             return backup_path
         except Exception as e:
             print(f"❌ Erro ao criar backup: {str(e)}")
             return False
-    
-    def restore_backup(self, backup_path: str) -> bool:
+        finally:
+            if snapshot_path and os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    def create_differential_backup(self, base_path: str | None = None, compression: str | None = None):
+        """Grava só as páginas que mudaram desde o backup completo `base_path` (o mais recente, se omitido)."""
+        if base_path is None:
+            bases = [backup for backup in self.list_backups() if backup['kind'] == 'completo']
+            if not bases:
+                print("❌ Nenhum backup completo para servir de base!")
+                return False
+            base_path = bases[0]['path']
+        if not os.path.exists(self._hashes_path(base_path)):
+            print("❌ O backup base não tem hashes de páginas; crie um backup completo novo")
+            return False
+        compression = compression or self.compression
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_path = os.path.join(self.backup_dir, f"biblioteca_diff_{timestamp}.diff{COMPRESSIONS[compression]}")
+        snapshot_path = os.path.join(self.backup_dir, f".diff_{timestamp}.tmp")
+        try:
+            start = time.perf_counter()
+            page_count = self._snapshot(snapshot_path)
+            page_size, base_hashes = self._read_hashes(base_path)
+            if _page_size(snapshot_path) != page_size:
+                print("❌ Tamanho de página mudou desde o backup base; crie um backup completo")
+                return False
+            header = json.dumps(
+                {"base": os.path.basename(base_path), "page_size": page_size, "page_count": page_count}
+            ).encode("utf-8")
+            changed = 0
+            with open(snapshot_path, "rb") as source, open_write(backup_path, compression) as target:
+                target.write(DIFF_MAGIC + struct.pack(">I", len(header)) + header)
+                for number, digest in enumerate(page_hashes(snapshot_path, page_size), start=1):
+                    page = source.read(page_size)
+                    if number <= len(base_hashes) and base_hashes[number - 1] == digest:
+                        continue
+                    target.write(struct.pack(">I", number) + page)
+                    changed += 1
+            print(f"✅ Backup diferencial criado: {backup_path}")
+            print(
+                f"📏 {changed} de {page_count} páginas alteradas, {os.path.getsize(backup_path)} bytes "
+                f"em {time.perf_counter() - start:.2f}s"
+            )
+            return backup_path
+        except Exception as e:
+            print(f"❌ Erro ao criar backup diferencial: {str(e)}")
+            if os.path.exists(backup_path):
+                os.remove(backup_path)
+            return False
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    def _read_diff_header(self, diff_path: str):
+        handle = open_read(diff_path)
+        if _read_exact(handle, len(DIFF_MAGIC)) != DIFF_MAGIC:
+            handle.close()
+            raise ValueError("Arquivo diferencial inválido")
+        size = struct.unpack(">I", _read_exact(handle, 4))[0]
+        return handle, json.loads(_read_exact(handle, size))
+
+    def _materialize(self, backup_path: str, target_path: str) -> None:
+        """Monta em `target_path` o banco contido no backup (completo ou base + diferencial)."""
+        if ".diff" not in os.path.basename(backup_path):
+            with open_read(backup_path) as source, open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            return
+        handle, header = self._read_diff_header(backup_path)
+        with handle:
+            base_path = os.path.join(os.path.dirname(backup_path), header["base"])
+            if not os.path.exists(base_path):
+                raise ValueError(f"Backup base não encontrado: {header['base']}")
+            self._materialize(base_path, target_path)
+            page_size = header["page_size"]
+            with open(target_path, "r+b") as target:
+                while True:
+                    number = handle.read(4)
+                    if not number:
+                        break
+                    if len(number) < 4:
+                        number += _read_exact(handle, 4 - len(number))
+                    target.seek((struct.unpack(">I", number)[0] - 1) * page_size)
+                    target.write(_read_exact(handle, page_size))
+                target.truncate(header["page_count"] * page_size)
+
+    def verify_backup(self, backup_path: str) -> bool:
+        """Monta o backup num arquivo temporário e roda o integrity_check do SQLite."""
+        target_path = os.path.join(self.backup_dir, ".verify.tmp")
+        try:
+            self._materialize(backup_path, target_path)
+            return self._integrity_ok(target_path)
+        finally:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+
+    def _integrity_ok(self, path: str) -> bool:
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            conn.close()
+
+    def restore_backup(self, backup_path: str, confirm: bool = True) -> bool:
         if not os.path.exists(backup_path):
             print("❌ Arquivo de backup não encontrado!")
             return False
+        # Monta e verifica numa cópia ao lado do banco antes de tocar nele
+        restore_path = self.db_path + ".restore.tmp"
         try:
             print("⚠️ Isso irá sobrescrever o banco atual!")
             print(f"Backup: {backup_path}")
             print(f"Destino: {self.db_path}")
-            response = input("Confirma restauração? (s/N): ").lower()
-            if response != 's':
-                print("Operação cancelada.")
+            if confirm:
+                response = input("Confirma restauração? (s/N): ").lower()
+                if response != 's':
+                    print("Operação cancelada.")
+                    return False
+            print("🔎 Verificando integridade do backup...")
+            self._materialize(backup_path, restore_path)
+            if not self._integrity_ok(restore_path):
+                print("❌ Backup corrompido (integrity_check falhou); banco atual mantido")
                 return False
-            current_backup = self.create_backup("before_restore_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".db")
-            if current_backup:
-                print(f"📋 Backup do banco atual salvo em: {current_backup}")
-            shutil.copy2(backup_path, self.db_path)
+            if os.path.exists(self.db_path):
+                current_backup = self.create_backup(
+                    "before_restore_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".db"
+                )
+                if current_backup:
+                    print(f"📋 Backup do banco atual salvo em: {current_backup}")
+            # Copia pela API de backup para dentro do banco em uso: ela trava o banco como qualquer escritor
+            # e cuida do WAL, sem apagar arquivos sob conexões abertas da API ou da CLI; quem estiver
+            # conectado passa a ler o banco restaurado
+            with closing(sqlite3.connect(restore_path)) as source, closing(
+                sqlite3.connect(self.db_path, timeout=RESTORE_TIMEOUT)
+            ) as target:
+                # O backup insiste enquanto o banco estiver ocupado; a trava de teste desiste em
+                # RESTORE_TIMEOUT se outro processo segura uma transação
+                target.execute("BEGIN EXCLUSIVE")
+                target.rollback()
+                source.backup(target)
             print("✅ Banco restaurado com sucesso!")
             return True
         except Exception as e:
             print(f"❌ Erro ao restaurar backup: {str(e)}")
             return False
-    
+        finally:
+            if os.path.exists(restore_path):
+                os.remove(restore_path)
+
     def list_backups(self):
         backups = []
         if not os.path.exists(self.backup_dir):
             return backups
         for file in os.listdir(self.backup_dir):
-            if file.endswith('.db'):
+            if file.endswith(BACKUP_SUFFIXES):
                 file_path = os.path.join(self.backup_dir, file)
                 file_size = os.path.getsize(file_path)
                 file_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-                backups.append({'name': file, 'path': file_path, 'size': file_size, 'date': file_date})
+                kind = 'diferencial' if '.diff' in file else 'completo'
+                backups.append({'name': file, 'path': file_path, 'size': file_size, 'date': file_date, 'kind': kind})
         backups.sort(key=lambda x: x['date'], reverse=True)
         return backups
     
@@ -73,17 +333,29 @@ class DatabaseBackup:
         if len(backups) <= keep_count:
             print(f"ℹ️ {len(backups)} backups encontrados (mantendo todos)")
             return
-        to_remove = backups[keep_count:]
+        # Bases de diferenciais mantidos continuam necessárias para a restauração
+        needed = set()
+        for backup in backups[:keep_count]:
+            if backup['kind'] == 'diferencial':
+                try:
+                    handle, header = self._read_diff_header(backup['path'])
+                    handle.close()
+                    needed.add(header['base'])
+                except (OSError, ValueError, RuntimeError):
+                    pass
+        to_remove = [backup for backup in backups[keep_count:] if backup['name'] not in needed]
         removed_count = 0
         for backup in to_remove:
             try:
                 os.remove(backup['path'])
+                if os.path.exists(self._hashes_path(backup['path'])):
+                    os.remove(self._hashes_path(backup['path']))
                 removed_count += 1
                 print(f"🗑️ Removido: {backup['name']}")
             except Exception as e:
                 print(f"❌ Erro ao remover {backup['name']}: {str(e)}")
         print(f"✅ {removed_count} backups antigos removidos")
-        print(f"📋 {keep_count} backups mais recentes mantidos")
+        print(f"📋 {len(backups) - removed_count} backups mantidos")
 
 
 def backup_menu() -> None:
@@ -93,26 +365,30 @@ def backup_menu() -> None:
         print("🗄️  GERENCIAMENTO DE BACKUP")
         print("=" * 50)
         print("1. 💾 Criar Backup")
-        print("2. 📋 Listar Backups")
-        print("3. ↩️  Restaurar Backup")
-        print("4. 🧹 Limpar Backups Antigos")
-        print("5. ❌ Sair")
+        print("2. 🧩 Criar Backup Diferencial")
+        print("3. 📋 Listar Backups")
+        print("4. ↩️  Restaurar Backup")
+        print("5. 🧹 Limpar Backups Antigos")
+        print("6. ❌ Sair")
         choice = input("\nEscolha uma opção: ").strip()
         if choice == '1':
             print("\n🔄 Criando backup...")
             backup_manager.create_backup()
         elif choice == '2':
+            print("\n🔄 Criando backup diferencial sobre o último backup completo...")
+            backup_manager.create_differential_backup()
+        elif choice == '3':
             print("\n📋 Backups disponíveis:")
             backups = backup_manager.list_backups()
             if not backups:
                 print("Nenhum backup encontrado.")
             else:
                 for i, backup in enumerate(backups, 1):
-                    print(f"{i}. {backup['name']}")
+                    print(f"{i}. {backup['name']} ({backup['kind']})")
                     print(f"   📅 {backup['date'].strftime('%d/%m/%Y %H:%M:%S')}")
                     print(f"   📏 {backup['size']} bytes")
                     print()
-        elif choice == '3':
+        elif choice == '4':
             backups = backup_manager.list_backups()
             if not backups:
                 print("❌ Nenhum backup disponível.")
@@ -128,13 +404,13 @@ def backup_menu() -> None:
                     print("❌ Opção inválida!")
             except ValueError:
                 print("❌ Digite um número válido!")
-        elif choice == '4':
+        elif choice == '5':
             try:
                 keep = int(input("Quantos backups manter? (padrão: 5): ") or "5")
                 backup_manager.cleanup_old_backups(keep)
             except ValueError:
                 print("❌ Digite um número válido!")
-        elif choice == '5':
+        elif choice == '6':
             break
         else:
             print("❌ Opção inválida!")
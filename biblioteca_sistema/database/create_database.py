@@ -10,7 +10,8 @@ from datetime import datetime
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy import create_engine, text
-from src.database.models import Base
+from src.database.migrations import upgrade_schema
+from src.database.search import create_search_index
 
 
 class DatabaseCreator:
@@ -33,12 +34,15 @@ class DatabaseCreator:
                     return False
                 os.remove(self.db_path)
             
+            # DB_ECHO=1 mostra todo o SQL da criação; para medir consultas use DB_INSTRUMENT
+            echo = os.getenv("DB_ECHO") == "1"
             if database_url:
-                self.engine = create_engine(database_url, echo=True, pool_pre_ping=True)
+                self.engine = create_engine(database_url, echo=echo, pool_pre_ping=True)
             else:
-                self.engine = create_engine(f'sqlite:///{self.db_path}', echo=True)
+                self.engine = create_engine(f'sqlite:///{self.db_path}', echo=echo)
             print("🏗️ Criando tabelas...")
-            Base.metadata.create_all(bind=self.engine)
+            upgrade_schema(self.engine)
+            create_search_index(self.engine)
             self._verify_tables()
             if database_url:
                 print(f"✅ Conectado e sincronizado com banco remoto: {database_url}")
@@ -54,7 +58,7 @@ class DatabaseCreator:
         with self.engine.connect() as conn:
             result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))
             tables = [row[0] for row in result]
-            expected_tables = ['books', 'users', 'loans']
+            expected_tables = ['books', 'users', 'loans', 'schema_version']
             print("\n📋 Tabelas criadas:")
             for table in tables:
                 if table in expected_tables:
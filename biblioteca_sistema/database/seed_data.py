@@ -1,17 +1,204 @@
 """
 Script para popular o banco com dados iniciais de exemplo
 """
+import argparse
+import itertools
+from collections import Counter
+import os
 import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from datetime import datetime, timedelta
 import random
 
 # Adiciona o diretório src ao path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, inspect, update
 from sqlalchemy.orm import sessionmaker
-from src.database.models import Book, User, Loan
+from src.database.models import Base, Book, ChangeLog, ChangeOffset, Copy, Hold, User, Loan
+from src.database import statistics
+
+CATEGORIES = [
+    "Romance", "Ficção Científica", "Fantasy", "Tecnologia", "História", "Ciência", "Filosofia", "Infantil",
+]
+GENERATOR_BATCH_SIZE = 10_000
+
+
+@dataclass
+class GeneratorConfig:
+    """Parâmetros do gerador sintético; o mesmo `seed` gera sempre o mesmo banco."""
+
+    books: int = 10_000
+    users: int = 2_000
+    loans: int = 100_000
+    seed: int = 42
+    # Expoentes Zipf: 0 é uniforme; quanto maior, mais concentrado nos primeiros
+    category_skew: float = 1.0
+    popularity_skew: float = 1.1
+    history_days: int = 365
+    returned_ratio: float = 0.8
+    loan_days: int = 14
+    # Exemplares do título mais popular; os demais decaem com a mesma Zipf, até um por título
+    max_copies: int = 1
+    # Datas são relativas a este instante; fixá-lo torna o banco idêntico entre execuções
+    as_of: Optional[datetime] = None
+
+
+def zipf_cum_weights(count: int, skew: float) -> list:
+    """Pesos acumulados de uma Zipf com `count` postos (o posto 1 é o mais frequente)."""
+    return list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, count + 1)))
+
+
+class SyntheticDataGenerator:
+    """Gera bancos grandes com inserts em lote do SQLAlchemy Core, numa única transação.
+
+    A popularidade dos livros segue uma Zipf sobre uma permutação aleatória dos ids, para que
+    os mais emprestados não sejam sempre os primeiros cadastrados; as categorias também são
+    enviesadas. Os índices secundários são removidos durante a carga e recriados no fim,
+    o que custa bem menos do que mantê-los linha a linha.
+    """
+
+    def __init__(self, engine, config: GeneratorConfig = None) -> None:
+        self.engine = engine
+        self.config = config or GeneratorConfig()
+        self.rng = random.Random(self.config.seed)
+        self.now = self.config.as_of or datetime.now()
+
+    def generate(self) -> dict:
+        config, rng = self.config, self.rng
+        # Posto de popularidade de cada título; os mais populares também têm mais exemplares
+        by_popularity = list(range(1, config.books + 1))
+        rng.shuffle(by_popularity)
+        copies = [0] * (config.books + 1)
+        for rank, book_id in enumerate(by_popularity, start=1):
+            copies[book_id] = max(1, round(config.max_copies / rank ** config.popularity_skew))
+        first_copy = [0] * (config.books + 2)
+        first_copy[1] = 1
+        for book_id in range(1, config.books + 1):
+            first_copy[book_id + 1] = first_copy[book_id] + copies[book_id]
+
+        with self.engine.begin() as conn:
+            # Só os índices que o banco já tem: quem os removeu de propósito continua sem eles
+            inspector = inspect(conn)
+            indexes = []
+            for name in ("books", "copies", "users", "loans"):
+                existing = {index["name"] for index in inspector.get_indexes(name)}
+                indexes.extend(index for index in Base.metadata.tables[name].indexes if index.name in existing)
+            for index in indexes:
+                index.drop(conn)
+            for batch in self._batches(self._book_rows(copies)):
+                conn.execute(insert(Book), batch)
+            for batch in self._batches(self._copy_rows(copies, first_copy)):
+                conn.execute(insert(Copy), batch)
+            for batch in self._batches(self._user_rows()):
+                conn.execute(insert(User), batch)
+            borrowed = Counter()
+            for batch in self._batches(self._loan_rows(by_popularity, copies, first_copy, borrowed)):
+                conn.execute(insert(Loan), batch)
+            # Exemplares em empréstimo ativo são sempre os primeiros de cada título
+            on_loan = (first_copy[book_id] + i for book_id, count in sorted(borrowed.items()) for i in range(count))
+            for batch in self._batches(on_loan):
+                conn.execute(update(Copy).where(Copy.id.in_(batch)).values(is_available=False))
+            by_count = {}
+            for book_id, count in borrowed.items():
+                by_count.setdefault(count, []).append(book_id)
+            for count, book_ids in by_count.items():
+                for batch in self._batches(sorted(book_ids)):
+                    conn.execute(
+                        update(Book)
+                        .where(Book.id.in_(batch))
+                        .values(
+                            copies_available=Book.copies_total - count, is_available=Book.copies_total > count
+                        )
+                    )
+            for index in indexes:
+                index.create(conn)
+            statistics.rebuild_counters(conn)
+        return {
+            "books": config.books,
+            "copies": first_copy[config.books + 1] - 1,
+            "users": config.users,
+            "loans": config.loans,
+        }
+
+    def _batches(self, rows):
+        iterator = iter(rows)
+        while True:
+            batch = list(itertools.islice(iterator, GENERATOR_BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    def _book_rows(self, copies: list):
+        config, rng = self.config, self.rng
+        authors = max(1, config.books // 10)
+        categories = rng.choices(
+            CATEGORIES, cum_weights=zipf_cum_weights(len(CATEGORIES), config.category_skew), k=config.books
+        )
+        for book_id, category in enumerate(categories, start=1):
+            yield {
+                "id": book_id,
+                "title": f"Livro {book_id}",
+                "author": f"Autor {rng.randint(1, authors)}",
+                "year": rng.randint(1800, 2024),
+                "category": category,
+                "is_available": True,
+                "copies_total": copies[book_id],
+                "copies_available": copies[book_id],
+                "created_at": self.now,
+            }
+
+    def _copy_rows(self, copies: list, first_copy: list):
+        for book_id in range(1, self.config.books + 1):
+            for copy_id in range(first_copy[book_id], first_copy[book_id] + copies[book_id]):
+                yield {"id": copy_id, "book_id": book_id, "is_available": True, "created_at": self.now}
+
+    def _user_rows(self):
+        for user_id in range(1, self.config.users + 1):
+            yield {
+                "id": user_id,
+                "name": f"Usuário {user_id}",
+                "email": f"usuario{user_id}@email.com",
+                "phone": "(11) 90000-0000",
+                "created_at": self.now,
+            }
+
+    def _loan_rows(self, by_popularity: list, copies: list, first_copy: list, borrowed: Counter):
+        """Empréstimos em ordem de id; um exemplar só fica em um empréstimo ativo por vez."""
+        config, rng, now = self.config, self.rng, self.now
+        cum_weights = zipf_cum_weights(config.books, config.popularity_skew)
+        history_minutes = max(1, config.history_days * 1440)
+        loan_id = 0
+        while loan_id < config.loans:
+            count = min(GENERATOR_BATCH_SIZE, config.loans - loan_id)
+            for book_id in rng.choices(by_popularity, cum_weights=cum_weights, k=count):
+                loan_id += 1
+                returned = borrowed[book_id] >= copies[book_id] or rng.random() < config.returned_ratio
+                if returned:
+                    loan_date = now - timedelta(minutes=rng.randint(1, history_minutes))
+                    copy_id = first_copy[book_id] + rng.randrange(copies[book_id])
+                else:
+                    # Empréstimos em aberto são recentes: parte ainda no prazo, parte em atraso
+                    loan_date = now - timedelta(minutes=rng.randint(1, 2 * config.loan_days * 1440))
+                    copy_id = first_copy[book_id] + borrowed[book_id]
+                    borrowed[book_id] += 1
+                due_date = loan_date + timedelta(days=config.loan_days)
+                # Empréstimos tomados nos últimos dias não podem ter sido devolvidos depois de `now`
+                return_date = min(loan_date + timedelta(minutes=rng.randint(60, 21 * 1440)), now) if returned else None
+                yield {
+                    "id": loan_id,
+                    "user_id": rng.randint(1, config.users),
+                    "book_id": book_id,
+                    "copy_id": copy_id,
+                    "loan_date": loan_date,
+                    "due_date": due_date,
+                    "return_date": return_date,
+                    "is_returned": returned,
+                    "is_overdue": not returned and due_date < now,
+                }
 
 
 class DataSeeder:
@@ -50,6 +237,7 @@ class DataSeeder:
         books = []
         for title, author, year, category in books_data:
             book = Book(title=title, author=author, year=year, category=category, is_available=True)
+            book.copies.append(Copy())
             books.append(book)
             session.add(book)
         session.commit()
@@ -86,8 +274,18 @@ class DataSeeder:
             if available_books:
                 book = random.choice(available_books)
                 book.is_available = False
+                book.copies_available = 0
+                copy = book.copies[0]
+                copy.is_available = False
                 loan_date = datetime.now() - timedelta(days=random.randint(1, 30))
-                loan = Loan(user_id=user.id, book_id=book.id, loan_date=loan_date, is_returned=False)
+                loan = Loan(
+                    user_id=user.id,
+                    book_id=book.id,
+                    copy_id=copy.id,
+                    loan_date=loan_date,
+                    due_date=loan_date + timedelta(days=14),
+                    is_returned=False,
+                )
                 loans.append(loan)
                 session.add(loan)
         for _ in range(8):
@@ -95,7 +293,15 @@ class DataSeeder:
             book = random.choice(books)
             loan_date = datetime.now() - timedelta(days=random.randint(30, 90))
             return_date = loan_date + timedelta(days=random.randint(1, 7))
-            loan = Loan(user_id=user.id, book_id=book.id, loan_date=loan_date, return_date=return_date, is_returned=True)
+            loan = Loan(
+                user_id=user.id,
+                book_id=book.id,
+                copy_id=book.copies[0].id,
+                loan_date=loan_date,
+                due_date=loan_date + timedelta(days=14),
+                return_date=return_date,
+                is_returned=True,
+            )
             loans.append(loan)
             session.add(loan)
         session.commit()
@@ -112,14 +318,21 @@ class DataSeeder:
                 if response != 's':
                     print("Operação cancelada.")
                     return False
+                session.query(Hold).delete()
                 session.query(Loan).delete()
+                session.query(Copy).delete()
                 session.query(Book).delete()
                 session.query(User).delete()
+                # O log e as posições dos consumidores apontariam para linhas que não existem mais
+                session.query(ChangeLog).delete()
+                session.query(ChangeOffset).delete()
                 session.commit()
                 print("🧹 Dados existentes removidos")
             books = self.seed_books(session)
             users = self.seed_users(session)
             loans = self.seed_loans(session, books, users)
+            statistics.rebuild_counters(session)
+            session.commit()
             print(f"""
 📊 Resumo dos dados criados:
   📚 Livros: {len(books)}
@@ -137,17 +350,22 @@ class DataSeeder:
     def get_statistics(self):
         session = self.SessionLocal()
         try:
+            counters = statistics.read_counters(session)
+            books_total = counters.get(statistics.BOOKS_TOTAL, 0)
+            books_available = counters.get(statistics.BOOKS_AVAILABLE, 0)
+            loans_total = counters.get(statistics.LOANS_TOTAL, 0)
+            loans_active = counters.get(statistics.LOANS_ACTIVE, 0)
             stats = {
                 'books': {
-                    'total': session.query(Book).count(),
-                    'available': session.query(Book).filter(Book.is_available == True).count(),
-                    'borrowed': session.query(Book).filter(Book.is_available == False).count(),
+                    'total': books_total,
+                    'available': books_available,
+                    'borrowed': books_total - books_available,
                 },
-                'users': {'total': session.query(User).count()},
+                'users': {'total': counters.get(statistics.USERS_TOTAL, 0)},
                 'loans': {
-                    'total': session.query(Loan).count(),
-                    'active': session.query(Loan).filter(Loan.is_returned == False).count(),
-                    'returned': session.query(Loan).filter(Loan.is_returned == True).count(),
+                    'total': loans_total,
+                    'active': loans_active,
+                    'returned': loans_total - loans_active,
                 },
             }
             return stats
@@ -155,7 +373,57 @@ class DataSeeder:
             session.close()
 
 
+def generate_main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Gera um banco sintético grande para testes de carga e benchmarks")
+    parser.add_argument("--generate", action="store_true")
+    parser.add_argument("--db", default="database/biblioteca.db", help="Arquivo SQLite (ignorado com DATABASE_URL)")
+    defaults = GeneratorConfig()
+    parser.add_argument("--books", type=int, default=defaults.books)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--loans", type=int, default=defaults.loans)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--category-skew", type=float, default=defaults.category_skew, help="0 = uniforme")
+    parser.add_argument("--popularity-skew", type=float, default=defaults.popularity_skew, help="0 = uniforme")
+    parser.add_argument("--history-days", type=int, default=defaults.history_days)
+    parser.add_argument("--returned-ratio", type=float, default=defaults.returned_ratio)
+    parser.add_argument("--max-copies", type=int, default=defaults.max_copies, help="Exemplares do mais popular")
+    args = parser.parse_args(argv)
+    config = GeneratorConfig(
+        books=args.books,
+        users=args.users,
+        loans=args.loans,
+        seed=args.seed,
+        category_skew=args.category_skew,
+        popularity_skew=args.popularity_skew,
+        history_days=args.history_days,
+        returned_ratio=args.returned_ratio,
+        max_copies=args.max_copies,
+    )
+    from src.database.migrations import upgrade_schema
+    from src.database.search import create_search_index
+
+    engine = DataSeeder(args.db).engine
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        if conn.execute(Book.__table__.select().limit(1)).first():
+            print("❌ O banco já tem livros; o gerador só popula bancos vazios")
+            sys.exit(1)
+    print(
+        f"🌱 Gerando {config.books} livros, {config.users} usuários e {config.loans} empréstimos "
+        f"(seed {config.seed})..."
+    )
+    start = time.perf_counter()
+    SyntheticDataGenerator(engine, config).generate()
+    create_search_index(engine)
+    elapsed = time.perf_counter() - start
+    rows = config.books + config.users + config.loans
+    print(f"✅ Concluído em {elapsed:.1f}s ({rows / elapsed:,.0f} linhas/s)")
+
+
 if __name__ == "__main__":
+    if "--generate" in sys.argv[1:]:
+        generate_main(sys.argv[1:])
+        sys.exit(0)
     seeder = DataSeeder()
     print("🌱 Populando banco com dados de exemplo")
     print("=" * 50)
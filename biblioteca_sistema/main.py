@@ -1,7 +1,14 @@
-from src.cli.interface import LibraryInterface
+import sys
 
 
 def main() -> None:
+    if len(sys.argv) > 1:
+        # Com argumentos, roda um subcomando e sai (python main.py books list --json)
+        from src.cli.commands import main as run_command
+
+        sys.exit(run_command(sys.argv[1:]))
+    from src.cli.interface import LibraryInterface
+
     ui = LibraryInterface()
     ui.main_menu()
 
@@ -0,0 +1,42 @@
+"""
+Script para importar livros ou usuários em massa a partir de arquivos CSV ou JSONL
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.services.import_service import ImportService
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Importação em massa de livros ou usuários")
+    parser.add_argument("entity", choices=["books", "users"], help="Tipo de registro do arquivo")
+    parser.add_argument("path", help="Arquivo .csv (com cabeçalho) ou .jsonl")
+    parser.add_argument("--batch-size", type=int, default=ImportService.BATCH_SIZE, help="Linhas por transação")
+    args = parser.parse_args()
+
+    service = ImportService(args.batch_size)
+    importer = service.import_books if args.entity == "books" else service.import_users
+
+    def progress(result) -> None:
+        print(f"  ⏳ {result.inserted} importados, {result.rejected} rejeitados ({result.rows_per_second:,.0f} linhas/s)")
+
+    print(f"📥 Importando {args.entity} de {args.path}")
+    try:
+        result = importer(args.path, on_batch=progress)
+    except (OSError, ValueError) as e:
+        print(f"❌ Erro ao importar: {str(e)}")
+        return False
+    print(f"✅ {result.inserted} registros importados em {result.elapsed:.2f}s ({result.rows_per_second:,.0f} linhas/s)")
+    if result.rejected:
+        print(f"⚠️ {result.rejected} linhas rejeitadas")
+        for line, message in result.errors:
+            print(f"  Linha {line}: {message}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,34 @@
+"""
+Rotina diária que marca os empréstimos vencidos e não devolvidos como em atraso
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.services.loan_service import LoanService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Marca os empréstimos em atraso")
+    parser.add_argument("--as-of", help="Data de referência (AAAA-MM-DD); padrão: agora")
+    parser.add_argument("--list", action="store_true", help="Lista os empréstimos em atraso depois de marcar")
+    args = parser.parse_args()
+
+    as_of = datetime.fromisoformat(args.as_of) if args.as_of else datetime.now()
+    service = LoanService()
+    start = time.perf_counter()
+    marked = service.mark_overdue(as_of)
+    print(f"⏰ {marked} empréstimos marcados como em atraso em {time.perf_counter() - start:.2f}s")
+    if args.list:
+        for loan in service.get_overdue_loans(as_of):
+            days = (as_of - loan.due_date).days
+            print(f"  #{loan.id}: usuário {loan.user_id}, livro {loan.book_id}, vencido há {days} dias")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Script para verificar e recalcular os contadores pré-calculados dos relatórios
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.services.stats_service import StatsService
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Verifica e recalcula os contadores dos relatórios")
+    parser.add_argument("--verify", action="store_true", help="Só compara, sem regravar os contadores")
+    args = parser.parse_args()
+
+    service = StatsService()
+    print("🔎 Verificando contadores...")
+    differences = service.verify()
+    if not differences:
+        print("✅ Contadores consistentes com as tabelas")
+    else:
+        print(f"⚠️ {len(differences)} contadores divergentes:")
+        for name, (stored, actual) in differences.items():
+            print(f"  {name}: gravado {stored}, real {actual}")
+    if args.verify:
+        return not differences
+    counters = service.rebuild()
+    print(f"🔄 {len(counters)} contadores recalculados")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
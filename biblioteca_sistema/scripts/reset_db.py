@@ -11,6 +11,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 from database.create_database import DatabaseCreator
 from database.seed_data import DataSeeder
 from database.backup_restore import DatabaseBackup
+from src.utils.cache import entity_cache
 
 
 def main() -> None:
@@ -39,6 +40,8 @@ def main() -> None:
     print("\n🔄 Resetando banco...")
     creator = DatabaseCreator(db_path)
     if creator.create_database():
+        # Um cache compartilhado ainda guardaria os registros apagados
+        entity_cache.clear()
         print("✅ Banco resetado com sucesso!")
         response = input("\nDeseja adicionar dados de exemplo? (S/n): ").lower()
         if response != 'n':
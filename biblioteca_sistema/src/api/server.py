@@ -0,0 +1,479 @@
+"""API HTTP/JSON sobre os serviços da biblioteca.
+
+O laço asyncio só cuida das conexões; cada requisição roda num pool de threads do
+tamanho dos núcleos, com a sua própria sessão (uma transação por requisição).
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from http import HTTPStatus
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy.exc import OperationalError
+
+from ..database.connection import db_connection, is_lock_error
+from ..services.book_service import BookService
+from ..services.change_feed_service import ChangeFeedService
+from ..services.hold_service import HoldService
+from ..services.loan_service import LoanService
+from ..services.pagination import DEFAULT_PAGE_SIZE
+from ..services.report_service import ReportService
+from ..services.stats_service import StatsService
+from ..services.user_service import UserService
+from ..utils.cache import LRUBackend, entity_cache
+from ..utils.serialization import json_default, to_records
+
+MAX_BODY_SIZE = 1024 * 1024
+LOCK_RETRIES = 5
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes) -> None:
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+        self.params: dict = {}
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Corpo da requisição não é um JSON válido")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "O corpo deve ser um objeto JSON")
+        return data
+
+    def field(self, name: str, kind=str, required: bool = True, default=None):
+        value = self.json().get(name)
+        if value is None:
+            if required:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Campo obrigatório: {name}")
+            return default
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Valor inválido para {name}")
+
+    def arg(self, name: str, kind=str, default=None):
+        value = self.query.get(name)
+        if value is None or value == "":
+            return default
+        try:
+            return kind(value)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Parâmetro inválido: {name}")
+
+
+def _date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def _not_found(message: str) -> None:
+    raise HTTPError(HTTPStatus.NOT_FOUND, message)
+
+
+# Cada rota recebe a sessão da requisição e devolve (status, dados)
+
+def list_books(session, request: Request):
+    service = BookService(session)
+    after_id, limit = request.arg("after", int), request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    if request.arg("available") in ("1", "true"):
+        return HTTPStatus.OK, service.get_available_books(after_id=after_id, limit=limit)
+    return HTTPStatus.OK, service.get_all_books(after_id=after_id, limit=limit)
+
+
+def search_books(session, request: Request):
+    books = BookService(session).search_books(
+        request.arg("q", default=""), request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    )
+    return HTTPStatus.OK, books
+
+
+def get_book(session, request: Request):
+    book = BookService(session).get_book_by_id(request.params["id"])
+    if book is None:
+        _not_found("Livro não encontrado")
+    return HTTPStatus.OK, book
+
+
+def add_book(session, request: Request):
+    book = BookService(session).add_book(
+        request.field("title"),
+        request.field("author"),
+        request.field("year", int),
+        request.field("category"),
+        request.field("copies", int, required=False, default=1),
+    )
+    return HTTPStatus.CREATED, book
+
+
+def book_copies(session, request: Request):
+    counts = BookService(session).get_copy_counts(request.params["id"])
+    if counts is None:
+        _not_found("Livro não encontrado")
+    return HTTPStatus.OK, counts
+
+
+def add_copies(session, request: Request):
+    count = request.field("count", int, required=False, default=1)
+    if not BookService(session).add_copies(request.params["id"], count):
+        _not_found("Livro não encontrado")
+    return HTTPStatus.CREATED, {"book_id": request.params["id"], "added": count}
+
+
+def delete_book(session, request: Request):
+    if not BookService(session).delete_book(request.params["id"]):
+        _not_found("Livro não encontrado")
+    return HTTPStatus.OK, {"deleted": request.params["id"]}
+
+
+def list_users(session, request: Request):
+    users = UserService(session).get_all_users(
+        after_id=request.arg("after", int), limit=request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    )
+    return HTTPStatus.OK, users
+
+
+def search_users(session, request: Request):
+    users = UserService(session).search_users(
+        request.arg("q", default=""),
+        after_id=request.arg("after", int),
+        limit=request.arg("limit", int, DEFAULT_PAGE_SIZE),
+    )
+    return HTTPStatus.OK, users
+
+
+def get_user(session, request: Request):
+    user = UserService(session).get_user_by_id(request.params["id"])
+    if user is None:
+        _not_found("Usuário não encontrado")
+    return HTTPStatus.OK, user
+
+
+def add_user(session, request: Request):
+    user = UserService(session).add_user(request.field("name"), request.field("email"), request.field("phone"))
+    return HTTPStatus.CREATED, user
+
+
+def update_user(session, request: Request):
+    updated = UserService(session).update_user(
+        request.params["id"],
+        name=request.field("name", required=False),
+        email=request.field("email", required=False),
+        phone=request.field("phone", required=False),
+    )
+    if not updated:
+        _not_found("Usuário não encontrado")
+    return HTTPStatus.OK, {"updated": request.params["id"]}
+
+
+def delete_user(session, request: Request):
+    if not UserService(session).delete_user(request.params["id"]):
+        _not_found("Usuário não encontrado")
+    return HTTPStatus.OK, {"deleted": request.params["id"]}
+
+
+def user_history(session, request: Request):
+    loans = LoanService(session).get_user_history_listing(
+        request.params["id"], after_id=request.arg("after", int), limit=request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    )
+    return HTTPStatus.OK, loans
+
+
+def active_loans(session, request: Request):
+    loans = LoanService(session).get_active_loan_listing(
+        after_id=request.arg("after", int), limit=request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    )
+    return HTTPStatus.OK, loans
+
+
+def overdue_loans(session, request: Request):
+    overdue = LoanService(session).get_overdue_loan_listing(request.arg("as_of", _date))
+    return HTTPStatus.OK, list(islice(overdue, request.arg("limit", int, DEFAULT_PAGE_SIZE)))
+
+
+def checkout(session, request: Request):
+    service = LoanService(session)
+    user_id, days = request.field("user_id", int), request.field("days", int, required=False, default=14)
+    book_ids = request.field("book_ids", list, required=False)
+    if book_ids is None:
+        return HTTPStatus.CREATED, service.create_loan(user_id, request.field("book_id", int), days=days)
+    return HTTPStatus.OK, service.create_loans(user_id, [int(book_id) for book_id in book_ids], days=days)
+
+
+def return_loan(session, request: Request):
+    if not LoanService(session).return_loan(request.params["id"]):
+        raise HTTPError(HTTPStatus.CONFLICT, "Empréstimo não encontrado ou já devolvido")
+    return HTTPStatus.OK, {"returned": request.params["id"]}
+
+
+def return_loans(session, request: Request):
+    loan_ids = [int(loan_id) for loan_id in request.field("loan_ids", list)]
+    return HTTPStatus.OK, LoanService(session).return_loans(loan_ids)
+
+
+def renew_loan(session, request: Request):
+    if not LoanService(session).renew_loan(request.params["id"], request.field("days", int, required=False, default=7)):
+        raise HTTPError(HTTPStatus.CONFLICT, "Empréstimo não encontrado ou já devolvido")
+    return HTTPStatus.OK, {"renewed": request.params["id"]}
+
+
+def place_hold(session, request: Request):
+    service = HoldService(session)
+    hold = service.place_hold(request.field("user_id", int), request.field("book_id", int))
+    return HTTPStatus.CREATED, {"id": hold.id, "book_id": hold.book_id, "position": service.get_queue_position(hold.id)}
+
+
+def cancel_hold(session, request: Request):
+    if not HoldService(session).cancel_hold(request.params["id"]):
+        raise HTTPError(HTTPStatus.CONFLICT, "Reserva não encontrada ou já encerrada")
+    return HTTPStatus.OK, {"cancelled": request.params["id"]}
+
+
+def book_holds(session, request: Request):
+    queue = HoldService(session).get_queue(
+        request.params["id"], after_id=request.arg("after", int), limit=request.arg("limit", int, DEFAULT_PAGE_SIZE)
+    )
+    return HTTPStatus.OK, queue
+
+
+def user_holds(session, request: Request):
+    return HTTPStatus.OK, HoldService(session).get_user_holds(request.params["id"])
+
+
+def expire_holds(session, request: Request):
+    return HTTPStatus.OK, {"expired": HoldService(session).expire_holds(request.arg("as_of", _date))}
+
+
+def summary_report(session, request: Request):
+    return HTTPStatus.OK, StatsService(session).get_summary()
+
+
+def _period(request: Request) -> Tuple[Optional[datetime], Optional[datetime]]:
+    return request.arg("start", _date), request.arg("end", _date)
+
+
+def top_books_report(session, request: Request):
+    start, end = _period(request)
+    rows = ReportService(session).top_books(request.arg("limit", int, 10), start, end, request.arg("category"))
+    return HTTPStatus.OK, rows
+
+
+def top_users_report(session, request: Request):
+    start, end = _period(request)
+    rows = ReportService(session).top_users(request.arg("limit", int, 10), start, end, request.arg("category"))
+    return HTTPStatus.OK, rows
+
+
+def monthly_report(session, request: Request):
+    start, end = _period(request)
+    return HTTPStatus.OK, ReportService(session).loans_per_month(start, end, request.arg("category"))
+
+
+def categories_report(session, request: Request):
+    start, end = _period(request)
+    return HTTPStatus.OK, ReportService(session).circulation_by_category(start, end)
+
+
+def list_changes(session, request: Request):
+    # Sem estado no servidor: quem acompanha o log guarda o último id e o manda em `after`
+    tables = request.arg("table")
+    changes = ChangeFeedService(session).get_changes(
+        request.arg("after", int, 0), request.arg("limit", int, 500), tables.split(",") if tables else None
+    )
+    return HTTPStatus.OK, changes
+
+
+def health(session, request: Request):
+    return HTTPStatus.OK, {"status": "ok", "database": db_connection.get_pool_status()}
+
+
+def query_stats(session, request: Request):
+    stats = db_connection.query_stats
+    if stats is None:
+        raise HTTPError(HTTPStatus.NOT_FOUND, "Instrumentação desligada (inicie com DB_INSTRUMENT=1)")
+    return HTTPStatus.OK, stats.summary()
+
+
+ROUTES: List[Tuple[str, "re.Pattern", Callable]] = [
+    (method, re.compile(f"^{pattern}$"), handler)
+    for method, pattern, handler in (
+        ("GET", r"/health", health),
+        ("GET", r"/books", list_books),
+        ("POST", r"/books", add_book),
+        ("GET", r"/books/search", search_books),
+        ("GET", r"/books/(?P<id>\d+)", get_book),
+        ("DELETE", r"/books/(?P<id>\d+)", delete_book),
+        ("GET", r"/books/(?P<id>\d+)/copies", book_copies),
+        ("POST", r"/books/(?P<id>\d+)/copies", add_copies),
+        ("GET", r"/users", list_users),
+        ("POST", r"/users", add_user),
+        ("GET", r"/users/search", search_users),
+        ("GET", r"/users/(?P<id>\d+)", get_user),
+        ("PATCH", r"/users/(?P<id>\d+)", update_user),
+        ("DELETE", r"/users/(?P<id>\d+)", delete_user),
+        ("GET", r"/users/(?P<id>\d+)/loans", user_history),
+        ("GET", r"/loans/active", active_loans),
+        ("GET", r"/loans/overdue", overdue_loans),
+        ("POST", r"/loans", checkout),
+        ("POST", r"/loans/return", return_loans),
+        ("POST", r"/loans/(?P<id>\d+)/return", return_loan),
+        ("POST", r"/loans/(?P<id>\d+)/renew", renew_loan),
+        ("POST", r"/holds", place_hold),
+        ("DELETE", r"/holds/(?P<id>\d+)", cancel_hold),
+        ("POST", r"/holds/expire", expire_holds),
+        ("GET", r"/books/(?P<id>\d+)/holds", book_holds),
+        ("GET", r"/users/(?P<id>\d+)/holds", user_holds),
+        ("GET", r"/reports/summary", summary_report),
+        ("GET", r"/reports/top-books", top_books_report),
+        ("GET", r"/reports/top-users", top_users_report),
+        ("GET", r"/reports/monthly", monthly_report),
+        ("GET", r"/reports/categories", categories_report),
+        ("GET", r"/changes", list_changes),
+        ("GET", r"/stats/queries", query_stats),
+    )
+]
+
+
+def route(request: Request) -> Callable:
+    allowed = False
+    for method, pattern, handler in ROUTES:
+        match = pattern.match(request.path)
+        if match:
+            if method == request.method:
+                request.params = {key: int(value) for key, value in match.groupdict().items()}
+                return handler
+            allowed = True
+    if allowed:
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Método não permitido")
+    raise HTTPError(HTTPStatus.NOT_FOUND, "Rota não encontrada")
+
+
+def handle(request: Request) -> Tuple[HTTPStatus, object]:
+    """Executa a rota numa transação própria, repetindo a requisição inteira se o banco estiver bloqueado."""
+    try:
+        handler = route(request)
+        for attempt in range(LOCK_RETRIES):
+            try:
+                with db_connection.session_scope() as session:
+                    status, data = handler(session, request)
+                    # Serializa ainda dentro da sessão, enquanto as entidades estão anexadas
+                    return status, to_records(data)
+            except OperationalError as e:
+                if not is_lock_error(e) or attempt == LOCK_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (2 ** attempt) * (1 + random.random()))
+    except HTTPError as e:
+        return e.status, {"error": str(e)}
+    except ValueError as e:
+        return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+    except OperationalError as e:
+        if is_lock_error(e):
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Banco de dados ocupado, tente novamente"}
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Erro no banco de dados"}
+    except Exception as e:
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Erro interno: {e.__class__.__name__}"}
+
+
+class APIServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000, workers: Optional[int] = None) -> None:
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="api")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Linha de requisição inválida")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Corpo da requisição muito grande")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, headers, body)
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, data, keep_alive: bool) -> None:
+        body = json.dumps(data, default=json_default, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                status, data = await loop.run_in_executor(self.executor, handle, request)
+                self._write_response(writer, status, data, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self) -> None:
+        server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        print(f"🌐 API em http://{self.host}:{self.port} ({self.workers} workers)", flush=True)
+        if isinstance(entity_cache.backend, LRUBackend):
+            print(
+                "⚠️ Cache em memória só deste processo: escritas da CLI ou de outro servidor aparecem aqui "
+                "só depois do CACHE_TTL; com mais de um processo no banco use CACHE_BACKEND=redis",
+                flush=True,
+            )
+        async with server:
+            await server.serve_forever()
+
+    def run(self) -> None:
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,570 @@
+"""Modo não interativo: subcomandos para scripts, cron e pipelines.
+
+Os serviços são importados só dentro de cada comando e a saída não usa colorama nem
+tabulate, para que cada chamada carregue apenas o necessário.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+from ..services.pagination import DEFAULT_PAGE_SIZE
+from ..utils.serialization import json_default, to_records
+
+# Largura do SQL na visão de texto do `stats`; o resumo JSON guarda o comando inteiro
+STATEMENT_WIDTH = 100
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+
+def emit(data, as_json: bool) -> None:
+    """Escreve o resultado em JSON ou em texto separado por tabulação (uma linha por registro)."""
+    data = to_records(data)
+    if as_json:
+        json.dump(data, sys.stdout, default=json_default, ensure_ascii=False)
+        sys.stdout.write("\n")
+        return
+    if isinstance(data, list):
+        if data and isinstance(data[0], dict):
+            print("\t".join(data[0]))
+            for row in data:
+                print("\t".join(_text(value) for value in row.values()))
+        else:
+            for row in data:
+                print(_text(row))
+    elif isinstance(data, dict):
+        for key, value in _flatten(data).items():
+            print(f"{key}\t{_text(value)}")
+    elif data is not None:
+        print(_text(data))
+
+
+def _date(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida (use AAAA-MM-DD): {value}")
+
+
+# Livros
+
+def books_add(args):
+    from ..services.book_service import BookService
+
+    return BookService().add_book(args.title, args.author, args.year, args.category, args.copies)
+
+
+def books_copies(args):
+    from ..services.book_service import BookService
+
+    counts = BookService().get_copy_counts(args.id)
+    if counts is None:
+        raise LookupError("Livro não encontrado")
+    return counts
+
+
+def books_add_copies(args):
+    from ..services.book_service import BookService
+
+    if not BookService().add_copies(args.id, args.count):
+        raise LookupError("Livro não encontrado")
+    return {"book_id": args.id, "added": args.count}
+
+
+def books_remove_copy(args):
+    from ..services.book_service import BookService
+
+    if not BookService().remove_copy(args.copy_id):
+        raise LookupError("Exemplar não encontrado")
+    return {"removed": args.copy_id}
+
+
+def books_list(args):
+    from ..services.book_service import BookService
+
+    service = BookService()
+    if args.available:
+        return service.get_available_books(after_id=args.after, limit=args.limit)
+    return service.get_all_books(after_id=args.after, limit=args.limit)
+
+
+def books_get(args):
+    from ..services.book_service import BookService
+
+    book = BookService().get_book_by_id(args.id)
+    if book is None:
+        raise LookupError("Livro não encontrado")
+    return book
+
+
+def books_search(args):
+    from ..services.book_service import BookService
+
+    return BookService().search_books(args.term, limit=args.limit)
+
+
+def books_delete(args):
+    from ..services.book_service import BookService
+
+    if not BookService().delete_book(args.id):
+        raise LookupError("Livro não encontrado")
+    return {"deleted": args.id}
+
+
+# Usuários
+
+def users_add(args):
+    from ..services.user_service import UserService
+
+    return UserService().add_user(args.name, args.email, args.phone)
+
+
+def users_list(args):
+    from ..services.user_service import UserService
+
+    return UserService().get_all_users(after_id=args.after, limit=args.limit)
+
+
+def users_get(args):
+    from ..services.user_service import UserService
+
+    service = UserService()
+    user = service.get_user_by_email(args.key) if "@" in args.key else service.get_user_by_id(int(args.key))
+    if user is None:
+        raise LookupError("Usuário não encontrado")
+    return user
+
+
+def users_search(args):
+    from ..services.user_service import UserService
+
+    return UserService().search_users(args.term, after_id=args.after, limit=args.limit)
+
+
+def users_update(args):
+    from ..services.user_service import UserService
+
+    if not UserService().update_user(args.id, name=args.name, email=args.email, phone=args.phone):
+        raise LookupError("Usuário não encontrado")
+    return {"updated": args.id}
+
+
+def users_delete(args):
+    from ..services.user_service import UserService
+
+    if not UserService().delete_user(args.id):
+        raise LookupError("Usuário não encontrado")
+    return {"deleted": args.id}
+
+
+# Empréstimos
+
+def loans_checkout(args):
+    from ..services.loan_service import LoanService
+
+    service = LoanService()
+    if len(args.book_ids) == 1:
+        return service.create_loan(args.user_id, args.book_ids[0], days=args.days)
+    return service.create_loans(args.user_id, args.book_ids, days=args.days)
+
+
+def loans_return(args):
+    from ..services.loan_service import LoanService
+
+    service = LoanService()
+    if len(args.loan_ids) == 1:
+        if not service.return_loan(args.loan_ids[0]):
+            raise LookupError("Não foi possível devolver o empréstimo")
+        return {"returned": args.loan_ids[0]}
+    return service.return_loans(args.loan_ids)
+
+
+def loans_renew(args):
+    from ..services.loan_service import LoanService
+
+    if not LoanService().renew_loan(args.id, args.days):
+        raise LookupError("Não foi possível renovar o empréstimo")
+    return {"renewed": args.id}
+
+
+def loans_active(args):
+    from ..services.loan_service import LoanService
+
+    return LoanService().get_active_loan_listing(after_id=args.after, limit=args.limit)
+
+
+def loans_history(args):
+    from ..services.loan_service import LoanService
+
+    return LoanService().get_user_history_listing(args.user_id, after_id=args.after, limit=args.limit)
+
+
+def loans_overdue(args):
+    from ..services.loan_service import LoanService
+
+    return list(islice(LoanService().get_overdue_loan_listing(args.as_of), args.limit))
+
+
+def loans_mark_overdue(args):
+    from ..services.loan_service import LoanService
+
+    return {"marked": LoanService().mark_overdue(args.as_of)}
+
+
+# Reservas
+
+def holds_place(args):
+    from ..services.hold_service import HoldService
+
+    service = HoldService()
+    hold = service.place_hold(args.user_id, args.book_id)
+    return {"hold_id": hold.id, "book_id": hold.book_id, "position": service.get_queue_position(hold.id)}
+
+
+def holds_cancel(args):
+    from ..services.hold_service import HoldService
+
+    if not HoldService().cancel_hold(args.id):
+        raise LookupError("Reserva não encontrada ou já encerrada")
+    return {"cancelled": args.id}
+
+
+def holds_queue(args):
+    from ..services.hold_service import HoldService
+
+    return HoldService().get_queue(args.book_id, after_id=args.after, limit=args.limit)
+
+
+def holds_user(args):
+    from ..services.hold_service import HoldService
+
+    return HoldService().get_user_holds(args.user_id)
+
+
+def holds_shelf(args):
+    from ..services.hold_service import HoldService
+
+    return HoldService().get_ready_holds(after_id=args.after, limit=args.limit)
+
+
+def holds_expire(args):
+    from ..services.hold_service import HoldService
+
+    return {"expired": HoldService().expire_holds(args.as_of)}
+
+
+# Relatórios
+
+def reports_summary(args):
+    from ..services.stats_service import StatsService
+
+    return StatsService().get_summary()
+
+
+def reports_top_books(args):
+    from ..services.report_service import ReportService
+
+    return ReportService().top_books(args.limit, args.start, args.end, args.category)
+
+
+def reports_top_users(args):
+    from ..services.report_service import ReportService
+
+    return ReportService().top_users(args.limit, args.start, args.end, args.category)
+
+
+def reports_monthly(args):
+    from ..services.report_service import ReportService
+
+    return ReportService().loans_per_month(args.start, args.end, args.category)
+
+
+def reports_categories(args):
+    from ..services.report_service import ReportService
+
+    return ReportService().circulation_by_category(args.start, args.end)
+
+
+# Log de alterações
+
+def changes_list(args):
+    from ..services.change_feed_service import ChangeFeedService
+
+    return ChangeFeedService().get_changes(args.after or 0, args.limit or 500, args.table)
+
+
+def changes_follow(args):
+    from ..services.change_feed_service import ChangeFeedService
+
+    return list(ChangeFeedService().follow(args.consumer, args.table, limit=args.limit))
+
+
+def changes_reset(args):
+    from ..services.change_feed_service import ChangeFeedService
+
+    ChangeFeedService().set_offset(args.consumer, args.position)
+    return {"consumer": args.consumer, "position": args.position}
+
+
+def changes_purge(args):
+    from ..services.change_feed_service import ChangeFeedService
+
+    return {"purged": ChangeFeedService().purge_consumed()}
+
+
+# Estatísticas de consultas
+
+def query_stats(args):
+    path = args.path or os.getenv("DB_QUERY_STATS")
+    if not path:
+        raise ValueError("Informe o arquivo do resumo (ou defina DB_QUERY_STATS)")
+    if not Path(path).exists():
+        raise LookupError(f"Resumo não encontrado: {path} (rode os comandos com DB_INSTRUMENT=1)")
+    summary = json.loads(Path(path).read_text(encoding="utf-8"))
+    if args.json and not args.slow:
+        return summary
+    if args.slow:
+        return [
+            {
+                "at": entry["at"],
+                "tag": entry["tag"],
+                "ms": f"{entry['duration_ms']:.1f}",
+                "statement": entry["statement"][:STATEMENT_WIDTH],
+                "plan": " | ".join(entry["plan"]),
+            }
+            for entry in summary["slow"]
+            if args.tag is None or entry["tag"] == args.tag
+        ]
+    return [
+        {
+            "tag": item["tag"],
+            "count": item["count"],
+            "total_ms": f"{item['total_ms']:.1f}",
+            "avg_ms": f"{item['avg_ms']:.2f}",
+            "p95_ms": f"{item['p95_ms']:.2f}",
+            "max_ms": f"{item['max_ms']:.1f}",
+            "rows": item["rows"],
+            "statement": item["statement"][:STATEMENT_WIDTH],
+        }
+        for item in summary["statements"]
+        if args.tag is None or item["tag"] == args.tag
+    ][: args.limit]
+
+
+# Importação e exportação
+
+def import_records(args):
+    from ..services.import_service import ImportService
+
+    service = ImportService(args.batch_size)
+    importer = service.import_books if args.entity == "books" else service.import_users
+    return importer(args.path)
+
+
+def export_records(args):
+    from ..services.export_service import ExportService
+
+    return ExportService().export(args.entity, args.format, args.path, args.since)
+
+
+# Servidor HTTP
+
+def serve(args):
+    workers = args.workers or os.cpu_count() or 1
+    # Uma conexão por worker no pool dos bancos remotos, a menos que DB_POOL_SIZE diga outra coisa
+    os.environ.setdefault("DB_POOL_SIZE", str(workers))
+    from ..api.server import APIServer
+
+    APIServer(args.host, args.port, workers).run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="Saída em JSON")
+    paging = argparse.ArgumentParser(add_help=False)
+    paging.add_argument("--after", type=int, help="Último ID da página anterior")
+    paging.add_argument("--limit", type=int, default=DEFAULT_PAGE_SIZE, help="Máximo de registros")
+    period = argparse.ArgumentParser(add_help=False)
+    period.add_argument("--start", type=_date, help="Data inicial (AAAA-MM-DD)")
+    period.add_argument("--end", type=_date, help="Data final, exclusiva (AAAA-MM-DD)")
+
+    parser = argparse.ArgumentParser(prog="biblioteca", description="Sistema de Gerenciamento de Biblioteca")
+    groups = parser.add_subparsers(dest="group", required=True)
+
+    def command(subparsers, name, handler, summary, parents=()):
+        sub = subparsers.add_parser(name, help=summary, parents=[common, *parents])
+        sub.set_defaults(handler=handler)
+        return sub
+
+    books = groups.add_parser("books", help="Livros").add_subparsers(dest="command", required=True)
+    sub = command(books, "add", books_add, "Cadastra um livro")
+    sub.add_argument("title")
+    sub.add_argument("author")
+    sub.add_argument("year", type=int)
+    sub.add_argument("category")
+    sub.add_argument("--copies", type=int, default=1, help="Exemplares do título")
+    sub = command(books, "list", books_list, "Lista livros", [paging])
+    sub.add_argument("--available", action="store_true", help="Só os disponíveis")
+    command(books, "get", books_get, "Mostra um livro").add_argument("id", type=int)
+    sub = command(books, "search", books_search, "Busca por título ou autor")
+    sub.add_argument("term")
+    sub.add_argument("--limit", type=int)
+    command(books, "delete", books_delete, "Remove um livro").add_argument("id", type=int)
+    command(books, "copies", books_copies, "Exemplares do título (total, na estante, emprestados)").add_argument(
+        "id", type=int
+    )
+    sub = command(books, "add-copies", books_add_copies, "Acrescenta exemplares a um título")
+    sub.add_argument("id", type=int)
+    sub.add_argument("count", type=int, nargs="?", default=1)
+    command(books, "remove-copy", books_remove_copy, "Dá baixa num exemplar da estante").add_argument(
+        "copy_id", type=int
+    )
+
+    users = groups.add_parser("users", help="Usuários").add_subparsers(dest="command", required=True)
+    sub = command(users, "add", users_add, "Cadastra um usuário")
+    sub.add_argument("name")
+    sub.add_argument("email")
+    sub.add_argument("phone")
+    command(users, "list", users_list, "Lista usuários", [paging])
+    command(users, "get", users_get, "Mostra um usuário por ID ou email").add_argument("key")
+    command(users, "search", users_search, "Busca por nome ou email", [paging]).add_argument("term")
+    sub = command(users, "update", users_update, "Atualiza um usuário")
+    sub.add_argument("id", type=int)
+    sub.add_argument("--name")
+    sub.add_argument("--email")
+    sub.add_argument("--phone")
+    command(users, "delete", users_delete, "Remove um usuário").add_argument("id", type=int)
+
+    loans = groups.add_parser("loans", help="Empréstimos").add_subparsers(dest="command", required=True)
+    sub = command(loans, "checkout", loans_checkout, "Empresta um ou mais livros a um usuário")
+    sub.add_argument("user_id", type=int)
+    sub.add_argument("book_ids", type=int, nargs="+")
+    sub.add_argument("--days", type=int, default=14, help="Prazo em dias")
+    command(loans, "return", loans_return, "Devolve um ou mais empréstimos").add_argument(
+        "loan_ids", type=int, nargs="+"
+    )
+    sub = command(loans, "renew", loans_renew, "Renova um empréstimo")
+    sub.add_argument("id", type=int)
+    sub.add_argument("--days", type=int, default=7)
+    command(loans, "active", loans_active, "Lista empréstimos ativos", [paging])
+    command(loans, "history", loans_history, "Histórico de um usuário", [paging]).add_argument("user_id", type=int)
+    sub = command(loans, "overdue", loans_overdue, "Lista empréstimos em atraso")
+    sub.add_argument("--as-of", type=_date)
+    sub.add_argument("--limit", type=int, default=DEFAULT_PAGE_SIZE, help="Máximo de registros")
+    command(loans, "mark-overdue", loans_mark_overdue, "Marca empréstimos em atraso").add_argument(
+        "--as-of", type=_date
+    )
+
+    holds = groups.add_parser("holds", help="Reservas").add_subparsers(dest="command", required=True)
+    sub = command(holds, "place", holds_place, "Coloca o usuário na fila de um livro")
+    sub.add_argument("user_id", type=int)
+    sub.add_argument("book_id", type=int)
+    command(holds, "cancel", holds_cancel, "Cancela uma reserva").add_argument("id", type=int)
+    command(holds, "queue", holds_queue, "Fila de espera de um livro", [paging]).add_argument("book_id", type=int)
+    command(holds, "user", holds_user, "Reservas ativas de um usuário").add_argument("user_id", type=int)
+    command(holds, "shelf", holds_shelf, "Exemplares separados aguardando retirada", [paging])
+    command(holds, "expire", holds_expire, "Vence as reservas não retiradas no prazo").add_argument(
+        "--as-of", type=_date
+    )
+
+    reports = groups.add_parser("reports", help="Relatórios").add_subparsers(dest="command", required=True)
+    command(reports, "summary", reports_summary, "Resumo geral")
+    for name, handler, summary in (
+        ("top-books", reports_top_books, "Livros mais emprestados"),
+        ("top-users", reports_top_users, "Usuários mais ativos"),
+    ):
+        sub = command(reports, name, handler, summary, [period])
+        sub.add_argument("--limit", type=int, default=10)
+        sub.add_argument("--category")
+    command(reports, "monthly", reports_monthly, "Empréstimos por mês", [period]).add_argument("--category")
+    command(reports, "categories", reports_categories, "Circulação por categoria", [period])
+
+    changes = groups.add_parser("changes", help="Log de alterações").add_subparsers(dest="command", required=True)
+    tables = argparse.ArgumentParser(add_help=False)
+    tables.add_argument(
+        "--table", action="append", choices=["books", "copies", "users", "loans", "holds"], help="Só esta tabela"
+    )
+    command(changes, "list", changes_list, "Lista alterações a partir de um id", [paging, tables])
+    sub = command(changes, "follow", changes_follow, "Entrega as alterações novas de um consumidor", [tables])
+    sub.add_argument("consumer")
+    sub.add_argument("--limit", type=int, help="Máximo de alterações nesta chamada")
+    sub = command(changes, "reset", changes_reset, "Reposiciona um consumidor")
+    sub.add_argument("consumer")
+    sub.add_argument("--position", type=int, default=0, help="Último id já processado (padrão: início do log)")
+    command(changes, "purge", changes_purge, "Apaga alterações já lidas por todos os consumidores")
+
+    sub = command(groups, "stats", query_stats, "Consultas mais custosas e log de lentas (resumo do DB_INSTRUMENT)")
+    sub.add_argument("path", nargs="?", help="Resumo JSON (padrão: DB_QUERY_STATS)")
+    sub.add_argument("--tag", help="Só as consultas deste método, como BookService.search_books")
+    sub.add_argument("--limit", type=int, default=20)
+    sub.add_argument("--slow", action="store_true", help="Mostra o log de consultas lentas com o plano")
+
+    sub = command(groups, "import", import_records, "Importa livros ou usuários de CSV/JSONL")
+    sub.add_argument("entity", choices=["books", "users"])
+    sub.add_argument("path")
+    sub.add_argument("--batch-size", type=int)
+
+    sub = command(groups, "export", export_records, "Exporta livros, usuários ou empréstimos")
+    sub.add_argument("entity", choices=["books", "users", "loans"])
+    sub.add_argument("format", choices=["csv", "jsonl", "parquet"])
+    sub.add_argument("path")
+    sub.add_argument("--since", type=_date, help="Só registros posteriores a esta data")
+
+    sub = command(groups, "serve", serve, "Inicia a API HTTP/JSON")
+    sub.add_argument("--host", default="127.0.0.1")
+    sub.add_argument("--port", type=int, default=8000)
+    sub.add_argument("--workers", type=int, help="Threads de atendimento (padrão: núcleos da CPU)")
+    return parser
+
+
+def _fail(message: str, as_json: bool) -> int:
+    if as_json:
+        json.dump({"error": message}, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        print(f"Erro: {message}", file=sys.stderr)
+    return 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        result = args.handler(args)
+        emit(result, args.json)
+    except BrokenPipeError:
+        # Quem lia a saída fechou o pipe (`| head`): sai em silêncio, e o flush final do Python
+        # vai para /dev/null em vez de falhar de novo
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (LookupError, ValueError, RuntimeError, OSError) as e:
+        return _fail(str(e), args.json)
+    except Exception as e:
+        # O SQLAlchemy só é carregado pelos comandos; banco travado ou inacessível vira uma linha de erro
+        exc = sys.modules.get("sqlalchemy.exc")
+        if exc is None or not isinstance(e, exc.OperationalError):
+            raise
+        return _fail(f"Banco de dados indisponível: {e.orig or e}", args.json)
+    # Operações em lote com algum item recusado saem com erro, para o script perceber
+    if isinstance(result, list) and any(getattr(item, "success", True) is False for item in result):
+        return 1
+    return 0
@@ -1,19 +1,28 @@
 import os
+from datetime import datetime, timedelta
+from itertools import islice
 from colorama import Fore, Style, init
 from tabulate import tabulate
 from ..services.book_service import BookService
 from ..services.user_service import UserService
 from ..services.loan_service import LoanService
+from ..services.stats_service import StatsService
+from ..services.report_service import ReportService
+from ..utils.cache import entity_cache
 
 
 init()
 
 
 class LibraryInterface:
+    PAGE_SIZE = 20
+
     def __init__(self) -> None:
         self.book_service = BookService()
         self.user_service = UserService()
         self.loan_service = LoanService()
+        self.stats_service = StatsService()
+        self.report_service = ReportService()
 
     def clear_screen(self) -> None:
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -49,6 +58,49 @@ class LibraryInterface:
             except ValueError:
                 self.print_error("Por favor, digite um número válido")
 
+    def browse_pages(self, fetch_page, to_row, headers: list, empty_message: str) -> None:
+        """Mostra uma listagem página a página, buscando só a página atual no banco."""
+        def items():
+            after_id = None
+            while True:
+                page = fetch_page(after_id, self.PAGE_SIZE)
+                yield from page
+                if len(page) < self.PAGE_SIZE:
+                    return
+                after_id = page[-1].id
+
+        self.browse_stream(items(), to_row, headers, empty_message)
+
+    def browse_stream(self, items, to_row, headers: list, empty_message: str) -> None:
+        """Mostra um iterável página a página, consumindo só o necessário para a página atual."""
+        items = iter(items)
+        chunk = list(islice(items, self.PAGE_SIZE + 1))
+        page = 1
+        while True:
+            if not chunk:
+                if page == 1:
+                    self.print_warning(empty_message)
+                break
+            print(tabulate([to_row(item) for item in chunk[:self.PAGE_SIZE]], headers=headers, tablefmt="grid"))
+            if len(chunk) <= self.PAGE_SIZE:
+                break
+            choice = input(
+                f"\n{Fore.CYAN}Página {page} - Enter para a próxima, 'q' para sair: {Style.RESET_ALL}"
+            ).strip().lower()
+            if choice == 'q':
+                return
+            chunk = chunk[self.PAGE_SIZE:] + list(islice(items, self.PAGE_SIZE))
+            page += 1
+        self.wait_for_enter()
+
+    def book_row(self, book) -> list:
+        status = "✅ Disponível" if book.is_available else "❌ Emprestado"
+        status += f" ({book.copies_available}/{book.copies_total})"
+        return [book.id, book.title, book.author, book.year, book.category, status]
+
+    def user_row(self, user) -> list:
+        return [user.id, user.name, user.email, user.phone, user.created_at.strftime("%d/%m/%Y")]
+
     def main_menu(self) -> None:
         while True:
             self.clear_screen()
@@ -118,7 +170,8 @@ class LibraryInterface:
                 self.print_error("Categoria não pode estar vazia!")
                 self.wait_for_enter()
                 return
-            book = self.book_service.add_book(title, author, year, category)
+            copies = self.get_valid_integer("Exemplares: ", 1, 1000)
+            book = self.book_service.add_book(title, author, year, category, copies)
             self.print_success(f"Livro '{book.title}' adicionado com sucesso! (ID: {book.id})")
         except Exception as e:
             self.print_error(f"Erro ao adicionar livro: {str(e)}")
@@ -127,17 +180,12 @@ class LibraryInterface:
     def list_books(self) -> None:
         self.clear_screen()
         self.print_header("LISTA DE LIVROS")
-        books = self.book_service.get_all_books()
-        if not books:
-            self.print_warning("Nenhum livro cadastrado")
-        else:
-            table_data = []
-            for book in books:
-                status = "✅ Disponível" if book.is_available else "❌ Emprestado"
-                table_data.append([book.id, book.title, book.author, book.year, book.category, status])
-            headers = ["ID", "Título", "Autor", "Ano", "Categoria", "Status"]
-            print(tabulate(table_data, headers=headers, tablefmt="grid"))
-        self.wait_for_enter()
+        self.browse_pages(
+            lambda after_id, limit: self.book_service.get_book_listing(after_id=after_id, limit=limit),
+            self.book_row,
+            ["ID", "Título", "Autor", "Ano", "Categoria", "Status"],
+            "Nenhum livro cadastrado",
+        )
 
     def search_books(self) -> None:
         self.clear_screen()
@@ -147,16 +195,14 @@ class LibraryInterface:
             self.print_error("Termo de busca não pode estar vazio!")
             self.wait_for_enter()
             return
-        books = self.book_service.search_books(search_term)
+        books = self.book_service.search_book_listing(search_term, limit=self.PAGE_SIZE)
         if not books:
             self.print_warning("Nenhum livro encontrado")
         else:
-            table_data = []
-            for book in books:
-                status = "✅ Disponível" if book.is_available else "❌ Emprestado"
-                table_data.append([book.id, book.title, book.author, book.year, book.category, status])
             headers = ["ID", "Título", "Autor", "Ano", "Categoria", "Status"]
-            print(tabulate(table_data, headers=headers, tablefmt="grid"))
+            print(tabulate([self.book_row(book) for book in books], headers=headers, tablefmt="grid"))
+            if len(books) == self.PAGE_SIZE:
+                self.print_warning(f"Mostrando os {self.PAGE_SIZE} resultados mais relevantes")
         self.wait_for_enter()
 
     def remove_book(self) -> None:
@@ -239,16 +285,12 @@ class LibraryInterface:
     def list_users(self) -> None:
         self.clear_screen()
         self.print_header("LISTA DE USUÁRIOS")
-        users = self.user_service.get_all_users()
-        if not users:
-            self.print_warning("Nenhum usuário cadastrado")
-        else:
-            table_data = []
-            for user in users:
-                table_data.append([user.id, user.name, user.email, user.phone, user.created_at.strftime("%d/%m/%Y")])
-            headers = ["ID", "Nome", "Email", "Telefone", "Cadastro"]
-            print(tabulate(table_data, headers=headers, tablefmt="grid"))
-        self.wait_for_enter()
+        self.browse_pages(
+            lambda after_id, limit: self.user_service.get_user_listing(after_id=after_id, limit=limit),
+            self.user_row,
+            ["ID", "Nome", "Email", "Telefone", "Cadastro"],
+            "Nenhum usuário cadastrado",
+        )
 
     def search_users(self) -> None:
         self.clear_screen()
@@ -258,16 +300,12 @@ class LibraryInterface:
             self.print_error("Termo de busca não pode estar vazio!")
             self.wait_for_enter()
             return
-        users = self.user_service.search_users(search_term)
-        if not users:
-            self.print_warning("Nenhum usuário encontrado")
-        else:
-            table_data = []
-            for user in users:
-                table_data.append([user.id, user.name, user.email, user.phone, user.created_at.strftime("%d/%m/%Y")])
-            headers = ["ID", "Nome", "Email", "Telefone", "Cadastro"]
-            print(tabulate(table_data, headers=headers, tablefmt="grid"))
-        self.wait_for_enter()
+        self.browse_pages(
+            lambda after_id, limit: self.user_service.search_user_listing(search_term, after_id=after_id, limit=limit),
+            self.user_row,
+            ["ID", "Nome", "Email", "Telefone", "Cadastro"],
+            "Nenhum usuário encontrado",
+        )
 
     def edit_user(self) -> None:
         self.clear_screen()
@@ -324,7 +362,10 @@ class LibraryInterface:
             print(f"3. 🔁 Renovar Empréstimo")
             print(f"4. 📋 Listar Empréstimos Ativos")
             print(f"5. 🕓 Histórico de Empréstimos do Usuário")
-            print(f"6. ⬅️  Voltar{Style.RESET_ALL}")
+            print(f"6. 📚 Empréstimo de Vários Livros")
+            print(f"7. 📥 Devolução de Vários Empréstimos")
+            print(f"8. ⏰ Empréstimos em Atraso")
+            print(f"9. ⬅️  Voltar{Style.RESET_ALL}")
             choice = input(f"\n{Fore.CYAN}Escolha uma opção: {Style.RESET_ALL}")
             if choice == '1':
                 self.create_loan()
@@ -337,6 +378,12 @@ class LibraryInterface:
             elif choice == '5':
                 self.user_loan_history()
             elif choice == '6':
+                self.create_loans_batch()
+            elif choice == '7':
+                self.return_loans_batch()
+            elif choice == '8':
+                self.list_overdue_loans()
+            elif choice == '9':
                 break
             else:
                 self.print_error("Opção inválida!")
@@ -354,6 +401,51 @@ class LibraryInterface:
             self.print_error(str(e))
         self.wait_for_enter()
 
+    def get_id_list(self, prompt: str) -> list:
+        while True:
+            raw = input(prompt).replace(";", ",").replace(" ", ",")
+            try:
+                ids = [int(part) for part in raw.split(",") if part.strip()]
+            except ValueError:
+                self.print_error("Digite apenas números separados por vírgula")
+                continue
+            if ids:
+                return ids
+            self.print_error("Informe pelo menos um ID")
+
+    def print_outcomes(self, outcomes: list, item_label: str) -> None:
+        rows = [
+            [outcome.item_id, outcome.loan_id or "-", ("✅ " if outcome.success else "❌ ") + outcome.message]
+            for outcome in outcomes
+        ]
+        print(tabulate(rows, headers=[item_label, "Empréstimo", "Resultado"], tablefmt="grid"))
+        succeeded = sum(1 for outcome in outcomes if outcome.success)
+        if succeeded == len(outcomes):
+            self.print_success(f"{succeeded} de {len(outcomes)} itens processados")
+        else:
+            self.print_warning(f"{succeeded} de {len(outcomes)} itens processados")
+
+    def create_loans_batch(self) -> None:
+        self.clear_screen()
+        self.print_header("EMPRÉSTIMO DE VÁRIOS LIVROS")
+        try:
+            user_id = self.get_valid_integer("ID do usuário: ")
+            book_ids = self.get_id_list("IDs dos livros (separados por vírgula): ")
+            self.print_outcomes(self.loan_service.create_loans(user_id, book_ids), "Livro")
+        except Exception as e:
+            self.print_error(str(e))
+        self.wait_for_enter()
+
+    def return_loans_batch(self) -> None:
+        self.clear_screen()
+        self.print_header("DEVOLUÇÃO DE VÁRIOS EMPRÉSTIMOS")
+        try:
+            loan_ids = self.get_id_list("IDs dos empréstimos (separados por vírgula): ")
+            self.print_outcomes(self.loan_service.return_loans(loan_ids), "ID")
+        except Exception as e:
+            self.print_error(str(e))
+        self.wait_for_enter()
+
     def return_loan(self) -> None:
         self.clear_screen()
         self.print_header("DEVOLVER EMPRÉSTIMO")
@@ -378,52 +470,174 @@ class LibraryInterface:
     def list_active_loans(self) -> None:
         self.clear_screen()
         self.print_header("EMPRÉSTIMOS ATIVOS")
-        loans = self.loan_service.get_active_loans()
-        if not loans:
-            self.print_warning("Nenhum empréstimo ativo")
-        else:
-            rows = []
-            for loan in loans:
-                rows.append([
-                    loan.id,
-                    loan.user_id,
-                    loan.book_id,
-                    loan.loan_date.strftime("%d/%m/%Y"),
-                ])
-            print(tabulate(rows, headers=["ID", "Usuário", "Livro", "Data"], tablefmt="grid"))
-        self.wait_for_enter()
+        self.browse_pages(
+            lambda after_id, limit: self.loan_service.get_active_loan_listing(after_id=after_id, limit=limit),
+            lambda loan: [
+                loan.id,
+                loan.user_name,
+                loan.title,
+                loan.author,
+                loan.loan_date.strftime("%d/%m/%Y"),
+                loan.due_date.strftime("%d/%m/%Y"),
+            ],
+            ["ID", "Usuário", "Livro", "Autor", "Data", "Vencimento"],
+            "Nenhum empréstimo ativo",
+        )
+
+    def list_overdue_loans(self) -> None:
+        self.clear_screen()
+        self.print_header("EMPRÉSTIMOS EM ATRASO")
+        today = datetime.now()
+        self.browse_stream(
+            self.loan_service.get_overdue_loan_listing(today, batch_size=self.PAGE_SIZE + 1),
+            lambda loan: [
+                loan.id,
+                loan.user_name,
+                loan.title,
+                loan.due_date.strftime("%d/%m/%Y"),
+                (today - loan.due_date).days,
+            ],
+            ["ID", "Usuário", "Livro", "Vencimento", "Dias de atraso"],
+            "Nenhum empréstimo em atraso",
+        )
 
     def user_loan_history(self) -> None:
         self.clear_screen()
         self.print_header("HISTÓRICO DE EMPRÉSTIMOS DO USUÁRIO")
         user_id = self.get_valid_integer("ID do usuário: ")
-        loans = self.loan_service.get_user_history(user_id)
-        if not loans:
-            self.print_warning("Nenhum empréstimo encontrado")
-        else:
-            rows = []
-            for loan in loans:
-                rows.append([
-                    loan.id,
-                    loan.book_id,
-                    loan.loan_date.strftime("%d/%m/%Y"),
-                    loan.return_date.strftime("%d/%m/%Y") if loan.return_date else "-",
-                    "Devolvido" if loan.is_returned else "Ativo",
-                ])
-            print(tabulate(rows, headers=["ID", "Livro", "Empréstimo", "Devolução", "Status"], tablefmt="grid"))
-        self.wait_for_enter()
+        self.browse_pages(
+            lambda after_id, limit: self.loan_service.get_user_history_listing(user_id, after_id=after_id, limit=limit),
+            lambda loan: [
+                loan.id,
+                loan.title,
+                loan.author,
+                loan.loan_date.strftime("%d/%m/%Y"),
+                loan.return_date.strftime("%d/%m/%Y") if loan.return_date else "-",
+                "Devolvido" if loan.is_returned else "Ativo",
+            ],
+            ["ID", "Livro", "Autor", "Empréstimo", "Devolução", "Status"],
+            "Nenhum empréstimo encontrado",
+        )
 
     def reports_menu(self) -> None:
+        while True:
+            self.clear_screen()
+            self.print_header("RELATÓRIOS")
+            print(f"{Fore.YELLOW}1. 📊 Resumo Geral")
+            print(f"2. 🏆 Livros Mais Emprestados")
+            print(f"3. 👥 Usuários Mais Ativos")
+            print(f"4. 📅 Empréstimos por Mês")
+            print(f"5. 🗂️  Circulação por Categoria")
+            print(f"6. ⬅️  Voltar{Style.RESET_ALL}")
+            choice = input(f"\n{Fore.CYAN}Escolha uma opção: {Style.RESET_ALL}")
+            if choice == '1':
+                self.summary_report()
+            elif choice == '2':
+                self.top_books_report()
+            elif choice == '3':
+                self.top_users_report()
+            elif choice == '4':
+                self.monthly_loans_report()
+            elif choice == '5':
+                self.category_circulation_report()
+            elif choice == '6':
+                break
+            else:
+                self.print_error("Opção inválida!")
+                self.wait_for_enter()
+
+    def get_optional_date(self, prompt: str):
+        while True:
+            raw = input(prompt).strip()
+            if not raw:
+                return None
+            try:
+                return datetime.strptime(raw, "%d/%m/%Y")
+            except ValueError:
+                self.print_error("Use o formato dd/mm/aaaa")
+
+    def get_report_filters(self, with_category: bool = True) -> tuple:
+        print("Deixe em branco para não filtrar")
+        start = self.get_optional_date("Data inicial (dd/mm/aaaa): ")
+        end = self.get_optional_date("Data final (dd/mm/aaaa): ")
+        if end is not None:
+            # Data final inclusiva
+            end += timedelta(days=1)
+        category = (input("Categoria: ").strip() or None) if with_category else None
+        return start, end, category
+
+    def summary_report(self) -> None:
         self.clear_screen()
-        self.print_header("RELATÓRIOS")
-        counts = self.book_service.get_books_count_by_status()
-        print(f"Total: {counts['total']} | Disponíveis: {counts['available']} | Emprestados: {counts['borrowed']}")
-        by_category = self.book_service.get_books_count_by_category()
+        self.print_header("RESUMO GERAL")
+        # Uma única leitura dos contadores pré-calculados em vez de COUNT(*) nas tabelas
+        summary = self.stats_service.get_summary()
+        counts = summary["books"]
+        print(f"Títulos: {counts['total']} | Disponíveis: {counts['available']} | Emprestados: {counts['borrowed']}")
+        copies = summary["copies"]
+        print(
+            f"Exemplares: {copies['total']} | Na estante: {copies['available']} | Emprestados: {copies['on_loan']}"
+            f" | Separados para reserva: {copies['on_hold_shelf']}"
+        )
+        holds = summary["holds"]
+        print(f"Reservas: {holds['waiting']} na fila | {holds['ready']} aguardando retirada")
+        loans = summary["loans"]
+        print(f"Usuários: {summary['users']['total']}")
+        print(f"Empréstimos: {loans['total']} | Ativos: {loans['active']} | Devolvidos: {loans['returned']}")
+        by_category = summary["categories"]
         if by_category:
             rows = [[cat, qty] for cat, qty in by_category.items()]
             print(tabulate(rows, headers=["Categoria", "Quantidade"], tablefmt="grid"))
         else:
             self.print_warning("Nenhum dado de categoria")
+        cache = entity_cache.stats()
+        print(
+            f"Cache ({cache['backend']}): {cache['hits']} acertos | {cache['misses']} falhas | "
+            f"taxa {cache['hit_ratio']:.0%}"
+        )
+        self.wait_for_enter()
+
+    def top_books_report(self) -> None:
+        self.clear_screen()
+        self.print_header("LIVROS MAIS EMPRESTADOS")
+        start, end, category = self.get_report_filters()
+        rows = self.report_service.top_books(10, start, end, category)
+        if not rows:
+            self.print_warning("Nenhum empréstimo no período")
+        else:
+            print(tabulate(rows, headers=["ID", "Título", "Autor", "Categoria", "Empréstimos"], tablefmt="grid"))
+        self.wait_for_enter()
+
+    def top_users_report(self) -> None:
+        self.clear_screen()
+        self.print_header("USUÁRIOS MAIS ATIVOS")
+        start, end, category = self.get_report_filters()
+        rows = self.report_service.top_users(10, start, end, category)
+        if not rows:
+            self.print_warning("Nenhum empréstimo no período")
+        else:
+            print(tabulate(rows, headers=["ID", "Nome", "Email", "Empréstimos"], tablefmt="grid"))
+        self.wait_for_enter()
+
+    def monthly_loans_report(self) -> None:
+        self.clear_screen()
+        self.print_header("EMPRÉSTIMOS POR MÊS")
+        start, end, category = self.get_report_filters()
+        rows = self.report_service.loans_per_month(start, end, category)
+        if not rows:
+            self.print_warning("Nenhum empréstimo no período")
+        else:
+            print(tabulate(rows, headers=["Mês", "Empréstimos", "Devolvidos"], tablefmt="grid"))
+        self.wait_for_enter()
+
+    def category_circulation_report(self) -> None:
+        self.clear_screen()
+        self.print_header("CIRCULAÇÃO POR CATEGORIA")
+        start, end, _ = self.get_report_filters(with_category=False)
+        rows = self.report_service.circulation_by_category(start, end)
+        if not rows:
+            self.print_warning("Nenhum empréstimo no período")
+        else:
+            print(tabulate(rows, headers=["Categoria", "Empréstimos", "Livros", "Usuários"], tablefmt="grid"))
         self.wait_for_enter()
 
 
@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence
+from sqlalchemy import delete, func, insert, select, update
+from .models import ChangeLog, ChangeOffset
+from .statistics import dialect_insert, dialect_name
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# Chave da trava consultiva (pg_advisory_xact_lock) que põe em fila quem grava no log no PostgreSQL
+CHANGE_LOG_LOCK = 0x6368616E67
+
+
+def record(
+    executor, table_name: str, operation: str, row_ids: Iterable[int], columns: Sequence[str] = ()
+) -> None:
+    """Anota no log, dentro da transação corrente, a alteração das linhas `row_ids` de `table_name`.
+
+    `columns` lista as colunas alteradas num update; inserts e deletes valem para a linha inteira.
+    """
+    now = datetime.now()
+    changed_columns = ",".join(columns) or None
+    rows = [
+        {
+            "table_name": table_name,
+            "operation": operation,
+            "row_id": row_id,
+            "changed_columns": changed_columns,
+            "changed_at": now,
+        }
+        for row_id in row_ids
+    ]
+    if rows:
+        if dialect_name(executor) == "postgresql":
+            # A sequência numera no INSERT, não no commit: sem a fila, a transação com o id N poderia
+            # confirmar depois de um leitor já ter avançado até N+1, e N nunca seria lido. Com a trava
+            # até o commit, os ids ficam visíveis na ordem, como no SQLite, que já serializa escritores.
+            executor.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)))
+        executor.execute(insert(ChangeLog.__table__), rows)
+
+
+def read_changes(
+    executor, after_id: int = 0, limit: int = 500, tables: Optional[Sequence[str]] = None
+) -> List[ChangeLog]:
+    """Entradas posteriores a `after_id`, na ordem em que foram gravadas.
+
+    Avançar pelo id é seguro porque os ids se tornam visíveis em ordem crescente (ver `record`).
+    """
+    query = select(ChangeLog).where(ChangeLog.id > after_id)
+    if tables:
+        query = query.where(ChangeLog.table_name.in_(tables))
+    return list(executor.scalars(query.order_by(ChangeLog.id).limit(limit)))
+
+
+def get_offset(executor, consumer: str) -> int:
+    position = executor.execute(select(ChangeOffset.position).where(ChangeOffset.consumer == consumer)).scalar()
+    return position or 0
+
+
+def save_offset(executor, consumer: str, position: int) -> None:
+    """Grava até onde `consumer` já processou o log."""
+    row = {"consumer": consumer, "position": position, "updated_at": datetime.now()}
+    upsert = dialect_insert(executor)
+    table = ChangeOffset.__table__
+    if upsert is not None:
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.consumer],
+            set_={"position": statement.excluded.position, "updated_at": statement.excluded.updated_at},
+        )
+        executor.execute(statement, [row])
+        return
+    updated = executor.execute(
+        update(table).where(table.c.consumer == consumer).values(position=position, updated_at=row["updated_at"])
+    ).rowcount
+    if not updated:
+        executor.execute(insert(table).values(**row))
+
+
+def purge_consumed(executor) -> int:
+    """Apaga as entradas que todos os consumidores registrados já processaram."""
+    low = executor.execute(select(func.min(ChangeOffset.position))).scalar()
+    if low is None:
+        return 0
+    return executor.execute(delete(ChangeLog.__table__).where(ChangeLog.id <= low)).rowcount
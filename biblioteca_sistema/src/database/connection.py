@@ -1,35 +1,240 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .models import Base
+from contextlib import contextmanager
+from functools import wraps
+from typing import Iterator
+import random
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session, sessionmaker
+from .instrumentation import instrument_from_env, operation
+from .migrations import schema_is_current, upgrade_schema
+from .search import create_search_index
 import os
+import threading
+import time
 from pathlib import Path
 
 
+class CheckoutMetrics:
+    """Tempo de espera para obter uma conexão do pool, acumulado por processo."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            average = self.total_wait / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "total_wait_ms": self.total_wait * 1000,
+                "avg_wait_ms": average * 1000,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+def is_lock_error(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def retry_on_locked(method=None, *, attempts: int = 5, base_delay: float = 0.05):
+    """Repete métodos de serviço que falharam com `database is locked`, com espera exponencial.
+
+    Só repete quando o serviço abre a própria transação; dentro da transação de outro
+    chamador o erro sobe para quem pode repetir a unidade de trabalho inteira.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(self, *args, **kwargs)
+                except OperationalError as e:
+                    if getattr(self, "_session", None) is not None or not is_lock_error(e) or attempt == attempts - 1:
+                        raise
+                    time.sleep(base_delay * (2 ** attempt) * (1 + random.random()))
+        return wrapper
+
+    if method is not None:
+        return decorator(method)
+    return decorator
+
+
+def _pool_options() -> dict:
+    # Só faz sentido para bancos remotos; o SQLite local usa o pool padrão do SQLAlchemy
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+# Perfis de desempenho do SQLite, escolhidos por DB_PROFILE (padrão: balanced).
+# safe mantém o journal clássico com fsync a cada commit; balanced usa WAL, que deixa
+# leitores e o escritor trabalharem ao mesmo tempo e só perde a durabilidade do último
+# commit numa queda de energia; fast também dispensa fsync e serve só para cargas descartáveis.
+SQLITE_PROFILES = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+DEFAULT_SQLITE_PROFILE = "balanced"
+
+
+def apply_sqlite_profile(engine, profile: str | None = None) -> None:
+    """Aplica os PRAGMAs do perfil em cada conexão nova do engine (só para SQLite)."""
+    if engine.dialect.name != "sqlite":
+        return
+    profile = profile or os.getenv("DB_PROFILE", DEFAULT_SQLITE_PROFILE)
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil de banco desconhecido: {profile} (use {', '.join(SQLITE_PROFILES)})")
+    pragmas = SQLITE_PROFILES[profile]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
 class DatabaseConnection:
-    def __init__(self, db_path: str | None = None) -> None:
-        database_url = os.getenv("DATABASE_URL")
-        if database_url:
+    """Conexão com o banco; o engine e a checagem do esquema só acontecem no primeiro uso."""
+
+    def __init__(self, db_path: str | None = None, profile: str | None = None) -> None:
+        self.database_url = os.getenv("DATABASE_URL")
+        self.profile = profile
+        if self.database_url:
             # Use remote or custom database URL
             self.db_path = None
-            self.engine = create_engine(database_url, echo=False, pool_pre_ping=True)
         else:
             if db_path is None:
                 project_root = Path(__file__).parent.parent.parent
                 db_path = project_root / "database" / "biblioteca.db"
             self.db_path = str(db_path)
-            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-            self.engine = create_engine(f"sqlite:///{self.db_path}", echo=False)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.create_tables()
+        self.checkout_metrics = CheckoutMetrics()
+        # Estatísticas de consultas, só com DB_INSTRUMENT ligado; sem ele os eventos nem são registrados
+        self.query_stats = None
+        self._engine = None
+        self._session_factory = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._connect()
+        return self._engine
+
+    @property
+    def SessionLocal(self):
+        if self._session_factory is None:
+            self._connect()
+        return self._session_factory
+
+    def _connect(self) -> None:
+        with self._lock:
+            if self._engine is not None:
+                return
+            if self.database_url:
+                options = {} if self.database_url.startswith("sqlite") else _pool_options()
+                engine = create_engine(self.database_url, echo=False, pool_pre_ping=True, **options)
+            else:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                engine = create_engine(f"sqlite:///{self.db_path}", echo=False)
+            # Vale também para DATABASE_URL=sqlite:///...; nos outros bancos não faz nada
+            apply_sqlite_profile(engine, self.profile)
+            self.query_stats = instrument_from_env(engine)
+            self._create_tables(engine)
+            # Objetos continuam legíveis depois do commit, quando a sessão já foi fechada
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+            self._engine = engine
 
     def create_tables(self) -> None:
-        Base.metadata.create_all(bind=self.engine)
+        self._create_tables(self.engine)
+
+    def _create_tables(self, engine) -> None:
+        # Banco já na última versão: nada de create_all nem reflexão a cada inicialização
+        with operation("DatabaseConnection.create_tables"):
+            if schema_is_current(engine):
+                return
+            upgrade_schema(engine)
+            create_search_index(engine)
 
     def get_session(self):
         return self.SessionLocal()
 
+    @contextmanager
+    def session_scope(self, session: Session | None = None) -> Iterator[Session]:
+        """Unidade de trabalho: uma sessão por operação, com commit no fim e rollback em caso de erro.
+
+        Se `session` for informada, a operação participa da transação de quem a abriu,
+        que fica responsável pelo commit.
+        """
+        if session is not None:
+            yield session
+            return
+        session = self.SessionLocal()
+        try:
+            start = time.perf_counter()
+            session.connection()
+            self.checkout_metrics.record(time.perf_counter() - start)
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_pool_status(self) -> dict:
+        status = self.checkout_metrics.snapshot()
+        pool = self.engine.pool
+        status["pool"] = pool.__class__.__name__
+        if isinstance(pool, QueuePool):
+            status.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return status
+
     def close_connection(self) -> None:
-        self.engine.dispose()
+        if self._engine is not None:
+            self._engine.dispose()
 
     def get_db_path(self) -> str | None:
         return self.db_path
@@ -42,5 +247,3 @@ class DatabaseConnection:
 
 
 db_connection = DatabaseConnection()
-
-
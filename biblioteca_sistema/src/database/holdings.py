@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select, update
+from .models import Book, Copy
+
+# Colunas do título que acompanham a entrada e a saída de exemplares (para o log de alterações)
+HOLDINGS_COLUMNS = ["copies_available", "is_available"]
+
+
+def adjust(executor, book_id: int, total: int = 0, available: int = 0) -> Optional[int]:
+    """Soma os deltas às contagens de exemplares do título; devolve quantos ficaram na estante.
+
+    Devolve None se o título não existe ou se não há exemplares disponíveis para retirar.
+    O UPDATE trava a linha do título, então quem vier em seguida já vê a contagem nova.
+    """
+    statement = (
+        update(Book)
+        .where(Book.id == book_id, Book.copies_available + available >= 0)
+        .values(
+            copies_total=Book.copies_total + total,
+            copies_available=Book.copies_available + available,
+            is_available=Book.copies_available + available > 0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if executor.get_bind().dialect.update_returning:
+        return executor.execute(statement.returning(Book.copies_available)).scalar()
+    if not executor.execute(statement).rowcount:
+        return None
+    return executor.execute(select(Book.copies_available).where(Book.id == book_id)).scalar()
+
+
+def availability_change(available_after: int, delta: int) -> int:
+    """+1 se o título voltou para a estante, -1 se saiu dela, 0 se nada mudou (para BOOKS_AVAILABLE)."""
+    return int(available_after > 0) - int(available_after - delta > 0)
+
+
+def take_copies(executor, book_ids: Iterable[int]) -> Dict[int, int]:
+    """Tira da estante um exemplar de cada título e devolve {book_id: copy_id}.
+
+    Chame depois de `adjust` ter reservado os títulos na mesma transação: com a linha do título
+    travada, ninguém disputa os mesmos exemplares entre o SELECT e o UPDATE.
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return {}
+    chosen = dict(
+        executor.execute(
+            select(Copy.book_id, func.min(Copy.id))
+            .where(Copy.book_id.in_(book_ids), Copy.is_available == True)
+            .group_by(Copy.book_id)
+        ).all()
+    )
+    if chosen:
+        executor.execute(
+            update(Copy)
+            .where(Copy.id.in_(chosen.values()))
+            .values(is_available=False)
+            .execution_options(synchronize_session=False)
+        )
+    return chosen
+
+
+def return_copies(executor, copy_ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """Devolve os exemplares à estante; devolve `(copy_id, book_id)` dos que voltaram de fato."""
+    copy_ids = [copy_id for copy_id in copy_ids if copy_id is not None]
+    if not copy_ids:
+        return []
+    on_loan = executor.execute(
+        select(Copy.id, Copy.book_id).where(Copy.id.in_(copy_ids), Copy.is_available == False)
+    ).all()
+    if on_loan:
+        executor.execute(
+            update(Copy)
+            .where(Copy.id.in_([copy_id for copy_id, _ in on_loan]))
+            .values(is_available=True)
+            .execution_options(synchronize_session=False)
+        )
+    return [tuple(row) for row in on_loan]
+
+
+def recount(executor, book_id: int) -> Optional[int]:
+    """Recalcula as contagens do título a partir dos exemplares; devolve quantos estão na estante."""
+    total, available = executor.execute(
+        select(func.count(Copy.id), func.count(Copy.id).filter(Copy.is_available == True)).where(
+            Copy.book_id == book_id
+        )
+    ).one()
+    updated = executor.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(copies_total=total, copies_available=available, is_available=available > 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return available if updated else None
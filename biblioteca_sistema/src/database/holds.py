@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, func, select, update
+from .models import Book, Copy, Hold
+from . import changelog, holdings, statistics
+
+WAITING = "waiting"
+READY = "ready"
+FULFILLED = "fulfilled"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+ACTIVE = (WAITING, READY)
+
+# Dias que o exemplar separado espera na prateleira de reservas antes de passar ao próximo da fila
+HOLD_SHELF_DAYS = 3
+ALLOCATION_COLUMNS = ["status", "copy_id", "ready_at", "expires_at"]
+
+
+def next_in_line(executor, book_id: int, count: int) -> List[int]:
+    """Ids das `count` primeiras reservas em espera do título, na ordem da fila.
+
+    Lê só a ponta da fila pelo índice (book_id, status, id), por maior que ela seja. Nos bancos
+    com FOR UPDATE quem reparte exemplares do título trava antes a linha do livro: duas devoluções
+    simultâneas esperam uma pela outra e a segunda lê a fila já sem as reservas atendidas pela
+    primeira, então a fila anda sempre pela ordem (pular as travadas deixaria passar à frente).
+    """
+    executor.execute(select(Book.id).where(Book.id == book_id).with_for_update())
+    return list(
+        executor.scalars(
+            select(Hold.id)
+            .where(Hold.book_id == book_id, Hold.status == WAITING)
+            .order_by(Hold.id)
+            .limit(count)
+            .with_for_update()
+        )
+    )
+
+
+def allocate(executor, copies: Sequence[Tuple[int, int]], now: Optional[datetime] = None) -> Dict[int, int]:
+    """Separa os exemplares `(copy_id, book_id)` para as próximas reservas de cada título.
+
+    Devolve {copy_id: hold_id} dos exemplares separados; os demais não têm quem os espere.
+    """
+    by_book = defaultdict(list)
+    for copy_id, book_id in copies:
+        by_book[book_id].append(copy_id)
+    allocated = {}
+    # Títulos em ordem de id: as travas dos livros saem sempre na mesma ordem, sem deadlock
+    for book_id, copy_ids in sorted(by_book.items()):
+        allocated.update(zip(copy_ids, next_in_line(executor, book_id, len(copy_ids))))
+    if allocated:
+        now = now or datetime.now()
+        table = Hold.__table__
+        executor.execute(
+            update(table)
+            .where(table.c.id == bindparam("hold_id"))
+            .values(
+                status=READY,
+                copy_id=bindparam("allocated_copy"),
+                ready_at=now,
+                expires_at=now + timedelta(days=HOLD_SHELF_DAYS),
+            ),
+            [{"hold_id": hold_id, "allocated_copy": copy_id} for copy_id, hold_id in allocated.items()],
+        )
+    return allocated
+
+
+def release(executor, copy_ids: Iterable[Optional[int]], now: Optional[datetime] = None) -> Counter:
+    """Entrega os exemplares que saíram de circulação ao próximo da fila ou, sem fila, à estante.
+
+    Vale para devoluções, reservas vencidas ou canceladas e exemplares novos. Atualiza na mesma
+    transação as contagens dos títulos, os contadores e o log; devolve, por título, quantos
+    exemplares voltaram à estante (para invalidar o cache dos livros).
+    """
+    copy_ids = sorted({copy_id for copy_id in copy_ids if copy_id is not None})
+    if not copy_ids:
+        return Counter()
+    out = executor.execute(
+        select(Copy.id, Copy.book_id).where(Copy.id.in_(copy_ids), Copy.is_available == False)
+    ).all()
+    allocated = allocate(executor, out, now)
+    returned = holdings.return_copies(executor, [copy_id for copy_id, _ in out if copy_id not in allocated])
+    shelved = Counter(book_id for _, book_id in returned)
+    titles_back = 0
+    for book_id, count in shelved.items():
+        available = holdings.adjust(executor, book_id, available=count)
+        titles_back += holdings.availability_change(available, count)
+    changelog.record(executor, "holds", changelog.UPDATE, sorted(allocated.values()), ALLOCATION_COLUMNS)
+    # Os separados continuam fora da estante: só os que voltaram mudaram de is_available
+    changelog.record(executor, "copies", changelog.UPDATE, sorted(copy_id for copy_id, _ in returned), ["is_available"])
+    changelog.record(executor, "books", changelog.UPDATE, sorted(shelved), holdings.HOLDINGS_COLUMNS)
+    statistics.increment(
+        executor,
+        {
+            statistics.BOOKS_AVAILABLE: titles_back,
+            statistics.COPIES_AVAILABLE: sum(shelved.values()),
+            statistics.HOLDS_WAITING: -len(allocated),
+            statistics.HOLDS_READY: len(allocated),
+        },
+    )
+    return shelved
+
+
+def claim_ready(executor, user_id: int, book_ids: Iterable[int]) -> Dict[int, int]:
+    """Conclui as reservas prontas do usuário para esses títulos; devolve {book_id: copy_id separado}."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return {}
+    ready = executor.execute(
+        select(Hold.id, Hold.book_id, Hold.copy_id)
+        .where(Hold.user_id == user_id, Hold.status == READY, Hold.book_id.in_(book_ids))
+        .with_for_update()
+    ).all()
+    if not ready:
+        return {}
+    executor.execute(
+        update(Hold)
+        .where(Hold.id.in_([hold_id for hold_id, _, _ in ready]))
+        .values(status=FULFILLED)
+        .execution_options(synchronize_session=False)
+    )
+    changelog.record(executor, "holds", changelog.UPDATE, sorted(hold_id for hold_id, _, _ in ready), ["status"])
+    statistics.increment(executor, {statistics.HOLDS_READY: -len(ready)})
+    return {book_id: copy_id for _, book_id, copy_id in ready}
+
+
+def expire_ready(executor, as_of: datetime, limit: int, ready_before: datetime) -> List[Tuple[int, int]]:
+    """Vence até `limit` reservas prontas cujo prazo de retirada passou; devolve `(hold_id, copy_id)`.
+
+    Só entram as separadas antes de `ready_before`: as que a própria varredura separa ao repassar
+    exemplares não vencem na mesma rodada, mesmo com `as_of` no futuro.
+    Um SELECT pela faixa (status, expires_at) do índice e um UPDATE pelos ids, por lote.
+    """
+    expired = executor.execute(
+        select(Hold.id, Hold.copy_id)
+        .where(Hold.status == READY, Hold.expires_at < as_of, Hold.ready_at < ready_before)
+        .order_by(Hold.expires_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if expired:
+        executor.execute(
+            update(Hold)
+            .where(Hold.id.in_([hold_id for hold_id, _ in expired]))
+            .values(status=EXPIRED)
+            .execution_options(synchronize_session=False)
+        )
+    return [tuple(row) for row in expired]
+
+
+def queue_position(executor, hold: Hold) -> Optional[int]:
+    """Posição (a partir de 1) de uma reserva em espera na fila do título."""
+    if hold.status != WAITING:
+        return None
+    return executor.execute(
+        select(func.count(Hold.id)).where(
+            Hold.book_id == hold.book_id, Hold.status == WAITING, Hold.id <= hold.id
+        )
+    ).scalar()
@@ -0,0 +1,236 @@
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+
+# Limites superiores (ms) das faixas do histograma de latência; a última faixa é "acima de 2,5 s"
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+DEFAULT_SLOW_QUERY_MS = 100.0
+SLOW_LOG_SIZE = 100
+
+_SERVICES_DIR = str(Path(__file__).resolve().parent.parent / "services")
+# Listas de parâmetros de IN (...) variam de tamanho a cada chamada; viram uma só entrada
+_PLACEHOLDER_LIST = re.compile(r"\((?:\?|%\(\w+\)s|%s)(?:,\s*(?:\?|%\(\w+\)s|%s))+\)")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+_operation: ContextVar[Optional[str]] = ContextVar("query_operation", default=None)
+
+
+@contextmanager
+def operation(name: str) -> Iterator[None]:
+    """Marca as consultas do bloco com `name` em vez do método de serviço que as emitiu."""
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def normalize(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub("(...)", " ".join(statement.split()))
+
+
+def caller_tag() -> str:
+    """`Classe.metodo` do método de serviço mais externo na pilha (o ponto de entrada da operação)."""
+    tag = _operation.get()
+    if tag is not None:
+        return tag
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(_SERVICES_DIR) and code.co_name.isidentifier() and code.co_name[0] != "_":
+            owner = frame.f_locals.get("self")
+            tag = f"{type(owner).__name__}.{code.co_name}" if owner is not None else code.co_name
+        frame = frame.f_back
+    return tag or "-"
+
+
+def _new_entry() -> dict:
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "histogram": [0] * (len(BUCKETS_MS) + 1)}
+
+
+def _percentile(histogram: List[int], count: int, max_ms: float, fraction: float) -> float:
+    """Limite superior da faixa onde cai o percentil (o máximo observado, na última faixa)."""
+    target = fraction * count
+    seen = 0
+    for index, bucket_count in enumerate(histogram):
+        seen += bucket_count
+        if seen >= target:
+            return min(BUCKETS_MS[index], max_ms) if index < len(BUCKETS_MS) else max_ms
+    return max_ms
+
+
+class QueryStats:
+    """Latência e linhas por consulta e por método de serviço, acumuladas por processo.
+
+    Linhas são as que o driver informa no `rowcount`: afetadas nos INSERT/UPDATE/DELETE e, nos drivers
+    que já trazem o resultado inteiro (psycopg2), as devolvidas pelos SELECT; o sqlite3 não as informa.
+    """
+
+    def __init__(self, slow_query_ms: float = DEFAULT_SLOW_QUERY_MS, slow_log_path: Optional[str] = None) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self.slow = deque(maxlen=SLOW_LOG_SIZE)
+
+    def record(self, tag: str, statement: str, elapsed_ms: float, rows: int) -> None:
+        bucket = bisect_left(BUCKETS_MS, elapsed_ms)
+        key = (tag, normalize(statement))
+        with self._lock:
+            entry = self._entries.setdefault(key, _new_entry())
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows"] += max(rows, 0)
+            entry["histogram"][bucket] += 1
+
+    def record_slow(self, tag: str, statement: str, elapsed_ms: float, rows: int, plan: List[str]) -> None:
+        slow = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "tag": tag,
+            "duration_ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "statement": " ".join(statement.split()),
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow.append(slow)
+            if self.slow_log_path:
+                with open(self.slow_log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(slow, ensure_ascii=False) + "\n")
+
+    def summary(self) -> dict:
+        """Resumo serializável em JSON, das consultas que mais tomaram tempo para as que menos tomaram."""
+        with self._lock:
+            entries = [(key, dict(entry, histogram=list(entry["histogram"]))) for key, entry in self._entries.items()]
+            slow = list(self.slow)
+        statements = []
+        for (tag, statement), entry in sorted(entries, key=lambda item: -item[1]["total_ms"]):
+            count = entry["count"]
+            statements.append(
+                {
+                    "tag": tag,
+                    "statement": statement,
+                    **entry,
+                    "avg_ms": entry["total_ms"] / count,
+                    "p50_ms": _percentile(entry["histogram"], count, entry["max_ms"], 0.5),
+                    "p95_ms": _percentile(entry["histogram"], count, entry["max_ms"], 0.95),
+                }
+            )
+        by_tag = {}
+        for item in statements:
+            totals = by_tag.setdefault(item["tag"], {"count": 0, "total_ms": 0.0})
+            totals["count"] += item["count"]
+            totals["total_ms"] += item["total_ms"]
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "buckets_ms": list(BUCKETS_MS),
+            "by_tag": dict(sorted(by_tag.items(), key=lambda item: -item[1]["total_ms"])),
+            "statements": statements,
+            "slow": slow,
+        }
+
+    def merge(self, summary: dict) -> None:
+        """Soma um resumo gravado antes (mesmas faixas) aos números deste processo."""
+        if summary.get("buckets_ms") != list(BUCKETS_MS):
+            return
+        with self._lock:
+            for item in summary.get("statements", []):
+                key = (item["tag"], item["statement"])
+                entry = self._entries.setdefault(key, _new_entry())
+                entry["count"] += item["count"]
+                entry["total_ms"] += item["total_ms"]
+                entry["max_ms"] = max(entry["max_ms"], item["max_ms"])
+                entry["rows"] += item["rows"]
+                entry["histogram"] = [a + b for a, b in zip(entry["histogram"], item["histogram"])]
+            self.slow.extend(summary.get("slow", []))
+
+    def dump(self, path: str) -> None:
+        """Grava o resumo em `path`, somado ao que já estava lá (várias execuções da CLI)."""
+        combined = QueryStats(self.slow_query_ms)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as previous:
+                    combined.merge(json.load(previous))
+            except (OSError, ValueError):
+                pass
+        combined.merge(self.summary())
+        with open(path, "w", encoding="utf-8") as output:
+            json.dump(combined.summary(), output, ensure_ascii=False, indent=2)
+
+
+def _explain(conn, statement: str, parameters) -> List[str]:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # Cursor próprio na mesma conexão: não dispara os eventos de novo nem mexe no resultado pendente
+    explain_cursor = conn.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        return [str(row[-1]) for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [f"(sem plano: {e})"]
+    finally:
+        explain_cursor.close()
+
+
+def instrument(engine, stats: QueryStats) -> QueryStats:
+    """Liga os eventos de cursor do engine às estatísticas de `stats`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        tag = caller_tag()
+        rows = cursor.rowcount
+        stats.record(tag, statement, elapsed_ms, rows)
+        if elapsed_ms >= stats.slow_query_ms:
+            plan = []
+            if not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE):
+                plan = _explain(conn, statement, parameters)
+            stats.record_slow(tag, statement, elapsed_ms, rows, plan)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context) -> None:
+        # Comando que falhou não chega ao after_cursor_execute; o cronômetro dele sai da pilha aqui
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+    return stats
+
+
+def instrument_from_env(engine) -> Optional[QueryStats]:
+    """Instrumenta o engine se DB_INSTRUMENT estiver ligado.
+
+    DB_SLOW_QUERY_MS define o limite do log de consultas lentas (padrão 100 ms), DB_SLOW_QUERY_LOG
+    um arquivo JSONL que recebe cada consulta lenta e DB_QUERY_STATS o arquivo onde o resumo é
+    gravado no fim do processo.
+    """
+    if os.getenv("DB_INSTRUMENT", "").lower() not in ("1", "true", "yes", "on"):
+        return None
+    stats = QueryStats(
+        float(os.getenv("DB_SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)), os.getenv("DB_SLOW_QUERY_LOG") or None
+    )
+    instrument(engine, stats)
+    summary_path = os.getenv("DB_QUERY_STATS")
+    if summary_path:
+        atexit.register(stats.dump, summary_path)
+    return stats
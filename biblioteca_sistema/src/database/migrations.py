@@ -0,0 +1,168 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+from sqlalchemy import func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from .models import Base, Book, Copy, Loan, SchemaVersion
+from .statistics import rebuild_counters
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_indexes(conn: Connection, table_name: str, *index_names: str) -> None:
+    table = Base.metadata.tables[table_name]
+    indexes = {index.name: index for index in table.indexes}
+    for name in index_names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def _add_columns(conn: Connection, table_name: str, *column_names: str) -> None:
+    table = Base.metadata.tables[table_name]
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    for name in column_names:
+        if name not in existing:
+            ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+
+
+def _add_hot_filter_indexes(conn: Connection) -> None:
+    _create_indexes(conn, "books", "ix_books_available_category")
+    _create_indexes(
+        conn,
+        "loans",
+        "ix_loans_user_returned",
+        "ix_loans_book_returned",
+        "ix_loans_user_loan_date",
+        "ix_loans_returned_loan_date",
+    )
+
+
+def _add_watermark_indexes(conn: Connection) -> None:
+    _create_indexes(conn, "books", "ix_books_created_at")
+    _create_indexes(conn, "users", "ix_users_created_at")
+    _create_indexes(conn, "loans", "ix_loans_loan_date")
+
+
+def _populate_statistics(conn: Connection) -> None:
+    rebuild_counters(conn)
+
+
+def _add_due_dates(conn: Connection) -> None:
+    _add_columns(conn, "loans", "due_date", "is_overdue")
+    # Empréstimos antigos recebem o prazo padrão de 14 dias que o sistema sempre usou
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        due_date = "datetime(loan_date, '+14 days')"
+    elif dialect in ("mysql", "mariadb"):
+        due_date = "DATE_ADD(loan_date, INTERVAL 14 DAY)"
+    else:
+        due_date = "loan_date + INTERVAL '14 days'"
+    conn.execute(text(f"UPDATE loans SET due_date = {due_date} WHERE due_date IS NULL"))
+    _create_indexes(conn, "loans", "ix_loans_returned_due_date")
+
+
+def _add_change_log(conn: Connection) -> None:
+    for table_name in ("change_log", "change_offsets"):
+        Base.metadata.tables[table_name].create(conn, checkfirst=True)
+
+
+def _add_copies(conn: Connection) -> None:
+    Base.metadata.tables["copies"].create(conn, checkfirst=True)
+    _add_columns(conn, "books", "copies_total", "copies_available")
+    _add_columns(conn, "loans", "copy_id")
+    # Cada livro existente vira um título com um exemplar, de mesmo id, herdando a disponibilidade
+    if conn.execute(select(Copy.id).limit(1)).first() is None:
+        conn.execute(
+            insert(Copy).from_select(
+                ["id", "book_id", "is_available", "created_at"],
+                select(Book.id, Book.id, func.coalesce(Book.is_available, True), Book.created_at),
+            )
+        )
+        if conn.dialect.name == "postgresql":
+            # Os ids foram copiados dos livros; a sequência precisa continuar depois deles
+            conn.execute(
+                text("SELECT setval(pg_get_serial_sequence('copies', 'id'), COALESCE(MAX(id), 1)) FROM copies")
+            )
+    conn.execute(update(Loan).where(Loan.copy_id.is_(None)).values(copy_id=Loan.book_id))
+    conn.execute(update(Book).where(Book.is_available == False).values(copies_available=0))
+    _create_indexes(conn, "copies", "ix_copies_book_available")
+    _create_indexes(conn, "loans", "ix_loans_copy_returned")
+    rebuild_counters(conn)
+
+
+def _add_holds(conn: Connection) -> None:
+    Base.metadata.tables["holds"].create(conn, checkfirst=True)
+    rebuild_counters(conn)
+
+
+# Novas migrações entram sempre no fim da lista, com versão sequencial.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Índices para filtros de disponibilidade e empréstimos", _add_hot_filter_indexes),
+    Migration(2, "Índices das marcas d'água de exportação incremental", _add_watermark_indexes),
+    Migration(3, "Contadores pré-calculados dos relatórios", _populate_statistics),
+    Migration(4, "Data de devolução prevista e marcação de atraso nos empréstimos", _add_due_dates),
+    Migration(5, "Log de alterações de livros, usuários e empréstimos", _add_change_log),
+    Migration(6, "Exemplares por título, com contagem de disponíveis no livro", _add_copies),
+    Migration(7, "Fila de reservas por título", _add_holds),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def schema_is_current(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        return get_current_version(conn) >= LATEST_VERSION
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(
+        SchemaVersion.__table__.insert().values(
+            version=migration.version, description=migration.description, applied_at=datetime.now()
+        )
+    )
+
+
+def stamp_latest(engine: Engine) -> None:
+    """Marca um banco recém-criado pelo `create_all` como já atualizado."""
+    with engine.begin() as conn:
+        current = get_current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version > current:
+                _record(conn, migration)
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Aplica, em ordem e cada uma em sua transação, as migrações pendentes."""
+    applied = []
+    with engine.connect() as conn:
+        current = get_current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+        applied.append(migration.version)
+    return applied
+
+
+def upgrade_schema(engine: Engine) -> List[int]:
+    """Cria as tabelas que faltam e leva o banco até a última versão do esquema."""
+    is_new = not inspect(engine).has_table("books")
+    Base.metadata.create_all(bind=engine)
+    if is_new:
+        stamp_latest(engine)
+        return []
+    return run_migrations(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, false, text
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -12,10 +12,33 @@ class Book(Base):
     author = Column(String(100), nullable=False)
     year = Column(Integer, nullable=False)
     category = Column(String(50), nullable=False)
+    # Há exemplar na estante; mantido junto com copies_available pelos serviços
     is_available = Column(Boolean, default=True)
+    copies_total = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    copies_available = Column(Integer, nullable=False, default=1, server_default=text("1"))
     created_at = Column(DateTime, default=datetime.now)
     
     loans = relationship("Loan", back_populates="book")
+    copies = relationship("Copy", back_populates="book")
+
+    __table_args__ = (
+        Index("ix_books_available_category", "is_available", "category"),
+        Index("ix_books_created_at", "created_at"),
+    )
+
+class Copy(Base):
+    __tablename__ = 'copies'
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    is_available = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+    book = relationship("Book", back_populates="copies")
+
+    __table_args__ = (
+        Index("ix_copies_book_available", "book_id", "is_available"),
+    )
 
 class User(Base):
     __tablename__ = 'users'
@@ -28,17 +51,88 @@ class User(Base):
     
     loans = relationship("Loan", back_populates="user")
 
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+    )
+
 class Loan(Base):
     __tablename__ = 'loans'
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    copy_id = Column(Integer, ForeignKey('copies.id'), nullable=True)
     loan_date = Column(DateTime, default=datetime.now)
+    due_date = Column(DateTime, nullable=True)
     return_date = Column(DateTime, nullable=True)
     is_returned = Column(Boolean, default=False)
+    is_overdue = Column(Boolean, nullable=False, default=False, server_default=false())
     
     user = relationship("User", back_populates="loans")
     book = relationship("Book", back_populates="loans")
+    copy = relationship("Copy")
+
+    __table_args__ = (
+        Index("ix_loans_user_returned", "user_id", "is_returned"),
+        Index("ix_loans_book_returned", "book_id", "is_returned"),
+        Index("ix_loans_user_loan_date", "user_id", "loan_date"),
+        Index("ix_loans_returned_loan_date", "is_returned", "loan_date"),
+        Index("ix_loans_loan_date", "loan_date"),
+        Index("ix_loans_returned_due_date", "is_returned", "due_date"),
+        Index("ix_loans_copy_returned", "copy_id", "is_returned"),
+    )
+
+class Hold(Base):
+    __tablename__ = 'holds'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    # Exemplar separado na prateleira de reservas quando a vez do usuário chega
+    copy_id = Column(Integer, ForeignKey('copies.id'), nullable=True)
+    status = Column(String(10), nullable=False, default="waiting")
+    created_at = Column(DateTime, default=datetime.now)
+    ready_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+    # A fila de um título é a ordem dos ids entre as reservas em espera
+    __table_args__ = (
+        Index("ix_holds_book_status", "book_id", "status", "id"),
+        Index("ix_holds_user_status", "user_id", "status"),
+        Index("ix_holds_status_expires", "status", "expires_at"),
+    )
+
+class LibraryStat(Base):
+    __tablename__ = 'library_stats'
+
+    name = Column(String(120), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, default=datetime.now)
+
+
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    operation = Column(String(10), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    changed_columns = Column(String(200), nullable=True)
+    changed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    # Ids nunca reaproveitados: depois de um purge, as posições dos consumidores continuam valendo
+    __table_args__ = {"sqlite_autoincrement": True}
 
+class ChangeOffset(Base):
+    __tablename__ = 'change_offsets'
 
+    consumer = Column(String(100), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,111 @@
+import re
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Engine
+
+
+SEARCH_TABLE = "books_fts"
+
+books_fts = table(SEARCH_TABLE, column("rowid"))
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Índice FTS5 com conteúdo externo: o texto fica só em `books`, o índice guarda os tokens.
+# `remove_diacritics 2` faz "cortico" encontrar "Cortiço".
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, author, category,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, title, author, category)
+        VALUES (new.id, new.title, new.author, new.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, author, category)
+        VALUES ('delete', old.id, old.title, old.author, old.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, category ON books BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, author, category)
+        VALUES ('delete', old.id, old.title, old.author, old.category);
+        INSERT INTO {SEARCH_TABLE}(rowid, title, author, category)
+        VALUES (new.id, new.title, new.author, new.category);
+    END
+    """,
+]
+
+# No PostgreSQL o índice GIN é sobre uma expressão, então se mantém sozinho.
+# `unaccent` não é IMMUTABLE, por isso o wrapper `f_unaccent`.
+PG_SEARCH_VECTOR = (
+    "to_tsvector('simple', f_unaccent(coalesce(books.title, '') || ' ' || coalesce(books.author, '')))"
+)
+PG_CATEGORY_VECTOR = "to_tsvector('simple', f_unaccent(coalesce(books.category, '')))"
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    AS $$ SELECT public.unaccent('public.unaccent', $1) $$
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    f"CREATE INDEX IF NOT EXISTS ix_books_search ON books USING GIN ({PG_SEARCH_VECTOR})",
+    f"CREATE INDEX IF NOT EXISTS ix_books_category_search ON books USING GIN ({PG_CATEGORY_VECTOR})",
+]
+
+
+def search_supported(engine: Engine) -> bool:
+    return engine.dialect.name in ("sqlite", "postgresql")
+
+
+def create_search_index(engine: Engine) -> None:
+    """Cria o índice de busca textual de livros (idempotente)."""
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                {"name": SEARCH_TABLE},
+            ).first()
+            for statement in _SQLITE_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Banco já populado antes do índice existir
+                conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+    elif engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for statement in _POSTGRES_DDL:
+                conn.execute(text(statement))
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def tokenize(search_term: str) -> list:
+    return _TOKEN_PATTERN.findall(search_term)
+
+
+def build_fts_query(search_term: str, column: str | None = None) -> str | None:
+    """Converte o termo digitado em uma consulta FTS5 segura (prefixo em cada palavra)."""
+    tokens = tokenize(search_term)
+    if not tokens:
+        return None
+    query = " ".join(f'"{token}"*' for token in tokens)
+    if column:
+        return f"{column} : ({query})"
+    return query
+
+
+def build_tsquery(search_term: str) -> str | None:
+    tokens = tokenize(search_term)
+    if not tokens:
+        return None
+    return " & ".join(f"{token}:*" for token in tokens)
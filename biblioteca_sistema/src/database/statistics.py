@@ -0,0 +1,99 @@
+from collections import Counter
+from importlib import import_module
+from typing import Dict, Mapping
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from .models import Book, Copy, Hold, User, Loan, LibraryStat
+
+BOOKS_TOTAL = "books_total"
+BOOKS_AVAILABLE = "books_available"
+COPIES_TOTAL = "copies_total"
+COPIES_AVAILABLE = "copies_available"
+USERS_TOTAL = "users_total"
+LOANS_TOTAL = "loans_total"
+LOANS_ACTIVE = "loans_active"
+HOLDS_WAITING = "holds_waiting"
+HOLDS_READY = "holds_ready"
+CATEGORY_PREFIX = "category:"
+
+
+def category_key(category: str) -> str:
+    return f"{CATEGORY_PREFIX}{category}"
+
+
+# Módulo do dialeto com INSERT ... ON CONFLICT; importado só quando usado
+_UPSERTS = {"sqlite": "sqlalchemy.dialects.sqlite", "postgresql": "sqlalchemy.dialects.postgresql"}
+
+
+def dialect_name(executor) -> str:
+    if isinstance(executor, Session):
+        return executor.get_bind().dialect.name
+    return executor.dialect.name
+
+
+def dialect_insert(executor):
+    """`insert` do dialeto com suporte a ON CONFLICT, ou None se o banco não tiver upsert."""
+    upsert_module = _UPSERTS.get(dialect_name(executor))
+    return import_module(upsert_module).insert if upsert_module is not None else None
+
+
+def increment(executor, deltas: Mapping[str, int]) -> None:
+    """Soma os deltas aos contadores dentro da transação corrente (sessão ou conexão)."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = [{"name": name, "value": delta} for name, delta in deltas.items()]
+    upsert = dialect_insert(executor)
+    if upsert is not None:
+        table = LibraryStat.__table__
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name], set_={"value": table.c.value + statement.excluded.value}
+        )
+        executor.execute(statement, rows)
+        return
+    for name, delta in deltas.items():
+        updated = executor.execute(
+            update(LibraryStat.__table__).where(LibraryStat.name == name).values(value=LibraryStat.value + delta)
+        ).rowcount
+        if not updated:
+            executor.execute(insert(LibraryStat.__table__).values(name=name, value=delta))
+
+
+def read_counters(executor) -> Dict[str, int]:
+    return dict(executor.execute(select(LibraryStat.name, LibraryStat.value)).all())
+
+
+def compute_counters(executor) -> Dict[str, int]:
+    """Recalcula todos os contadores a partir das tabelas de origem."""
+    counters = Counter()
+    counters[BOOKS_TOTAL] = executor.execute(select(func.count(Book.id))).scalar()
+    counters[BOOKS_AVAILABLE] = executor.execute(
+        select(func.count(Book.id)).where(Book.is_available == True)
+    ).scalar()
+    counters[COPIES_TOTAL] = executor.execute(select(func.count(Copy.id))).scalar()
+    counters[COPIES_AVAILABLE] = executor.execute(
+        select(func.count(Copy.id)).where(Copy.is_available == True)
+    ).scalar()
+    counters[USERS_TOTAL] = executor.execute(select(func.count(User.id))).scalar()
+    counters[LOANS_TOTAL] = executor.execute(select(func.count(Loan.id))).scalar()
+    counters[LOANS_ACTIVE] = executor.execute(
+        select(func.count(Loan.id)).where(Loan.is_returned == False)
+    ).scalar()
+    holds = dict(
+        executor.execute(
+            select(Hold.status, func.count(Hold.id)).where(Hold.status.in_(("waiting", "ready"))).group_by(Hold.status)
+        ).all()
+    )
+    counters[HOLDS_WAITING] = holds.get("waiting", 0)
+    counters[HOLDS_READY] = holds.get("ready", 0)
+    for category, count in executor.execute(select(Book.category, func.count(Book.id)).group_by(Book.category)):
+        counters[category_key(category)] = count
+    return dict(counters)
+
+
+def rebuild_counters(executor) -> Dict[str, int]:
+    counters = compute_counters(executor)
+    executor.execute(delete(LibraryStat.__table__))
+    executor.execute(insert(LibraryStat.__table__), [{"name": name, "value": value} for name, value in counters.items()])
+    return counters
@@ -1,67 +1,305 @@
-from typing import List, Optional
-from sqlalchemy import func
-from ..database.models import Book
-from ..database.connection import db_connection
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, literal_column, select, text, update
+from sqlalchemy.orm import Session
+from ..database.models import Book, Copy, Hold, Loan
+from ..database.connection import db_connection, retry_on_locked
+from ..database import changelog, holdings, holds, search, statistics
+from ..utils.cache import entity_cache, from_cache, to_cache
+from .pagination import keyset_page
+from .rows import BookRow, project, to_rows
+from .stats_service import StatsService
+
+
+def book_cache_key(book_id: int) -> str:
+    return f"book:{book_id}"
 
 
 class BookService:
-    def __init__(self) -> None:
-        self.session = db_connection.get_session()
+    def __init__(self, session: Optional[Session] = None) -> None:
+        # Com `session`, as operações participam da transação de quem chamou
+        self._session = session
+
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    @retry_on_locked
+    def add_book(self, title: str, author: str, year: int, category: str, copies: int = 1) -> Book:
+        """Cadastra o título com `copies` exemplares na estante."""
+        if copies < 1:
+            raise ValueError("O livro precisa de pelo menos um exemplar")
+        with self._scope() as session:
+            book = Book(
+                title=title,
+                author=author,
+                year=year,
+                category=category,
+                is_available=True,
+                copies_total=copies,
+                copies_available=copies,
+            )
+            session.add(book)
+            session.flush()
+            new_copies = [Copy(book_id=book.id) for _ in range(copies)]
+            session.add_all(new_copies)
+            session.flush()
+            changelog.record(session, "books", changelog.INSERT, [book.id])
+            changelog.record(session, "copies", changelog.INSERT, [copy.id for copy in new_copies])
+            statistics.increment(
+                session,
+                {
+                    statistics.BOOKS_TOTAL: 1,
+                    statistics.BOOKS_AVAILABLE: 1,
+                    statistics.COPIES_TOTAL: copies,
+                    statistics.COPIES_AVAILABLE: copies,
+                    statistics.category_key(category): 1,
+                },
+            )
+            return book
+
+    @retry_on_locked
+    def add_copies(self, book_id: int, count: int = 1) -> bool:
+        """Acrescenta exemplares ao título; os novos atendem primeiro a fila de reservas."""
+        if count < 1:
+            raise ValueError("Quantidade de exemplares inválida")
+        with self._scope() as session:
+            if holdings.adjust(session, book_id, total=count) is None:
+                return False
+            new_copies = [Copy(book_id=book_id, is_available=False) for _ in range(count)]
+            session.add_all(new_copies)
+            session.flush()
+            changelog.record(session, "copies", changelog.INSERT, [copy.id for copy in new_copies])
+            changelog.record(session, "books", changelog.UPDATE, [book_id], ["copies_total"])
+            statistics.increment(session, {statistics.COPIES_TOTAL: count})
+            holds.release(session, [copy.id for copy in new_copies])
+            entity_cache.invalidate_on_commit(session, book_cache_key(book_id))
+            return True
 
-    def add_book(self, title: str, author: str, year: int, category: str) -> Book:
-        book = Book(title=title, author=author, year=year, category=category)
-        self.session.add(book)
-        self.session.commit()
-        self.session.refresh(book)
-        return book
+    @retry_on_locked
+    def remove_copy(self, copy_id: int) -> bool:
+        """Dá baixa num exemplar que está na estante (perdido, danificado); emprestados não saem."""
+        with self._scope() as session:
+            copy = session.get(Copy, copy_id)
+            if copy is None:
+                return False
+            if not copy.is_available:
+                raise ValueError("Exemplar fora da estante (emprestado ou separado para reserva)")
+            # O histórico continua ligado ao título, só perde a referência ao exemplar
+            loan_ids = list(session.scalars(select(Loan.id).where(Loan.copy_id == copy_id).order_by(Loan.id)))
+            session.execute(
+                update(Loan).where(Loan.copy_id == copy_id).values(copy_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            book_id = copy.book_id
+            session.delete(copy)
+            session.flush()
+            available = holdings.adjust(session, book_id, total=-1, available=-1)
+            entity_cache.invalidate_on_commit(session, book_cache_key(book_id))
+            changelog.record(session, "loans", changelog.UPDATE, loan_ids, ["copy_id"])
+            changelog.record(session, "copies", changelog.DELETE, [copy_id])
+            changelog.record(session, "books", changelog.UPDATE, [book_id], ["copies_total", "copies_available"])
+            statistics.increment(
+                session,
+                {
+                    statistics.BOOKS_AVAILABLE: holdings.availability_change(available, -1),
+                    statistics.COPIES_TOTAL: -1,
+                    statistics.COPIES_AVAILABLE: -1,
+                },
+            )
+            return True
+
+    def get_copy_counts(self, book_id: int) -> Optional[Dict[str, int]]:
+        """Exemplares do título: lidos do próprio livro (busca pela chave), sem contar a tabela de exemplares.
+
+        Vão direto ao banco, sem o cache de entidades: a contagem da estante tem de ser a atual.
+        """
+        with self._scope() as session:
+            counts = session.execute(
+                select(Book.copies_total, Book.copies_available).where(Book.id == book_id)
+            ).first()
+        if counts is None:
+            return None
+        total, available = counts
+        return {"total": total, "available": available, "on_loan": total - available}
 
-    def get_all_books(self) -> List[Book]:
-        return self.session.query(Book).all()
+    def get_all_books(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Book]:
+        with self._scope() as session:
+            return keyset_page(session.query(Book), Book.id, after_id, limit)
+
+    def get_book_listing(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[BookRow]:
+        """Como `get_all_books`, mas em linhas de listagem (só as colunas, sem entidades na sessão)."""
+        with self._scope() as session:
+            return to_rows(keyset_page(project(session.query(Book), BookRow, Book), Book.id, after_id, limit), BookRow)
 
     def get_book_by_id(self, book_id: int) -> Optional[Book]:
-        return self.session.query(Book).filter(Book.id == book_id).first()
+        data = entity_cache.get_or_load(book_cache_key(book_id), lambda: self._load(book_id))
+        return from_cache(Book, data)
+
+    def _load(self, book_id: int) -> Optional[dict]:
+        with self._scope() as session:
+            book = session.get(Book, book_id)
+            return to_cache(book) if book else None
+
+    def get_available_books(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Book]:
+        with self._scope() as session:
+            return keyset_page(session.query(Book).filter(Book.is_available == True), Book.id, after_id, limit)
 
-    def get_available_books(self) -> List[Book]:
-        return self.session.query(Book).filter(Book.is_available == True).all()
+    def get_books_by_category(
+        self, category: str, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Book]:
+        with self._scope() as session:
+            dialect = session.get_bind().dialect.name
+            if dialect == "sqlite":
+                fts_query = search.build_fts_query(category, column="category")
+                if fts_query is None:
+                    return []
+                query = self._fts_match(session, fts_query)
+            elif dialect == "postgresql":
+                ts_query = search.build_tsquery(category)
+                if ts_query is None:
+                    return []
+                query = self._ts_match(session, search.PG_CATEGORY_VECTOR, ts_query)
+            else:
+                query = session.query(Book).filter(Book.category.ilike(f"%{category}%"))
+            return keyset_page(query, Book.id, after_id, limit)
 
-    def get_books_by_category(self, category: str) -> List[Book]:
-        return self.session.query(Book).filter(Book.category.ilike(f"%{category}%")).all()
+    def search_books(self, search_term: str, limit: Optional[int] = None) -> List[Book]:
+        """Busca por título ou autor, ordenada por relevância e sem diferenciar acentos."""
+        with self._scope() as session:
+            query = self._search_query(session, search_term)
+            return query.limit(limit).all() if query is not None else []
 
-    def search_books(self, search_term: str) -> List[Book]:
-        return self.session.query(Book).filter(
+    def search_book_listing(self, search_term: str, limit: Optional[int] = None) -> List[BookRow]:
+        """Como `search_books`, mas em linhas de listagem (só as colunas, sem entidades na sessão)."""
+        with self._scope() as session:
+            query = self._search_query(session, search_term)
+            return to_rows(project(query, BookRow, Book).limit(limit), BookRow) if query is not None else []
+
+    def _search_query(self, session: Session, search_term: str):
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            fts_query = search.build_fts_query(search_term)
+            if fts_query is None:
+                return None
+            fts_query = f"{{title author}} : ({fts_query})"
+            return self._fts_match(session, fts_query).order_by(func.bm25(literal_column(search.SEARCH_TABLE)), Book.id)
+        if dialect == "postgresql":
+            ts_query = search.build_tsquery(search_term)
+            if ts_query is None:
+                return None
+            vector = search.PG_SEARCH_VECTOR
+            return self._ts_match(session, vector, ts_query).order_by(
+                text(f"ts_rank({vector}, to_tsquery('simple', f_unaccent(:ts_query))) DESC"), Book.id
+            )
+        return session.query(Book).filter(
             (Book.title.ilike(f"%{search_term}%")) | (Book.author.ilike(f"%{search_term}%"))
-        ).all()
+        ).order_by(Book.id)
+
+    def _fts_match(self, session: Session, fts_query: str):
+        return (
+            session.query(Book)
+            .join(search.books_fts, search.books_fts.c.rowid == Book.id)
+            .filter(text(f"{search.SEARCH_TABLE} MATCH :fts_query"))
+            .params(fts_query=fts_query)
+        )
 
+    def _ts_match(self, session: Session, vector: str, ts_query: str):
+        return (
+            session.query(Book)
+            .filter(text(f"{vector} @@ to_tsquery('simple', f_unaccent(:ts_query))"))
+            .params(ts_query=ts_query)
+        )
+
+    @retry_on_locked
     def update_book_availability(self, book_id: int, is_available: bool) -> bool:
-        book = self.get_book_by_id(book_id)
-        if book:
-            book.is_available = is_available
-            self.session.commit()
-            return True
-        return False
+        with self._scope() as session:
+            book = session.get(Book, book_id)
+            if book:
+                if is_available:
+                    # Volta a circular o que não está emprestado nem separado, atendendo antes a fila
+                    on_loan = select(Loan.copy_id).where(
+                        Loan.book_id == book_id, Loan.is_returned == False, Loan.copy_id.is_not(None)
+                    )
+                    held = select(Hold.copy_id).where(
+                        Hold.book_id == book_id, Hold.status == holds.READY, Hold.copy_id.is_not(None)
+                    )
+                    idle = session.scalars(
+                        select(Copy.id).where(
+                            Copy.book_id == book_id,
+                            Copy.is_available == False,
+                            Copy.id.not_in(on_loan),
+                            Copy.id.not_in(held),
+                        )
+                    ).all()
+                    holds.release(session, idle)
+                else:
+                    # Indisponível tira da estante todos os exemplares que estão nela
+                    before = book.copies_available
+                    session.execute(
+                        update(Copy).where(Copy.book_id == book_id).values(is_available=False)
+                        .execution_options(synchronize_session=False)
+                    )
+                    available = holdings.recount(session, book_id)
+                    if available != before:
+                        statistics.increment(
+                            session,
+                            {
+                                statistics.BOOKS_AVAILABLE: holdings.availability_change(
+                                    available, available - before
+                                ),
+                                statistics.COPIES_AVAILABLE: available - before,
+                            },
+                        )
+                        changelog.record(session, "books", changelog.UPDATE, [book_id], holdings.HOLDINGS_COLUMNS)
+                session.expire(book)
+                entity_cache.invalidate_on_commit(session, book_cache_key(book_id))
+                return True
+            return False
 
+    @retry_on_locked
     def delete_book(self, book_id: int) -> bool:
-        book = self.get_book_by_id(book_id)
-        if book:
-            self.session.delete(book)
-            self.session.commit()
-            return True
-        return False
+        with self._scope() as session:
+            book = session.get(Book, book_id)
+            if book:
+                # As reservas do título saem junto com os exemplares que estavam separados para elas
+                pending = dict(
+                    session.execute(
+                        select(Hold.status, func.count(Hold.id))
+                        .where(Hold.book_id == book_id, Hold.status.in_(holds.ACTIVE))
+                        .group_by(Hold.status)
+                    ).all()
+                )
+                # Os ids saem antes das exclusões em massa, para irem ao log na mesma transação
+                hold_ids = list(session.scalars(select(Hold.id).where(Hold.book_id == book_id).order_by(Hold.id)))
+                copy_ids = list(session.scalars(select(Copy.id).where(Copy.book_id == book_id).order_by(Copy.id)))
+                session.execute(
+                    delete(Hold).where(Hold.book_id == book_id).execution_options(synchronize_session=False)
+                )
+                session.execute(
+                    delete(Copy).where(Copy.book_id == book_id).execution_options(synchronize_session=False)
+                )
+                session.delete(book)
+                session.flush()
+                changelog.record(session, "holds", changelog.DELETE, hold_ids)
+                changelog.record(session, "copies", changelog.DELETE, copy_ids)
+                changelog.record(session, "books", changelog.DELETE, [book_id])
+                entity_cache.invalidate_on_commit(session, book_cache_key(book_id))
+                statistics.increment(
+                    session,
+                    {
+                        statistics.BOOKS_TOTAL: -1,
+                        statistics.BOOKS_AVAILABLE: -1 if book.is_available else 0,
+                        statistics.COPIES_TOTAL: -book.copies_total,
+                        statistics.COPIES_AVAILABLE: -book.copies_available,
+                        statistics.HOLDS_WAITING: -pending.get(holds.WAITING, 0),
+                        statistics.HOLDS_READY: -pending.get(holds.READY, 0),
+                        statistics.category_key(book.category): -1,
+                    },
+                )
+                return True
+            return False
 
     def get_books_count_by_status(self) -> dict:
-        total = self.session.query(Book).count()
-        available = self.session.query(Book).filter(Book.is_available == True).count()
-        borrowed = total - available
-        return {"total": total, "available": available, "borrowed": borrowed}
+        return StatsService(self._session).get_summary()["books"]
 
     def get_books_count_by_category(self) -> dict:
-        result = (
-            self.session.query(Book.category, func.count(Book.id).label("count")).group_by(Book.category).all()
-        )
-        return {category: count for category, count in result}
-
-    def __del__(self) -> None:
-        if hasattr(self, "session"):
-            self.session.close()
-
-
+        return StatsService(self._session).get_books_count_by_category()
@@ -0,0 +1,72 @@
+from typing import Iterator, List, Optional, Sequence
+from sqlalchemy.orm import Session
+from ..database.models import ChangeLog
+from ..database.connection import db_connection, retry_on_locked
+from ..database import changelog
+
+CHANGE_BATCH_SIZE = 500
+
+
+class ChangeFeedService:
+    """Leitura do log de alterações gravado pelos serviços de livros, usuários e empréstimos.
+
+    Cada consumidor (exportação, cache, índice de busca, réplica) guarda a própria posição e
+    retoma dali. A entrega é pelo menos uma vez: a posição só avança depois que o lote inteiro
+    foi entregue, então um consumidor interrompido pode rever as últimas entradas.
+    A ordem é a dos ids: no SQLite as escritas são serializadas e ela coincide com a dos commits.
+    """
+
+    def __init__(self, session: Optional[Session] = None) -> None:
+        # Com `session`, as operações participam da transação de quem chamou
+        self._session = session
+
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    def get_changes(
+        self, after_id: int = 0, limit: int = CHANGE_BATCH_SIZE, tables: Optional[Sequence[str]] = None
+    ) -> List[ChangeLog]:
+        with self._scope() as session:
+            return changelog.read_changes(session, after_id, limit, tables)
+
+    def follow(
+        self,
+        consumer: str,
+        tables: Optional[Sequence[str]] = None,
+        batch_size: int = CHANGE_BATCH_SIZE,
+        limit: Optional[int] = None,
+    ) -> Iterator[ChangeLog]:
+        """Percorre as entradas ainda não vistas por `consumer`, gravando a posição a cada lote.
+
+        Termina quando alcança o fim do log (ou depois de `limit` entradas); chamar de novo
+        continua de onde parou.
+        """
+        position = self.get_offset(consumer)
+        delivered = 0
+        while limit is None or delivered < limit:
+            size = batch_size if limit is None else min(batch_size, limit - delivered)
+            batch = self.get_changes(position, size, tables)
+            if not batch:
+                return
+            yield from batch
+            delivered += len(batch)
+            position = batch[-1].id
+            self.set_offset(consumer, position)
+            if len(batch) < size:
+                return
+
+    def get_offset(self, consumer: str) -> int:
+        with self._scope() as session:
+            return changelog.get_offset(session, consumer)
+
+    @retry_on_locked
+    def set_offset(self, consumer: str, position: int) -> None:
+        """Move a posição de `consumer`; 0 faz o consumidor reler o log desde o início."""
+        with self._scope() as session:
+            changelog.save_offset(session, consumer, position)
+
+    @retry_on_locked
+    def purge_consumed(self) -> int:
+        """Apaga as entradas que todos os consumidores registrados já processaram."""
+        with self._scope() as session:
+            return changelog.purge_consumed(session)
@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from ..database.models import Book, Hold, User
+from ..database.connection import db_connection, retry_on_locked
+from ..database import changelog, holds, statistics
+from ..utils.cache import entity_cache
+from .book_service import book_cache_key
+from .pagination import keyset_page
+
+EXPIRY_BATCH_SIZE = 500
+
+
+class HoldService:
+    """Fila de reservas por título.
+
+    Quem reserva entra no fim da fila do livro. Cada exemplar que volta (devolução, reserva vencida
+    ou cancelada, exemplar novo) é separado para o primeiro da fila na mesma transação, e fica na
+    prateleira de reservas por `holds.HOLD_SHELF_DAYS` dias; o empréstimo do titular conclui a reserva.
+    """
+
+    def __init__(self, session: Optional[Session] = None) -> None:
+        # Com `session`, as operações participam da transação de quem chamou
+        self._session = session
+
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    @retry_on_locked
+    def place_hold(self, user_id: int, book_id: int) -> Hold:
+        with self._scope() as session:
+            if session.get(User, user_id) is None:
+                raise ValueError("Usuário não encontrado")
+            book = session.get(Book, book_id)
+            if book is None:
+                raise ValueError("Livro não encontrado")
+            if book.copies_available > 0:
+                raise ValueError("Há exemplar na estante; faça o empréstimo")
+            duplicate = session.execute(
+                select(Hold.id).where(
+                    Hold.user_id == user_id, Hold.status.in_(holds.ACTIVE), Hold.book_id == book_id
+                )
+            ).first()
+            if duplicate is not None:
+                raise ValueError("Usuário já tem reserva ativa para este livro")
+            hold = Hold(user_id=user_id, book_id=book_id, status=holds.WAITING, created_at=datetime.now())
+            session.add(hold)
+            session.flush()
+            changelog.record(session, "holds", changelog.INSERT, [hold.id])
+            statistics.increment(session, {statistics.HOLDS_WAITING: 1})
+            return hold
+
+    @retry_on_locked
+    def cancel_hold(self, hold_id: int) -> bool:
+        """Cancela uma reserva ativa; o exemplar já separado passa ao próximo da fila."""
+        with self._scope() as session:
+            hold = session.get(Hold, hold_id)
+            if hold is None or hold.status not in holds.ACTIVE:
+                return False
+            status = hold.status
+            cancelled = session.execute(
+                update(Hold)
+                .where(Hold.id == hold_id, Hold.status == status)
+                .values(status=holds.CANCELLED)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not cancelled:
+                return False
+            changelog.record(session, "holds", changelog.UPDATE, [hold_id], ["status"])
+            if status == holds.WAITING:
+                statistics.increment(session, {statistics.HOLDS_WAITING: -1})
+            else:
+                statistics.increment(session, {statistics.HOLDS_READY: -1})
+                self._release(session, [hold.copy_id])
+            return True
+
+    def cancel_user_holds(self, user_id: int) -> int:
+        """Cancela todas as reservas ativas do usuário; devolve quantas foram canceladas."""
+        with self._scope() as session:
+            hold_ids = session.scalars(
+                select(Hold.id).where(Hold.user_id == user_id, Hold.status.in_(holds.ACTIVE))
+            ).all()
+            return sum(HoldService(session).cancel_hold(hold_id) for hold_id in hold_ids)
+
+    def expire_holds(self, as_of: Optional[datetime] = None, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+        """Vence as reservas prontas não retiradas até `as_of` e passa os exemplares adiante.
+
+        Trabalha em lotes de `batch_size`, cada um em sua transação: um UPDATE para os vencimentos
+        e a redistribuição dos exemplares do lote, sem segurar o banco durante a varredura inteira.
+        """
+        started = datetime.now()
+        as_of = as_of or started
+        total = 0
+        while True:
+            expired = self._expire_batch(as_of, batch_size, started)
+            total += expired
+            if expired < batch_size:
+                return total
+
+    @retry_on_locked
+    def _expire_batch(self, as_of: datetime, batch_size: int, started: datetime) -> int:
+        with self._scope() as session:
+            expired = holds.expire_ready(session, as_of, batch_size, started)
+            if not expired:
+                return 0
+            changelog.record(session, "holds", changelog.UPDATE, sorted(hold_id for hold_id, _ in expired), ["status"])
+            statistics.increment(session, {statistics.HOLDS_READY: -len(expired)})
+            self._release(session, [copy_id for _, copy_id in expired])
+            return len(expired)
+
+    def _release(self, session: Session, copy_ids: List[Optional[int]]) -> None:
+        shelved = holds.release(session, copy_ids)
+        entity_cache.invalidate_on_commit(session, *map(book_cache_key, shelved))
+
+    def get_hold(self, hold_id: int) -> Optional[Hold]:
+        with self._scope() as session:
+            return session.get(Hold, hold_id)
+
+    def get_queue_position(self, hold_id: int) -> Optional[int]:
+        """Posição da reserva na fila do título, ou None se ela não está mais esperando."""
+        with self._scope() as session:
+            hold = session.get(Hold, hold_id)
+            return holds.queue_position(session, hold) if hold is not None else None
+
+    def get_queue(self, book_id: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Hold]:
+        """Reservas em espera do título, na ordem em que serão atendidas."""
+        with self._scope() as session:
+            query = session.query(Hold).filter(Hold.book_id == book_id, Hold.status == holds.WAITING)
+            return keyset_page(query, Hold.id, after_id, limit)
+
+    def get_queue_length(self, book_id: int) -> int:
+        with self._scope() as session:
+            return session.execute(
+                select(func.count(Hold.id)).where(Hold.book_id == book_id, Hold.status == holds.WAITING)
+            ).scalar()
+
+    def get_user_holds(self, user_id: int) -> List[Hold]:
+        """Reservas ativas do usuário: as prontas para retirada primeiro, depois as em espera."""
+        with self._scope() as session:
+            return (
+                session.query(Hold)
+                .filter(Hold.user_id == user_id, Hold.status.in_(holds.ACTIVE))
+                .order_by(Hold.status, Hold.id)
+                .all()
+            )
+
+    def get_ready_holds(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Hold]:
+        """Prateleira de reservas: exemplares separados aguardando retirada."""
+        with self._scope() as session:
+            return keyset_page(session.query(Hold).filter(Hold.status == holds.READY), Hold.id, after_id, limit)
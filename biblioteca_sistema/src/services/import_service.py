@@ -0,0 +1,170 @@
+import csv
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+from sqlalchemy import insert, select
+from ..database.models import Book, Copy, User
+from ..database.connection import db_connection
+from ..database import changelog, statistics
+from ..utils.validators import is_valid_email
+
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def read_records(path: str) -> Iterator[Tuple[int, dict]]:
+    """Lê um arquivo CSV (com cabeçalho) ou JSONL linha a linha, sem carregá-lo inteiro."""
+    suffix = Path(path).suffix.lower()
+    with open(path, newline="", encoding="utf-8") as handle:
+        if suffix == ".csv":
+            for line, record in enumerate(csv.DictReader(handle), start=2):
+                yield line, record
+        elif suffix in (".jsonl", ".ndjson"):
+            for line, raw in enumerate(handle, start=1):
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError as e:
+                    yield line, {"__error__": f"JSON inválido: {e.msg}"}
+                    continue
+                yield line, record if isinstance(record, dict) else {"__error__": "Registro não é um objeto"}
+        else:
+            raise ValueError("Formato não suportado (use .csv ou .jsonl)")
+
+
+def _text(record: dict, name: str) -> str:
+    value = record.get(name)
+    return str(value).strip() if value is not None else ""
+
+
+class ImportService:
+    BATCH_SIZE = 5000
+
+    def __init__(self, batch_size: Optional[int] = None) -> None:
+        self.batch_size = batch_size or self.BATCH_SIZE
+
+    def import_books(self, path: str, on_batch: Optional[Callable[[ImportResult], None]] = None) -> ImportResult:
+        return self._import(path, self._parse_book, self._insert_books, on_batch)
+
+    def import_users(self, path: str, on_batch: Optional[Callable[[ImportResult], None]] = None) -> ImportResult:
+        return self._import(path, self._parse_user, self._insert_users, on_batch)
+
+    def _import(self, path: str, parse, insert_batch, on_batch) -> ImportResult:
+        result = ImportResult()
+        start = time.perf_counter()
+        batch: List[Tuple[int, dict]] = []
+        for line, record in read_records(path):
+            try:
+                if "__error__" in record:
+                    raise ValueError(record["__error__"])
+                batch.append((line, parse(record)))
+            except ValueError as e:
+                result.reject(line, str(e))
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch, insert_batch, result, start, on_batch)
+                batch = []
+        if batch:
+            self._flush(batch, insert_batch, result, start, on_batch)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _flush(self, batch, insert_batch, result: ImportResult, start: float, on_batch) -> None:
+        # Uma transação por lote: um erro derruba só o lote atual
+        with db_connection.session_scope() as session:
+            insert_batch(session, batch, result)
+        result.elapsed = time.perf_counter() - start
+        if on_batch:
+            on_batch(result)
+
+    def _parse_book(self, record: dict) -> dict:
+        title = _text(record, "title")
+        author = _text(record, "author")
+        category = _text(record, "category")
+        if not title or not author or not category:
+            raise ValueError("Título, autor e categoria são obrigatórios")
+        try:
+            year = int(_text(record, "year"))
+        except ValueError:
+            raise ValueError("Ano inválido")
+        try:
+            copies = int(_text(record, "copies") or 1)
+        except ValueError:
+            raise ValueError("Quantidade de exemplares inválida")
+        if copies < 1:
+            raise ValueError("O livro precisa de pelo menos um exemplar")
+        return {
+            "title": title,
+            "author": author,
+            "year": year,
+            "category": category,
+            "is_available": True,
+            "copies_total": copies,
+            "copies_available": copies,
+        }
+
+    def _parse_user(self, record: dict) -> dict:
+        name = _text(record, "name")
+        email = _text(record, "email")
+        phone = _text(record, "phone")
+        if not name or not phone:
+            raise ValueError("Nome e telefone são obrigatórios")
+        if not is_valid_email(email):
+            raise ValueError(f"Email inválido: {email}")
+        return {"name": name, "email": email, "phone": phone}
+
+    def _insert_books(self, session, batch, result: ImportResult) -> None:
+        rows = [row for _, row in batch]
+        book_ids = self._insert_returning_ids(session, Book, rows)
+        copy_rows = [{"book_id": book_id} for book_id, row in zip(book_ids, rows) for _ in range(row["copies_total"])]
+        changelog.record(session, "books", changelog.INSERT, book_ids)
+        changelog.record(session, "copies", changelog.INSERT, self._insert_returning_ids(session, Copy, copy_rows))
+        deltas = Counter(statistics.category_key(row["category"]) for row in rows)
+        deltas[statistics.BOOKS_TOTAL] = len(rows)
+        deltas[statistics.BOOKS_AVAILABLE] = len(rows)
+        deltas[statistics.COPIES_TOTAL] = len(copy_rows)
+        deltas[statistics.COPIES_AVAILABLE] = len(copy_rows)
+        statistics.increment(session, deltas)
+        result.inserted += len(rows)
+
+    def _insert_returning_ids(self, session, model, rows: List[dict]) -> List[int]:
+        """Insere o lote e devolve os ids gerados, para o log de alterações."""
+        if session.get_bind().dialect.insert_executemany_returning:
+            return list(session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+        return [session.execute(insert(model).values(**row)).inserted_primary_key[0] for row in rows]
+
+    def _insert_users(self, session, batch, result: ImportResult) -> None:
+        emails = [row["email"] for _, row in batch]
+        existing = set(session.scalars(select(User.email).where(User.email.in_(emails))))
+        rows = []
+        for line, row in batch:
+            if row["email"] in existing:
+                result.reject(line, f"Email já cadastrado no sistema: {row['email']}")
+                continue
+            existing.add(row["email"])
+            rows.append(row)
+        if rows:
+            changelog.record(session, "users", changelog.INSERT, self._insert_returning_ids(session, User, rows))
+            statistics.increment(session, {statistics.USERS_TOTAL: len(rows)})
+        result.inserted += len(rows)
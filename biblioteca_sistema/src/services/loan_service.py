@@ -1,70 +1,363 @@
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 from datetime import datetime, timedelta
-from sqlalchemy import and_
+from sqlalchemy import and_, select, tuple_, update
+from sqlalchemy.orm import Session
 from ..database.models import Loan, Book, User
-from ..database.connection import db_connection
+from ..database.connection import db_connection, retry_on_locked
+from ..database import changelog, holdings, holds, statistics
+from ..utils.cache import entity_cache, to_cache
+from .book_service import book_cache_key
+from .pagination import keyset_page
+from .rows import LoanRow, to_rows
+from .user_service import user_cache_key
+
+DEFAULT_LOAN_DAYS = 14
+OVERDUE_BATCH_SIZE = 500
+RETURN_COLUMNS = ["is_returned", "return_date"]
+
+
+@dataclass
+class LoanOutcome:
+    """Resultado de um item de uma operação em lote (livro no empréstimo, empréstimo na devolução)."""
+
+    item_id: int
+    success: bool
+    message: str = ""
+    loan_id: Optional[int] = None
+
+
+def _unique(ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
 
 
 class LoanService:
-    def __init__(self) -> None:
-        self.session = db_connection.get_session()
-
-    def create_loan(self, user_id: int, book_id: int, days: int = 14) -> Loan:
-        user: Optional[User] = self.session.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise ValueError("Usuário não encontrado")
-        book: Optional[Book] = self.session.query(Book).filter(Book.id == book_id).first()
-        if not book:
-            raise ValueError("Livro não encontrado")
-        if not book.is_available:
-            raise ValueError("Livro não está disponível")
-        loan = Loan(
-            user_id=user_id,
-            book_id=book_id,
-            loan_date=datetime.now(),
-            is_returned=False,
-        )
-        book.is_available = False
-        self.session.add(loan)
-        self.session.commit()
-        self.session.refresh(loan)
-        return loan
+    def __init__(self, session: Optional[Session] = None) -> None:
+        # Com `session`, as operações participam da transação de quem chamou
+        self._session = session
 
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    @retry_on_locked
+    def create_loan(self, user_id: int, book_id: int, days: int = DEFAULT_LOAN_DAYS) -> Loan:
+        with self._scope() as session:
+            if not self._user_exists(session, user_id):
+                raise ValueError("Usuário não encontrado")
+            # O exemplar separado para a reserva do usuário já está fora da estante
+            copy_id = holds.claim_ready(session, user_id, [book_id]).get(book_id)
+            if copy_id is None:
+                # Reserva um exemplar num único UPDATE condicional na linha do título: se duas mesas
+                # disputarem o último exemplar ao mesmo tempo, só uma delas consegue decrementar.
+                available = holdings.adjust(session, book_id, available=-1)
+                if available is None:
+                    if session.get(Book, book_id) is None:
+                        raise ValueError("Livro não encontrado")
+                    raise ValueError("Livro não está disponível")
+                copy_id = holdings.take_copies(session, [book_id]).get(book_id)
+                entity_cache.invalidate_on_commit(session, book_cache_key(book_id))
+                changelog.record(session, "books", changelog.UPDATE, [book_id], holdings.HOLDINGS_COLUMNS)
+                changelog.record(session, "copies", changelog.UPDATE, [copy_id], ["is_available"])
+                statistics.increment(
+                    session,
+                    {
+                        statistics.BOOKS_AVAILABLE: holdings.availability_change(available, -1),
+                        statistics.COPIES_AVAILABLE: -1,
+                    },
+                )
+            now = datetime.now()
+            loan = Loan(
+                user_id=user_id,
+                book_id=book_id,
+                copy_id=copy_id,
+                loan_date=now,
+                due_date=now + timedelta(days=days),
+                is_returned=False,
+            )
+            session.add(loan)
+            session.flush()
+            changelog.record(session, "loans", changelog.INSERT, [loan.id])
+            statistics.increment(session, {statistics.LOANS_TOTAL: 1, statistics.LOANS_ACTIVE: 1})
+            return loan
+
+    @retry_on_locked
     def return_loan(self, loan_id: int) -> bool:
-        loan: Optional[Loan] = self.session.query(Loan).filter(Loan.id == loan_id).first()
-        if not loan or loan.is_returned:
-            return False
-        loan.is_returned = True
-        loan.return_date = datetime.now()
-        book: Optional[Book] = self.session.query(Book).filter(Book.id == loan.book_id).first()
-        if book:
-            book.is_available = True
-        self.session.commit()
-        return True
+        with self._scope() as session:
+            loan: Optional[Loan] = session.get(Loan, loan_id)
+            if not loan:
+                return False
+            returned = session.execute(
+                update(Loan)
+                .where(Loan.id == loan_id, Loan.is_returned == False)
+                .values(is_returned=True, return_date=datetime.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not returned:
+                return False
+            changelog.record(session, "loans", changelog.UPDATE, [loan_id], RETURN_COLUMNS)
+            self._shelve_copies(session, [loan.copy_id])
+            statistics.increment(session, {statistics.LOANS_ACTIVE: -1})
+            return True
+
+    @retry_on_locked
+    def create_loans(self, user_id: int, book_ids: List[int], days: int = DEFAULT_LOAN_DAYS) -> List[LoanOutcome]:
+        """Empresta vários livros ao mesmo usuário numa única transação."""
+        with self._scope() as session:
+            if not self._user_exists(session, user_id):
+                raise ValueError("Usuário não encontrado")
+            unique_ids = _unique(book_ids)
+            existing = set(session.scalars(select(Book.id).where(Book.id.in_(unique_ids))))
+            reserved = holds.claim_ready(session, user_id, [book_id for book_id in unique_ids if book_id in existing])
+            claimed = self._claim_books(
+                session, [book_id for book_id in unique_ids if book_id in existing and book_id not in reserved]
+            )
+            copies = holdings.take_copies(session, claimed)
+            entity_cache.invalidate_on_commit(session, *map(book_cache_key, claimed))
+            changelog.record(session, "books", changelog.UPDATE, sorted(claimed), holdings.HOLDINGS_COLUMNS)
+            changelog.record(session, "copies", changelog.UPDATE, sorted(copies.values()), ["is_available"])
+            copies.update(reserved)
+            now = datetime.now()
+            due_date = now + timedelta(days=days)
+            loans = {
+                book_id: Loan(
+                    user_id=user_id,
+                    book_id=book_id,
+                    copy_id=copies.get(book_id),
+                    loan_date=now,
+                    due_date=due_date,
+                    is_returned=False,
+                )
+                for book_id in unique_ids
+                if book_id in copies
+            }
+            session.add_all(loans.values())
+            session.flush()
+            changelog.record(session, "loans", changelog.INSERT, [loan.id for loan in loans.values()])
+            statistics.increment(
+                session,
+                {
+                    statistics.BOOKS_AVAILABLE: sum(
+                        holdings.availability_change(available, -1) for available in claimed.values()
+                    ),
+                    statistics.COPIES_AVAILABLE: -len(claimed),
+                    statistics.LOANS_TOTAL: len(loans),
+                    statistics.LOANS_ACTIVE: len(loans),
+                },
+            )
+
+            outcomes = []
+            for book_id in unique_ids:
+                if book_id in loans:
+                    outcomes.append(LoanOutcome(book_id, True, "Empréstimo criado", loans[book_id].id))
+                elif book_id not in existing:
+                    outcomes.append(LoanOutcome(book_id, False, "Livro não encontrado"))
+                else:
+                    outcomes.append(LoanOutcome(book_id, False, "Livro não está disponível"))
+            return outcomes
+
+    @retry_on_locked
+    def return_loans(self, loan_ids: List[int]) -> List[LoanOutcome]:
+        """Devolve vários empréstimos numa única transação."""
+        with self._scope() as session:
+            unique_ids = _unique(loan_ids)
+            open_loans = dict(
+                session.execute(
+                    select(Loan.id, Loan.copy_id).where(Loan.id.in_(unique_ids), Loan.is_returned == False)
+                ).all()
+            )
+            returned = self._close_loans(session, list(open_loans))
+            changelog.record(session, "loans", changelog.UPDATE, sorted(returned), RETURN_COLUMNS)
+            self._shelve_copies(session, [open_loans[loan_id] for loan_id in returned])
+            statistics.increment(session, {statistics.LOANS_ACTIVE: -len(returned)})
+            known = set(session.scalars(select(Loan.id).where(Loan.id.in_(unique_ids))))
+
+            outcomes = []
+            for loan_id in unique_ids:
+                if loan_id in returned:
+                    outcomes.append(LoanOutcome(loan_id, True, "Empréstimo devolvido", loan_id))
+                elif loan_id not in known:
+                    outcomes.append(LoanOutcome(loan_id, False, "Empréstimo não encontrado"))
+                else:
+                    outcomes.append(LoanOutcome(loan_id, False, "Empréstimo já devolvido"))
+            return outcomes
 
+    def _user_exists(self, session: Session, user_id: int) -> bool:
+        def load() -> Optional[dict]:
+            user = session.get(User, user_id)
+            return to_cache(user) if user else None
+
+        return entity_cache.get_or_load(user_cache_key(user_id), load) is not None
+
+    def _claim_books(self, session: Session, book_ids: List[int]) -> Dict[int, int]:
+        """Reserva um exemplar de cada título com algum na estante; devolve {book_id: disponíveis depois}."""
+        if not book_ids:
+            return {}
+        if session.get_bind().dialect.update_returning:
+            statement = (
+                update(Book)
+                .where(Book.id.in_(book_ids), Book.copies_available > 0)
+                .values(copies_available=Book.copies_available - 1, is_available=Book.copies_available > 1)
+                .execution_options(synchronize_session=False)
+            )
+            return dict(session.execute(statement.returning(Book.id, Book.copies_available)).all())
+        claimed = {}
+        for book_id in book_ids:
+            available = holdings.adjust(session, book_id, available=-1)
+            if available is not None:
+                claimed[book_id] = available
+        return claimed
+
+    def _shelve_copies(self, session: Session, copy_ids: List[Optional[int]]) -> None:
+        """Passa os exemplares devolvidos ao próximo da fila de reservas ou, sem fila, à estante."""
+        shelved = holds.release(session, copy_ids)
+        entity_cache.invalidate_on_commit(session, *map(book_cache_key, shelved))
+
+    def _close_loans(self, session: Session, loan_ids: List[int]) -> Set[int]:
+        if not loan_ids:
+            return set()
+        statement = (
+            update(Loan)
+            .where(Loan.id.in_(loan_ids), Loan.is_returned == False)
+            .values(is_returned=True, return_date=datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        if session.get_bind().dialect.update_returning:
+            return set(session.scalars(statement.returning(Loan.id)))
+        closed = set()
+        for loan_id in loan_ids:
+            if session.execute(statement.where(Loan.id == loan_id)).rowcount:
+                closed.add(loan_id)
+        return closed
+
+    @retry_on_locked
     def renew_loan(self, loan_id: int, extra_days: int = 7) -> bool:
-        loan: Optional[Loan] = self.session.query(Loan).filter(Loan.id == loan_id).first()
-        if not loan or loan.is_returned:
-            return False
-        # Simplesmente ajusta a loan_date para refletir renovação (sem due_date explícito)
-        loan.loan_date = loan.loan_date + timedelta(days=extra_days)
-        self.session.commit()
-        return True
+        with self._scope() as session:
+            loan: Optional[Loan] = session.get(Loan, loan_id)
+            if not loan or loan.is_returned:
+                return False
+            # O prazo corre a partir do vencimento atual; a data do empréstimo fica intacta
+            loan.due_date = loan.due_date + timedelta(days=extra_days)
+            loan.is_overdue = loan.due_date < datetime.now()
+            session.flush()
+            changelog.record(session, "loans", changelog.UPDATE, [loan_id], ["due_date", "is_overdue"])
+            return True
+
+    def get_overdue_loans(
+        self, as_of: Optional[datetime] = None, batch_size: int = OVERDUE_BATCH_SIZE
+    ) -> Iterator[Loan]:
+        """Percorre os empréstimos ativos vencidos em `as_of`, do vencimento mais antigo ao mais recente.
 
-    def get_active_loans_by_user(self, user_id: int) -> List[Loan]:
-        return self.session.query(Loan).filter(Loan.user_id == user_id, Loan.is_returned == False).all()
+        Lê em lotes pelo índice (is_returned, due_date), sem carregar todos os atrasos de uma vez.
+        """
+        return self._stream_overdue(lambda session: session.query(Loan), as_of, batch_size)
 
-    def get_active_loans(self) -> List[Loan]:
-        return self.session.query(Loan).filter(Loan.is_returned == False).all()
+    def get_overdue_loan_listing(
+        self, as_of: Optional[datetime] = None, batch_size: int = OVERDUE_BATCH_SIZE
+    ) -> Iterator[LoanRow]:
+        """Como `get_overdue_loans`, mas em linhas de listagem com título, autor e nome do usuário."""
+        return map(LoanRow._make, self._stream_overdue(self._listing_query, as_of, batch_size))
 
-    def get_returned_loans(self) -> List[Loan]:
-        return self.session.query(Loan).filter(Loan.is_returned == True).all()
+    def _stream_overdue(self, build_query, as_of: Optional[datetime], batch_size: int) -> Iterator:
+        as_of = as_of or datetime.now()
+        cursor = None
+        while True:
+            with self._scope() as session:
+                query = build_query(session).filter(Loan.is_returned == False, Loan.due_date < as_of)
+                if cursor is not None:
+                    query = query.filter(tuple_(Loan.due_date, Loan.id) > cursor)
+                batch = query.order_by(Loan.due_date, Loan.id).limit(batch_size).all()
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            cursor = tuple_(batch[-1].due_date, batch[-1].id)
 
-    def get_user_history(self, user_id: int) -> List[Loan]:
-        return self.session.query(Loan).filter(Loan.user_id == user_id).order_by(Loan.loan_date.desc()).all()
+    @retry_on_locked
+    def mark_overdue(self, as_of: Optional[datetime] = None) -> int:
+        """Marca num único UPDATE os empréstimos vencidos ainda não marcados; devolve quantos mudaram."""
+        as_of = as_of or datetime.now()
+        with self._scope() as session:
+            pending = (Loan.is_returned == False, Loan.due_date < as_of, Loan.is_overdue == False)
+            statement = (
+                update(Loan).where(*pending).values(is_overdue=True).execution_options(synchronize_session=False)
+            )
+            if session.get_bind().dialect.update_returning:
+                marked = list(session.scalars(statement.returning(Loan.id)))
+            else:
+                # Sem RETURNING, os ids saem de um SELECT com o mesmo filtro, na mesma transação
+                marked = list(session.scalars(select(Loan.id).where(*pending)))
+                if marked:
+                    session.execute(statement.where(Loan.id.in_(marked)))
+            changelog.record(session, "loans", changelog.UPDATE, marked, ["is_overdue"])
+            return len(marked)
 
-    def __del__(self) -> None:
-        if hasattr(self, "session"):
-            self.session.close()
+    def get_active_loans_by_user(
+        self, user_id: int, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Loan]:
+        with self._scope() as session:
+            query = session.query(Loan).filter(Loan.user_id == user_id, Loan.is_returned == False)
+            return keyset_page(query, Loan.id, after_id, limit)
 
+    def get_active_loans(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Loan]:
+        with self._scope() as session:
+            return keyset_page(session.query(Loan).filter(Loan.is_returned == False), Loan.id, after_id, limit)
 
+    def get_returned_loans(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Loan]:
+        with self._scope() as session:
+            return keyset_page(session.query(Loan).filter(Loan.is_returned == True), Loan.id, after_id, limit)
+
+    def get_user_history(self, user_id: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Loan]:
+        """Histórico do mais recente para o mais antigo; `after_id` é o último empréstimo da página anterior."""
+        with self._scope() as session:
+            return self._history_page(session, session.query(Loan), user_id, after_id, limit)
+
+    def get_active_loan_listing(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[LoanRow]:
+        """Empréstimos ativos já com título, autor e nome do usuário, numa única consulta por página."""
+        with self._scope() as session:
+            # Pagina só os ids em `loans` e junta usuário e livro nas linhas da página; com o JOIN
+            # no mesmo SELECT, o banco juntaria todos os empréstimos ativos antes de ordenar.
+            page = session.query(Loan.id).filter(Loan.is_returned == False)
+            if after_id is not None:
+                page = page.filter(Loan.id > after_id)
+            page = page.order_by(Loan.id)
+            if limit is not None:
+                page = page.limit(limit)
+            page = page.subquery()
+            return to_rows(self._listing_query(session).join(page, page.c.id == Loan.id).order_by(Loan.id), LoanRow)
+
+    def get_user_history_listing(
+        self, user_id: int, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[LoanRow]:
+        """Como `get_user_history`, mas em linhas de listagem com título e autor."""
+        with self._scope() as session:
+            return to_rows(self._history_page(session, self._listing_query(session), user_id, after_id, limit), LoanRow)
+
+    def _history_page(self, session: Session, query, user_id: int, after_id: Optional[int], limit: Optional[int]):
+        query = query.filter(Loan.user_id == user_id)
+        if after_id is not None:
+            cursor = session.query(Loan.loan_date, Loan.id).filter(Loan.id == after_id).first()
+            if cursor is None:
+                return []
+            query = query.filter(tuple_(Loan.loan_date, Loan.id) < tuple_(cursor.loan_date, cursor.id))
+        query = query.order_by(Loan.loan_date.desc(), Loan.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def _listing_query(self, session: Session):
+        # Linhas (não entidades) nas colunas de LoanRow: usuário e livro vêm do JOIN, sem carga preguiçosa
+        return (
+            session.query(
+                Loan.id,
+                Loan.user_id,
+                User.name.label("user_name"),
+                Loan.book_id,
+                Book.title,
+                Book.author,
+                Loan.loan_date,
+                Loan.due_date,
+                Loan.return_date,
+                Loan.is_returned,
+            )
+            .join(User, User.id == Loan.user_id)
+            .join(Book, Book.id == Loan.book_id)
+        )
@@ -0,0 +1,18 @@
+from typing import Optional
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def keyset_page(query, key_column, after_id: Optional[int] = None, limit: Optional[int] = None):
+    """Aplica paginação por chave (keyset) ordenando pela coluna informada.
+
+    Sem `limit` devolve todas as linhas a partir de `after_id`: só para quem percorre a tabela
+    inteira de propósito (exportações, varreduras). Telas e rotas passam `DEFAULT_PAGE_SIZE`.
+    """
+    if after_id is not None:
+        query = query.filter(key_column > after_id)
+    query = query.order_by(key_column)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
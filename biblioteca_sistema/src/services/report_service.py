@@ -0,0 +1,115 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+from ..database.models import Book, User, Loan
+from ..database.connection import db_connection
+
+
+class ReportService:
+    """Relatórios de circulação; cada relatório é uma única consulta agregada no banco."""
+
+    def __init__(self, session: Optional[Session] = None) -> None:
+        self._session = session
+
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    def _filter(self, statement, start: Optional[datetime], end: Optional[datetime], category: Optional[str]):
+        if start is not None:
+            statement = statement.where(Loan.loan_date >= start)
+        if end is not None:
+            statement = statement.where(Loan.loan_date < end)
+        if category:
+            statement = statement.where(Book.category == category)
+        return statement
+
+    def top_books(
+        self,
+        limit: int = 10,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        category: Optional[str] = None,
+    ) -> List:
+        """Livros mais emprestados: (id, título, autor, categoria, empréstimos)."""
+        # Agrega só a tabela de empréstimos e junta os dados do livro apenas nas N linhas finais
+        loans = func.count(Loan.id).label("loans")
+        ranking = select(Loan.book_id, loans).group_by(Loan.book_id).order_by(loans.desc(), Loan.book_id).limit(limit)
+        if category:
+            ranking = ranking.join(Book, Book.id == Loan.book_id)
+        ranking = self._filter(ranking, start, end, category).subquery()
+        statement = (
+            select(Book.id, Book.title, Book.author, Book.category, ranking.c.loans)
+            .join(ranking, ranking.c.book_id == Book.id)
+            .order_by(ranking.c.loans.desc(), Book.id)
+        )
+        with self._scope() as session:
+            return session.execute(statement).all()
+
+    def top_users(
+        self,
+        limit: int = 10,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        category: Optional[str] = None,
+    ) -> List:
+        """Usuários mais ativos: (id, nome, email, empréstimos)."""
+        loans = func.count(Loan.id).label("loans")
+        ranking = select(Loan.user_id, loans).group_by(Loan.user_id).order_by(loans.desc(), Loan.user_id).limit(limit)
+        if category:
+            ranking = ranking.join(Book, Book.id == Loan.book_id)
+        ranking = self._filter(ranking, start, end, category).subquery()
+        statement = (
+            select(User.id, User.name, User.email, ranking.c.loans)
+            .join(ranking, ranking.c.user_id == User.id)
+            .order_by(ranking.c.loans.desc(), User.id)
+        )
+        with self._scope() as session:
+            return session.execute(statement).all()
+
+    def loans_per_month(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        category: Optional[str] = None,
+    ) -> List:
+        """Empréstimos por mês: (mês 'AAAA-MM', empréstimos, devolvidos)."""
+        with self._scope() as session:
+            month = self._month(session).label("month")
+            statement = (
+                select(
+                    month,
+                    func.count(Loan.id).label("loans"),
+                    func.count(Loan.return_date).label("returned"),
+                )
+                .group_by(month)
+                .order_by(month)
+            )
+            if category:
+                statement = statement.join(Book, Book.id == Loan.book_id)
+            return session.execute(self._filter(statement, start, end, category)).all()
+
+    def circulation_by_category(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List:
+        """Circulação por categoria: (categoria, empréstimos, livros distintos, usuários distintos)."""
+        loans = func.count(Loan.id).label("loans")
+        statement = (
+            select(
+                Book.category,
+                loans,
+                func.count(distinct(Loan.book_id)).label("books"),
+                func.count(distinct(Loan.user_id)).label("users"),
+            )
+            .join(Loan, Loan.book_id == Book.id)
+            .group_by(Book.category)
+            .order_by(loans.desc(), Book.category)
+        )
+        with self._scope() as session:
+            return session.execute(self._filter(statement, start, end, None)).all()
+
+    def _month(self, session: Session):
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            return func.strftime("%Y-%m", Loan.loan_date)
+        if dialect in ("mysql", "mariadb"):
+            return func.date_format(Loan.loan_date, "%Y-%m")
+        return func.to_char(Loan.loan_date, "YYYY-MM")
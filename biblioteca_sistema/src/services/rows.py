@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class BookRow(NamedTuple):
+    """Livro de listagem: só as colunas lidas pelas telas, sem estado de sessão nem mapa de identidade."""
+
+    id: int
+    title: str
+    author: str
+    year: int
+    category: str
+    is_available: bool
+    copies_total: int
+    copies_available: int
+
+
+class UserRow(NamedTuple):
+    id: int
+    name: str
+    email: str
+    phone: str
+    created_at: datetime
+
+
+class LoanRow(NamedTuple):
+    """Empréstimo de listagem, com o nome do usuário e o título e autor do livro."""
+
+    id: int
+    user_id: int
+    user_name: str
+    book_id: int
+    title: str
+    author: str
+    loan_date: datetime
+    due_date: datetime
+    return_date: Optional[datetime]
+    is_returned: bool
+
+
+def project(query, row_type, entity):
+    """A mesma consulta (filtros, JOINs e ordem), mas selecionando só as colunas de `row_type`."""
+    return query.with_entities(*(getattr(entity, field) for field in row_type._fields))
+
+
+def to_rows(rows: Iterable, row_type) -> List:
+    return list(map(row_type._make, rows))
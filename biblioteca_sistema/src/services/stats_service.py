@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from ..database.connection import db_connection
+from ..database import statistics
+
+
+class StatsService:
+    """Leitura dos contadores mantidos pelos serviços a cada escrita, sem varrer as tabelas."""
+
+    def __init__(self, session: Optional[Session] = None) -> None:
+        self._session = session
+
+    def _scope(self):
+        return db_connection.session_scope(self._session)
+
+    def get_counters(self) -> Dict[str, int]:
+        with self._scope() as session:
+            return statistics.read_counters(session)
+
+    def get_summary(self) -> dict:
+        counters = self.get_counters()
+        books_total = counters.get(statistics.BOOKS_TOTAL, 0)
+        books_available = counters.get(statistics.BOOKS_AVAILABLE, 0)
+        loans_total = counters.get(statistics.LOANS_TOTAL, 0)
+        loans_active = counters.get(statistics.LOANS_ACTIVE, 0)
+        copies_total = counters.get(statistics.COPIES_TOTAL, 0)
+        copies_available = counters.get(statistics.COPIES_AVAILABLE, 0)
+        holds_ready = counters.get(statistics.HOLDS_READY, 0)
+        # "books" conta títulos: disponível é ter ao menos um exemplar na estante
+        return {
+            "books": {"total": books_total, "available": books_available, "borrowed": books_total - books_available},
+            "copies": {
+                "total": copies_total,
+                "available": copies_available,
+                "on_loan": copies_total - copies_available - holds_ready,
+                "on_hold_shelf": holds_ready,
+            },
+            "holds": {"waiting": counters.get(statistics.HOLDS_WAITING, 0), "ready": holds_ready},
+            "users": {"total": counters.get(statistics.USERS_TOTAL, 0)},
+            "loans": {"total": loans_total, "active": loans_active, "returned": loans_total - loans_active},
+            "categories": self._categories(counters),
+        }
+
+    def get_books_count_by_category(self) -> Dict[str, int]:
+        return self._categories(self.get_counters())
+
+    def _categories(self, counters: Dict[str, int]) -> Dict[str, int]:
+        prefix = statistics.CATEGORY_PREFIX
+        return {
+            name[len(prefix):]: value
+            for name, value in sorted(counters.items())
+            if name.startswith(prefix) and value > 0
+        }
+
+    def rebuild(self) -> Dict[str, int]:
+        """Recalcula todos os contadores a partir das tabelas."""
+        with self._scope() as session:
+            return statistics.rebuild_counters(session)
+
+    def verify(self) -> Dict[str, tuple]:
+        """Compara os contadores gravados com os valores reais; devolve {nome: (gravado, real)} das divergências."""
+        with self._scope() as session:
+            stored = statistics.read_counters(session)
+            actual = statistics.compute_counters(session)
+        names = set(stored) | set(actual)
+        return {
+            name: (stored.get(name, 0), actual.get(name, 0))
+            for name in sorted(names)
+            if stored.get(name, 0) != actual.get(name, 0)
+        }
@@ -1,80 +1,145 @@
 from typing import List, Optional
-import re
-from ..database.models import User
-from ..database.connection import db_connection
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from ..database.models import Hold, User
+from ..database.connection import db_connection, retry_on_locked
+from ..database import changelog, statistics
+from ..utils.cache import entity_cache, from_cache, to_cache
+from ..utils.validators import is_valid_email
+from .pagination import keyset_page
+from .rows import UserRow, project, to_rows
 
 
-class UserService:
-    def __init__(self) -> None:
-        self.session = db_connection.get_session()
-
-    def add_user(self, name: str, email: str, phone: str) -> Optional[User]:
-        if self.get_user_by_email(email):
-            raise ValueError("Email já cadastrado no sistema")
-        if not self._validate_email(email):
-            raise ValueError("Email inválido")
+def user_cache_key(user_id: int) -> str:
+    return f"user:{user_id}"
 
-        user = User(name=name, email=email, phone=phone)
-        self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
-        return user
 
-    def get_all_users(self) -> List[User]:
-        return self.session.query(User).all()
+def email_cache_key(email: str) -> str:
+    return f"user:email:{email}"
 
-    def get_user_by_id(self, user_id: int) -> Optional[User]:
-        return self.session.query(User).filter(User.id == user_id).first()
-
-    def get_user_by_email(self, email: str) -> Optional[User]:
-        return self.session.query(User).filter(User.email == email).first()
 
-    def search_users(self, search_term: str) -> List[User]:
-        return self.session.query(User).filter(
-            (User.name.ilike(f"%{search_term}%")) | (User.email.ilike(f"%{search_term}%"))
-        ).all()
+class UserService:
+    def __init__(self, session: Optional[Session] = None) -> None:
+        # Com `session`, as operações participam da transação de quem chamou
+        self._session = session
 
-    def update_user(self, user_id: int, name: str = None, email: str = None, phone: str = None) -> bool:
-        user = self.get_user_by_id(user_id)
-        if not user:
-            return False
+    def _scope(self):
+        return db_connection.session_scope(self._session)
 
-        if name:
-            user.name = name
-        if email:
+    @retry_on_locked
+    def add_user(self, name: str, email: str, phone: str) -> Optional[User]:
+        with self._scope() as session:
+            if self._find_by_email(session, email):
+                raise ValueError("Email já cadastrado no sistema")
             if not self._validate_email(email):
                 raise ValueError("Email inválido")
-            existing_user = self.get_user_by_email(email)
-            if existing_user and existing_user.id != user_id:
-                raise ValueError("Email já cadastrado no sistema")
-            user.email = email
-        if phone:
-            user.phone = phone
 
-        self.session.commit()
-        return True
+            user = User(name=name, email=email, phone=phone)
+            session.add(user)
+            session.flush()
+            changelog.record(session, "users", changelog.INSERT, [user.id])
+            statistics.increment(session, {statistics.USERS_TOTAL: 1})
+            return user
 
-    def delete_user(self, user_id: int) -> bool:
-        user = self.get_user_by_id(user_id)
-        if user:
-            from .loan_service import LoanService
+    def get_all_users(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[User]:
+        with self._scope() as session:
+            return keyset_page(session.query(User), User.id, after_id, limit)
 
-            loan_service = LoanService()
-            active_loans = loan_service.get_active_loans_by_user(user_id)
-            if active_loans:
-                raise ValueError("Não é possível excluir usuário com empréstimos ativos")
+    def get_user_listing(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[UserRow]:
+        """Como `get_all_users`, mas em linhas de listagem (só as colunas, sem entidades na sessão)."""
+        with self._scope() as session:
+            return to_rows(keyset_page(project(session.query(User), UserRow, User), User.id, after_id, limit), UserRow)
 
-            self.session.delete(user)
-            self.session.commit()
-            return True
-        return False
+    def get_user_by_id(self, user_id: int) -> Optional[User]:
+        data = entity_cache.get_or_load(user_cache_key(user_id), lambda: self._load(User.id == user_id))
+        return from_cache(User, data)
 
-    def _validate_email(self, email: str) -> bool:
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        data = entity_cache.get_or_load(email_cache_key(email), lambda: self._load(User.email == email))
+        return from_cache(User, data)
+
+    def _load(self, condition) -> Optional[dict]:
+        with self._scope() as session:
+            user = session.query(User).filter(condition).first()
+            return to_cache(user) if user else None
+
+    def _find_by_email(self, session: Session, email: str) -> Optional[User]:
+        return session.query(User).filter(User.email == email).first()
+
+    def search_users(
+        self, search_term: str, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[User]:
+        with self._scope() as session:
+            return keyset_page(self._search_query(session, search_term), User.id, after_id, limit)
+
+    def search_user_listing(
+        self, search_term: str, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[UserRow]:
+        """Como `search_users`, mas em linhas de listagem."""
+        with self._scope() as session:
+            query = project(self._search_query(session, search_term), UserRow, User)
+            return to_rows(keyset_page(query, User.id, after_id, limit), UserRow)
+
+    def _search_query(self, session: Session, search_term: str):
+        return session.query(User).filter(
+            (User.name.ilike(f"%{search_term}%")) | (User.email.ilike(f"%{search_term}%"))
+        )
 
-    def __del__(self) -> None:
-        if hasattr(self, "session"):
-            self.session.close()
+    @retry_on_locked
+    def update_user(self, user_id: int, name: str = None, email: str = None, phone: str = None) -> bool:
+        with self._scope() as session:
+            user = session.get(User, user_id)
+            if not user:
+                return False
+            stale_keys = [user_cache_key(user_id), email_cache_key(user.email)]
+            before = {"name": user.name, "email": user.email, "phone": user.phone}
+
+            if name:
+                user.name = name
+            if email:
+                if not self._validate_email(email):
+                    raise ValueError("Email inválido")
+                existing_user = self._find_by_email(session, email)
+                if existing_user and existing_user.id != user_id:
+                    raise ValueError("Email já cadastrado no sistema")
+                user.email = email
+            if phone:
+                user.phone = phone
+
+            session.flush()
+            changed = [column for column, value in before.items() if getattr(user, column) != value]
+            if changed:
+                changelog.record(session, "users", changelog.UPDATE, [user_id], changed)
+            entity_cache.invalidate_on_commit(session, *stale_keys, email_cache_key(user.email))
+            return True
 
+    @retry_on_locked
+    def delete_user(self, user_id: int) -> bool:
+        with self._scope() as session:
+            user = session.get(User, user_id)
+            if user:
+                from .loan_service import LoanService
+
+                active_loans = LoanService(session).get_active_loans_by_user(user_id, limit=1)
+                if active_loans:
+                    raise ValueError("Não é possível excluir usuário com empréstimos ativos")
+                from .hold_service import HoldService
+
+                # Reservas ativas são canceladas (os exemplares separados seguem na fila) antes de sair
+                HoldService(session).cancel_user_holds(user_id)
+                hold_ids = list(session.scalars(select(Hold.id).where(Hold.user_id == user_id).order_by(Hold.id)))
+                session.execute(
+                    delete(Hold).where(Hold.user_id == user_id).execution_options(synchronize_session=False)
+                )
+
+                session.delete(user)
+                session.flush()
+                changelog.record(session, "holds", changelog.DELETE, hold_ids)
+                changelog.record(session, "users", changelog.DELETE, [user_id])
+                entity_cache.invalidate_on_commit(session, user_cache_key(user_id), email_cache_key(user.email))
+                statistics.increment(session, {statistics.USERS_TOTAL: -1})
+                return True
+            return False
 
+    def _validate_email(self, email: str) -> bool:
+        return is_valid_email(email)
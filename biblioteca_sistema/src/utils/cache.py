@@ -0,0 +1,304 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+GENERATION_SLOTS = 4096
+# As versões no Redis vivem bem mais que qualquer carga em andamento
+GENERATION_TTL_MS = 24 * 3600 * 1000
+
+
+class CacheBackend(ABC):
+    """Interface dos armazenamentos do cache; os valores são sempre dicionários simples."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def generation(self, key: str) -> int:
+        """Versão da chave, que muda a cada `delete`; lida antes de carregar o valor do banco."""
+
+    @abstractmethod
+    def set_if_generation(self, key: str, value: dict, generation: int) -> None:
+        """Grava só se a chave não foi invalidada desde que `generation` foi lida."""
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class NullBackend(CacheBackend):
+    """Cache desligado: toda leitura é um miss."""
+
+    def get(self, key: str) -> Optional[dict]:
+        return None
+
+    def set(self, key: str, value: dict) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def generation(self, key: str) -> int:
+        return 0
+
+    def set_if_generation(self, key: str, value: dict, generation: int) -> None:
+        pass
+
+    def size(self) -> Optional[int]:
+        return 0
+
+
+class LRUBackend(CacheBackend):
+    """LRU em memória do processo, com validade (TTL) por entrada."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Versões por faixa de chaves: memória fixa, e uma colisão só faz pular um `set`
+        self._generations = [0] * GENERATION_SLOTS
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[hash(key) % GENERATION_SLOTS] += 1
+
+    def generation(self, key: str) -> int:
+        with self._lock:
+            return self._generations[hash(key) % GENERATION_SLOTS]
+
+    def set_if_generation(self, key: str, value: dict, generation: int) -> None:
+        with self._lock:
+            if self._generations[hash(key) % GENERATION_SLOTS] == generation:
+                self._store(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+# Compara a versão e grava numa só operação no servidor, sem corrida com um `delete` de outro processo
+_SET_IF_GENERATION = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') == tonumber(ARGV[3]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+end
+"""
+
+
+def _encode(value) -> dict:
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Tipo não serializável no cache: {type(value).__name__}")
+
+
+def _decode(data: dict):
+    if "$datetime" in data:
+        return datetime.fromisoformat(data["$datetime"])
+    return data
+
+
+class RedisBackend(CacheBackend):
+    """Cache compartilhado entre processos; requer o pacote redis."""
+
+    def __init__(self, url: str, ttl: float = 300.0, prefix: str = "biblioteca:") -> None:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("O cache compartilhado requer o pacote redis (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._set_if_generation = self.client.register_script(_SET_IF_GENERATION)
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw, object_hook=_decode) if raw is not None else None
+
+    def set(self, key: str, value: dict) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, default=_encode), px=int(self.ttl * 1000))
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.prefix}gen:{key}"
+
+    def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        # A versão sobe junto com a remoção, visível para todos os processos que usam o Redis
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.incr(self._generation_key(key))
+            pipeline.pexpire(self._generation_key(key), GENERATION_TTL_MS)
+        pipeline.delete(*(self.prefix + key for key in keys))
+        pipeline.execute()
+
+    def generation(self, key: str) -> int:
+        return int(self.client.get(self._generation_key(key)) or 0)
+
+    def set_if_generation(self, key: str, value: dict, generation: int) -> None:
+        self._set_if_generation(
+            keys=[self.prefix + key, self._generation_key(key)],
+            args=[json.dumps(value, default=_encode), int(self.ttl * 1000), generation],
+        )
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class Cache:
+    """Cache de leitura (read-through) com contadores de acertos e falhas."""
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[dict]]) -> Optional[dict]:
+        value = self.get(key)
+        if value is None:
+            # Se uma escrita invalidar a chave durante a carga, o valor lido pode ser o antigo
+            # e não vai para o cache (a próxima leitura carrega de novo)
+            generation = self.backend.generation(key)
+            value = loader()
+            if value is not None:
+                self.backend.set_if_generation(key, value, generation)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self.backend.set(key, value)
+
+    def invalidate(self, *keys: str) -> None:
+        self.backend.delete(*keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def invalidate_on_commit(self, session, *keys: str) -> None:
+        """Remove as chaves agora e de novo quando a transação terminar.
+
+        A segunda remoção também muda a versão das chaves: uma leitura que carregou o valor antigo
+        antes do commit não consegue gravá-lo depois (ver `get_or_load`).
+        """
+        self.invalidate(*keys)
+
+        def drop(_session) -> None:
+            self.invalidate(*keys)
+
+        event.listen(session, "after_commit", drop, once=True)
+        event.listen(session, "after_rollback", drop, once=True)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": getattr(self.backend, "evictions", None),
+                "size": self.backend.size(),
+            }
+
+
+def to_cache(instance) -> dict:
+    """Colunas de uma entidade como dicionário, no formato guardado no cache."""
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs}
+
+
+def from_cache(model, data: Optional[dict]):
+    """Recria a entidade como objeto destacado (detached), igual ao devolvido por uma sessão fechada."""
+    if data is None:
+        return None
+    instance = model(**data)
+    make_transient_to_detached(instance)
+    return instance
+
+
+def create_cache() -> Cache:
+    """Cache escolhido por CACHE_BACKEND: memory (padrão), redis ou none.
+
+    O memory é de cada processo e só enxerga as escritas do próprio processo. Com mais de um
+    processo no mesmo banco (a API e a CLI, vários servidores), use redis, compartilhado, ou none;
+    senão um processo serve o que outro já alterou por até CACHE_TTL segundos.
+    """
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("CACHE_TTL", "300"))
+    if backend == "none":
+        return Cache(NullBackend())
+    if backend == "redis":
+        return Cache(RedisBackend(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl=ttl))
+    return Cache(LRUBackend(max_size=int(os.getenv("CACHE_MAX_SIZE", "1024")), ttl=ttl))
+
+
+entity_cache = create_cache()
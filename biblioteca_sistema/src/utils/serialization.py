@@ -0,0 +1,26 @@
+import dataclasses
+from datetime import datetime
+
+
+def to_record(value):
+    """Converte entidades, linhas e dataclasses dos serviços em dicionários serializáveis."""
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    if hasattr(value, "__table__"):
+        return {column.key: getattr(value, column.key) for column in value.__table__.columns}
+    return value
+
+
+def to_records(data):
+    if isinstance(data, list):
+        return [to_record(item) for item in data]
+    return to_record(data)
+
+
+def json_default(value):
+    """`default` do json.dumps: datas em ISO 8601, o resto como texto."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)